@@ -0,0 +1,202 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Responses are scripted: each request takes the next entry from the script (a string,
+or a dict with "content" and/or "tool_calls"). When the script is empty a final
+{"step": "output"} reply is returned. Latency, token rate and injected 429/5xx errors
+are configurable, per model as well, so stub models of different speeds can stand in
+for a model route. Every request is recorded so benchmarks can count round trips and
+bytes sent.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = json.dumps({"step": "output", "content": "Done."})
+
+
+class FakeOpenAI:
+    """
+    Scriptable fake chat completions server running in a background thread.
+    """
+
+    def __init__(self, latency: float = 0.05, tokens_per_second: float = 200.0, chars_per_token: int = 4):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chars_per_token = chars_per_token
+        self.responses = deque()
+        self.requests = []
+        self.errors = deque()
+        self.model_latency = {}
+        self.model_errors = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def script(self, responses):
+        """
+        Queue responses for the next requests, in order.
+        """
+        with self.lock:
+            self.responses.extend(responses)
+
+    def inject_errors(self, statuses, retry_after: float = None):
+        """
+        Fail the next requests with the given HTTP statuses (e.g. [429, 503]).
+        """
+        with self.lock:
+            self.errors.extend((status, retry_after) for status in statuses)
+
+    def set_model(self, model: str, latency: float = None, error: int = None):
+        """
+        Give a model its own time to first token, or make every request for it fail
+        with an HTTP status (e.g. 404 for a model the endpoint does not serve).
+        """
+        with self.lock:
+            self.model_latency.pop(model, None)
+            self.model_errors.pop(model, None)
+            if latency is not None:
+                self.model_latency[model] = latency
+            if error is not None:
+                self.model_errors[model] = error
+
+    def reset(self):
+        with self.lock:
+            self.responses.clear()
+            self.errors.clear()
+            self.model_latency.clear()
+            self.model_errors.clear()
+            self.requests = []
+
+    def _next(self, model=None):
+        with self.lock:
+            if model in self.model_errors:
+                return None, (self.model_errors[model], None)
+            if self.errors:
+                return None, self.errors.popleft()
+            return (self.responses.popleft() if self.responses else DEFAULT_REPLY), None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                request = json.loads(body or b"{}")
+                with fake.lock:
+                    fake.requests.append({"time": time.time(), "bytes": len(body), "stream": bool(request.get("stream")),
+                                          "model": request.get("model"), "messages": len(request.get("messages", []))})
+
+                reply, error = fake._next(request.get("model"))
+                time.sleep(fake.model_latency.get(request.get("model"), fake.latency))
+                if error is not None:
+                    self._send_error(*error)
+                    return
+
+                if isinstance(reply, str):
+                    reply = {"content": reply}
+                if request.get("stream"):
+                    self._stream(request, reply)
+                else:
+                    self._complete(request, reply)
+
+            def _send_error(self, status, retry_after):
+                payload = json.dumps({"error": {"message": f"Injected error {status}", "type": "fake"}}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _generation_delay(self, text):
+                return len(text) / fake.chars_per_token / fake.tokens_per_second
+
+            def _complete(self, request, reply):
+                content = reply.get("content")
+                tool_calls = reply.get("tool_calls")
+                time.sleep(self._generation_delay(content or json.dumps(tool_calls or "")))
+                message = {"role": "assistant", "content": content}
+                if tool_calls:
+                    message["tool_calls"] = [
+                        {"id": call.get("id") or f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                         "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))}}
+                        for call in tool_calls
+                    ]
+                payload = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "gpt-4o"),
+                    "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                    "usage": self._usage(request, content or ""),
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, request, reply):
+                content = reply.get("content") or ""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                step = fake.chars_per_token
+                for start in range(0, len(content), step):
+                    piece = content[start:start + step]
+                    time.sleep(self._generation_delay(piece))
+                    self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                                 "model": request.get("model", "gpt-4o"),
+                                 "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": request.get("model", "gpt-4o"),
+                             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                                 "model": request.get("model", "gpt-4o"), "choices": [],
+                                 "usage": self._usage(request, content)})
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+            def _event(self, data):
+                self._chunk(b"data: " + json.dumps(data).encode() + b"\n\n")
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _usage(self, request, content):
+                prompt_tokens = len(json.dumps(request.get("messages", []))) // fake.chars_per_token
+                completion_tokens = len(content) // fake.chars_per_token
+                return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens}
+
+        return Handler
@@ -0,0 +1,318 @@
+"""
+Offline benchmarks for CodeSH.
+
+Runs the agent loop, the local intent fast path, generate_project (with and without plan reuse), the
+create_*_project paths, model routing, retries of rate-limited requests and execute_command against
+a local fake chat completions server (bench/fake_openai.py) and a stand-in npm (bench/bin/npm), so
+no network or API key is needed:
+
+    python bench/run.py
+    python bench/run.py --workloads agent_loop,execute_command --output results.json
+    python bench/run.py --thresholds bench/thresholds.json    # exit 1 on regressions
+
+Reports per-iteration latency percentiles, LLM round trips, request bytes, subprocess
+spawns and peak RSS as JSON.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "cli"))
+
+from fake_openai import FakeOpenAI
+
+spawns = 0
+_execute_child = subprocess.Popen._execute_child
+
+
+def _counting_execute_child(self, *args, **kwargs):
+    # Every subprocess (including asyncio's) is started through Popen._execute_child
+    global spawns
+    spawns += 1
+    return _execute_child(self, *args, **kwargs)
+
+
+subprocess.Popen._execute_child = _counting_execute_child
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def step(**fields):
+    return json.dumps(fields)
+
+
+def scaffold_manifest(files: int) -> str:
+    """
+    JSON Lines manifest like the model returns for a structure-only project.
+    """
+    entries = [{"type": "project", "project_type": "static", "use_cli": False}]
+    entries += [{"type": "dir", "path": path} for path in ("src", "assets", "tests")]
+    for i in range(files):
+        entries.append({"type": "file", "path": f"src/module_{i}.js",
+                        "content": f"export function handler{i}(request) {{\n  return {{ status: 200, body: 'module {i}' }};\n}}\n"})
+    entries += [{"type": "file", "path": "README.md", "content": ""},
+                {"type": "file", "path": ".gitignore", "content": "node_modules/\n"}]
+    return "\n".join(json.dumps(entry) for entry in entries)
+
+
+class Bench:
+    def __init__(self, server, agent, iterations):
+        self.server = server
+        self.agent = agent
+        self.iterations = iterations
+
+    def measure(self, name, run, setup=None):
+        """
+        Run a workload for the configured number of iterations and collect its metrics.
+        """
+        global spawns
+        latencies, round_trips, request_bytes, spawn_counts = [], [], [], []
+        for i in range(self.iterations):
+            self.server.reset()
+            if setup is not None:
+                setup(i)
+            spawns_before = spawns
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            spawn_counts.append(spawns - spawns_before)
+            round_trips.append(len(self.server.requests))
+            request_bytes.extend(request["bytes"] for request in self.server.requests)
+
+        return {
+            "workload": name,
+            "iterations": self.iterations,
+            "p50_ms": round(percentile(latencies, 0.5), 2),
+            "p90_ms": round(percentile(latencies, 0.9), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(max(latencies), 2),
+            "round_trips_per_iteration": round(sum(round_trips) / len(round_trips), 2),
+            "request_bytes_mean": round(sum(request_bytes) / len(request_bytes), 1) if request_bytes else 0,
+            "request_bytes_max": max(request_bytes, default=0),
+            "spawns_per_iteration": round(sum(spawn_counts) / len(spawn_counts), 2),
+        }
+
+    def agent_loop(self):
+        def setup(i):
+            self.server.script([
+                step(step="plan", content="I will list the files in the current directory."),
+                step(step="action", function="execute_command", input={"command": "ls -la"}),
+                step(step="output", content=f"Here are the files ({i})."),
+            ])
+        return self.measure("agent_loop", lambda i: self.agent.answer_query(f"list files in current directory {i}"), setup)
+
+    def fast_path(self):
+        """
+        Simple requests answered by the local intent router: no round trips expected.
+        """
+        queries = ["list files in current directory", "create a folder called projects", "show contents of notes.txt"]
+
+        def setup(i):
+            with open("notes.txt", "w") as f:
+                f.write(f"note {i}\n")
+
+        def run(i):
+            for query in queries:
+                self.agent.answer_query(query, self.agent.new_conversation())
+        return self.measure("fast_path", run, setup)
+
+    def agent_session(self):
+        """
+        One long session: request size should stay flat as the conversation grows.
+        """
+        history = self.agent.new_conversation()
+
+        def setup(i):
+            self.server.script([
+                step(step="action", function="execute_command", input={"command": "seq 1 2000"}),
+                step(step="output", content=f"Printed the numbers ({i})."),
+            ])
+        return self.measure("agent_session", lambda i: self.agent.answer_query(f"print numbers {i}", history), setup)
+
+    def generate_project(self):
+        def setup(i):
+            self.server.script([scaffold_manifest(30)])
+
+        def run(i):
+            self.agent.generate_project(f"static site number {i}", f"project_{i}")
+        return self.measure("generate_project", run, setup)
+
+    def plan_reuse(self):
+        """
+        The same scaffold asked for in different words: only the first request should reach the model.
+        """
+        descriptions = ["Static site with a contact form in ./site_{i}",
+                        "create a static website with contact forms at ./site_{i}",
+                        "build a basic static site with a contact form in ./site_{i}"]
+
+        def setup(i):
+            self.server.script([scaffold_manifest(30)])
+
+        def run(i):
+            self.agent.generate_project(descriptions[i % len(descriptions)].format(i=i), f"site_{i}")
+        return self.measure("plan_reuse", run, setup)
+
+    def create_express_project(self):
+        def run(i):
+            self.agent.create_express_project(f"express_{i}", {"project_type": "express", "dependencies": ["cors", "dotenv"]})
+        return self.measure("create_express_project", run)
+
+    def create_custom_node_project(self):
+        def run(i):
+            self.agent.create_custom_node_project(f"node_{i}", {
+                "project_type": "node",
+                "custom_installation": True,
+                "dependencies": ["lodash"],
+                "cli_commands": [
+                    {"command": f"cd node_{i} && npm run lint", "depends_on": []},
+                    {"command": f"cd node_{i} && npm run build", "depends_on": []},
+                ],
+            })
+        return self.measure("create_custom_node_project", run)
+
+    def model_routing(self):
+        """
+        Command generation routed to a fast stub model while the flagship is slow.
+        """
+        def setup(i):
+            self.server.set_model("gpt-4o", latency=1.0)
+
+        def run(i):
+            for n in range(3):
+                self.agent.generate_command(f"count the lines of file_{i}_{n}.txt")
+        return self.measure("model_routing", run, setup)
+
+    def rate_limits(self):
+        """
+        Two 429s with Retry-After before each answer: the scheduler should retry both, each
+        no sooner than the server asked.
+        """
+        retry_after = 0.2
+        early, missing = [], []
+
+        def setup(i):
+            self.server.inject_errors([429, 429], retry_after=retry_after)
+
+        def run(i):
+            retries = self.agent.scheduler.retries
+            self.agent.generate_command(f"show the files changed in commit {i}")
+            times = [request["time"] for request in self.server.requests]
+            early.append(sum(1 for before, after in zip(times, times[1:]) if after - before < retry_after))
+            missing.append(2 - (self.agent.scheduler.retries - retries))
+
+        result = self.measure("rate_limits", run, setup)
+        result["early_retries"] = sum(early)
+        result["missing_retries"] = sum(missing)
+        return result
+
+    def execute_command(self):
+        def run(i):
+            for _ in range(20):
+                self.agent.execute_command("echo hello")
+        return self.measure("execute_command", run)
+
+
+WORKLOADS = ["agent_loop", "fast_path", "agent_session", "generate_project", "plan_reuse", "create_express_project",
+             "create_custom_node_project", "model_routing", "rate_limits", "execute_command"]
+
+
+def check_thresholds(results, thresholds):
+    """
+    Return a list of metrics that exceed their thresholds.
+    """
+    failures = []
+    for result in results:
+        for metric, limit in thresholds.get(result["workload"], {}).items():
+            value = result.get(metric)
+            if value is not None and value > limit:
+                failures.append(f"{result['workload']}.{metric} = {value} (limit {limit})")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline CodeSH benchmarks")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma-separated workloads to run")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server time to first token, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake server generation speed")
+    parser.add_argument("--npm-delay", type=float, default=0.2, help="seconds each fake npm install takes")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--thresholds", help="JSON file of per-workload metric limits")
+    args = parser.parse_args(argv)
+    # Paths are relative to where the benchmark was started, not the scratch workspace
+    output = os.path.abspath(args.output) if args.output else None
+    thresholds = os.path.abspath(args.thresholds) if args.thresholds else None
+
+    server = FakeOpenAI(latency=args.latency, tokens_per_second=args.tokens_per_second).start()
+    workspace = tempfile.mkdtemp(prefix="codesh-bench-")
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": server.base_url,
+        "CODESH_CACHE": "0",
+        # The fake server has no rate limits; with the default per-minute budgets the
+        # scheduler would start throttling part way through the run and add its waits
+        # to whichever workload happened to be running (rate_limits covers the scheduler)
+        "CODESH_RPM": "1000000",
+        "CODESH_TPM": "100000000",
+        "CODESH_TRACE_PATH": os.path.join(workspace, "trace.jsonl"),
+        "CODESH_SCAFFOLD_CACHE_PATH": os.path.join(workspace, "scaffolds"),
+        "CODESH_JOURNAL_PATH": os.path.join(workspace, "journals"),
+        "CODESH_PLAN_INDEX_PATH": os.path.join(workspace, "plans.jsonl"),
+        "BENCH_NPM_DELAY": str(args.npm_delay),
+        "PATH": os.path.join(HERE, "bin") + os.pathsep + os.environ.get("PATH", ""),
+    })
+    os.chdir(workspace)
+
+    import_started = time.perf_counter()
+    import main as agent
+    import_ms = (time.perf_counter() - import_started) * 1000
+
+    bench = Bench(server, agent, args.iterations)
+    results = []
+    for name in args.workloads.split(","):
+        results.append(getattr(bench, name.strip())())
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    report = {
+        "import_ms": round(import_ms, 2),
+        "peak_rss_kb": usage.ru_maxrss,
+        "peak_child_rss_kb": children.ru_maxrss,
+        "fake_server": {"latency": args.latency, "tokens_per_second": args.tokens_per_second},
+        "workloads": results,
+    }
+    server.stop()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+
+    if thresholds:
+        with open(thresholds) as f:
+            failures = check_thresholds(results, json.load(f))
+        if failures:
+            print("\nRegressions:\n  " + "\n  ".join(failures), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Headless batch mode: run a JSONL file of queries through the agent on a worker pool.
+
+    python cli/codesh.py batch queries.jsonl --output results.jsonl
+    generate_queries | python cli/codesh.py batch - > results.jsonl
+
+Each input line is a JSON object {"query": "...", "id": "...", "cwd": "..."} (id and cwd
+are optional) or a JSON string. Every query gets its own conversation history and shell.
+One JSON result per query is appended to the output as soon as it finishes, with
+the answer, step trace, tool outputs and timings. Re-running with the same output file
+skips queries that already have a result, so an interrupted job resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import main as agent
+from output import redirect_output
+from shell import ShellSession
+
+
+class Recorder:
+    """
+    Output writer for one query: keeps its events, with the time they happened, and a
+    bounded capture of everything it printed.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.steps = []
+        self.capture = agent.new_output_capture()
+
+    def event(self, event: dict):
+        self.steps.append({"elapsed": round(time.monotonic() - self.started, 3), **event})
+
+    def write(self, text):
+        self.capture.write(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def read_queries(stream) -> list:
+    """
+    Parse query specs from JSONL, giving each an id (its line number unless set).
+    """
+    queries = []
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            spec = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e})")
+        if isinstance(spec, str):
+            spec = {"query": spec}
+        if not isinstance(spec, dict) or not isinstance(spec.get("query"), str):
+            raise ValueError(f"Line {number}: expected a query string or an object with a \"query\" field")
+        spec["id"] = str(spec.get("id", number))
+        queries.append(spec)
+    return queries
+
+
+def finished_ids(path: str, retry_failed: bool = False) -> set:
+    """
+    Ids that already have a result in an earlier run's output file.
+    A line cut short by a crash is ignored, so that query runs again.
+    """
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(result, dict) and "id" in result and not (retry_failed and result.get("status") != "ok"):
+                done.add(str(result["id"]))
+    return done
+
+
+def run_query(spec: dict, base_dir: str) -> dict:
+    """
+    Answer one query with a fresh history and shell, returning its result record.
+    """
+    recorder = Recorder()
+    shell = ShellSession(cwd=os.path.join(base_dir, spec.get("cwd") or ""))
+    started = time.time()
+    error = None
+    try:
+        with redirect_output(recorder), agent.session_shell(shell):
+            agent.answer_query(spec["query"], agent.new_conversation())
+    except Exception as e:
+        error = str(e)
+    finally:
+        shell.close()
+
+    errors = [step["message"] for step in recorder.steps if step["type"] == "error"]
+    answers = [step["content"] for step in recorder.steps if step["type"] == "answer"]
+    error = error or (errors[-1] if errors else None)
+    return {
+        "id": spec["id"],
+        "query": spec["query"],
+        "status": "error" if error else "ok",
+        "answer": answers[-1] if answers else None,
+        "error": error,
+        "started": round(started, 3),
+        "duration": round(time.monotonic() - recorder.started, 3),
+        "steps": recorder.steps,
+        "output": recorder.capture.digest(),
+    }
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(prog="codesh batch", description="Run a JSONL file of queries")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of queries, or - for stdin")
+    parser.add_argument("--output", "-o", help="append JSONL results to this file (default stdout); "
+                                               "queries that already have a result there are skipped")
+    parser.add_argument("--workers", "-w", type=int, default=agent.MAX_CONCURRENT_REQUESTS,
+                        help="queries run at the same time (default: CODESH_MAX_CONCURRENT_REQUESTS)")
+    parser.add_argument("--retry-failed", action="store_true", help="run queries whose earlier result was an error again")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.input == "-":
+            queries = read_queries(sys.stdin)
+        else:
+            with open(args.input) as f:
+                queries = read_queries(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading queries: {str(e)}", file=sys.stderr)
+        return 2
+
+    done = finished_ids(args.output, args.retry_failed)
+    pending = [spec for spec in queries if spec["id"] not in done]
+    if done:
+        print(f"Resuming: {len(queries) - len(pending)} of {len(queries)} queries already have results.", file=sys.stderr)
+
+    if args.output:
+        # Start on a fresh line if an earlier run stopped in the middle of one
+        if os.path.exists(args.output) and os.path.getsize(args.output):
+            with open(args.output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                partial = f.read(1) != b"\n"
+            if partial:
+                with open(args.output, "a") as f:
+                    f.write("\n")
+        results = open(args.output, "a")
+    else:
+        results = sys.stdout
+    base_dir = os.getcwd()
+    failures = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {pool.submit(run_query, spec, base_dir): spec for spec in pending}
+            for finished, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                failures += result["status"] != "ok"
+                # Written and flushed one by one, so a crash loses only unfinished queries
+                results.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+                results.flush()
+                icon = "✅" if result["status"] == "ok" else "❌"
+                print(f"[{finished}/{len(pending)}] {icon} {result['id']} ({result['duration']}s)", file=sys.stderr)
+    finally:
+        if results is not sys.stdout:
+            results.close()
+
+    return 1 if failures else 0
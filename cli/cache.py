@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "codesh")
+
+
+def request_key(request: dict) -> str:
+    """
+    Build a content-addressed key from the model, messages and parameters of a request.
+    """
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM responses, backed by SQLite.
+    Entries expire after a per-tool TTL and the least recently used entries are
+    evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = 50 * 1024 * 1024, enabled: bool = True):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if not enabled:
+            return
+
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "responses.sqlite3")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    def get(self, tool: str, key: str, ttl: float = None):
+        """
+        Return the cached value for key, or None if it is missing or older than ttl seconds.
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and ttl is not None and now - row[1] > ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+
+            if row is None:
+                self.misses[tool] = self.misses.get(tool, 0) + 1
+                return None
+
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits[tool] = self.hits.get(tool, 0) + 1
+            return row[0]
+
+    def put(self, tool: str, key: str, value: str):
+        """
+        Store a value and evict least recently used entries if the cache is over its size limit.
+        A reply without text (None) is not stored.
+        """
+        if not self.enabled or value is None:
+            return
+
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, tool, value, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, tool, value, size, now, now)
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        """
+        Remove every cached response.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters per tool along with the cache size.
+        """
+        entries, size = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+        tools = sorted(set(self.hits) | set(self.misses))
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": size,
+            "tools": {tool: {"hits": self.hits.get(tool, 0), "misses": self.misses.get(tool, 0)} for tool in tools},
+        }
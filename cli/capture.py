@@ -0,0 +1,109 @@
+import os
+import re
+import tempfile
+from collections import deque
+
+ERROR_PATTERN = re.compile(r"ERR!|Error|error:|Traceback|FAILED|fatal:|Exception")
+
+
+class OutputCapture:
+    """
+    Bounded-memory capture of command output.
+
+    Only the first head_lines and last tail_lines are kept in memory, along with up to
+    max_error_lines lines that look like errors. When spill is enabled the complete
+    output is written to a temporary log file as soon as something would be dropped
+    from memory (more lines than fit, or an overlong line).
+    """
+
+    def __init__(self, head_lines: int = 40, tail_lines: int = 80, max_error_lines: int = 30,
+                 max_line_length: int = 2000, spill: bool = True):
+        self.head_lines = head_lines
+        self.max_error_lines = max_error_lines
+        self.max_line_length = max_line_length
+        self.spill = spill
+        self.head = []
+        self.tail = deque(maxlen=tail_lines)
+        self.errors = deque(maxlen=max_error_lines)
+        self.line_count = 0
+        self.byte_count = 0
+        self.log_path = None
+        self._log = None
+        self._partial = ""
+
+    def write(self, text: str):
+        """
+        Add output text; it may contain several lines or end partway through one.
+        """
+        text = self._partial + text
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line + "\n")
+
+    def _open_log(self):
+        fd, self.log_path = tempfile.mkstemp(prefix="codesh-", suffix=".log")
+        self._log = os.fdopen(fd, "w", encoding="utf-8", errors="replace")
+        # Everything so far is still in memory and complete
+        self._log.writelines(self.head)
+        self._log.writelines(line for _, line in self.tail)
+
+    def _add_line(self, line):
+        self.line_count += 1
+        self.byte_count += len(line)
+        if self.spill:
+            if self._log is None and (len(line) > self.max_line_length or
+                                      (len(self.head) == self.head_lines and len(self.tail) == self.tail.maxlen)):
+                self._open_log()
+            if self._log is not None:
+                self._log.write(line)
+
+        if len(line) > self.max_line_length:
+            line = line[:self.max_line_length] + " ...[line truncated]\n"
+        if len(self.head) < self.head_lines:
+            self.head.append(line)
+            return
+        if len(self.tail) == self.tail.maxlen:
+            # The oldest tail line is about to be dropped; keep it if it looks like an error
+            number, dropped = self.tail[0]
+            if ERROR_PATTERN.search(dropped):
+                self.errors.append((number, dropped))
+        self.tail.append((self.line_count, line))
+
+    @property
+    def truncated(self) -> bool:
+        return self.line_count > len(self.head) + len(self.tail)
+
+    def close(self):
+        """
+        Flush any unterminated last line and close the spill log.
+        """
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = ""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def digest(self) -> str:
+        """
+        Return the output if nothing was dropped. Otherwise return a compact summary:
+        head and tail of the output, error lines from the dropped middle section, and
+        the path of the full log.
+        """
+        self.close()
+        tail = "".join(line for _, line in self.tail)
+        parts = ["".join(self.head)]
+        if self.truncated:
+            if tail and not tail.endswith("\n"):
+                tail += "\n"
+            omitted = self.tail[0][0] - len(self.head) - 1
+            parts.append(f"... [{omitted} lines omitted] ...\n")
+        parts.append(tail)
+
+        if self.errors:
+            parts.append("Error lines from the omitted output:\n")
+            parts.extend(f"  line {number}: {line}" for number, line in self.errors)
+        if self.log_path:
+            parts.append(f"\nFull output ({self.line_count} lines, {self.byte_count} bytes) saved to {self.log_path}\n")
+        return "".join(parts)
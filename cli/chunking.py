@@ -0,0 +1,153 @@
+import ast
+import re
+import zlib
+from collections import namedtuple
+
+# A piece of a source file: a display name and its first and last line (1-based, inclusive)
+Chunk = namedtuple("Chunk", ["name", "start", "end", "text"])
+
+IMPORT_LINE = re.compile(r"^(?:import\s|from\s+\S+\s+import\s|#include\b|using\s|package\s|use\s|const\s+\w+\s*=\s*require\()")
+
+_FENCE = re.compile(r"^\s*```[\w+-]*\s*\n(.*?)\n?```\s*$", re.DOTALL)
+
+# About one unit in ANCHOR_EVERY starts a chunk because of what it is, see _anchor()
+ANCHOR_EVERY = 4
+
+
+def _python_units(source: str, lines: list, max_chars: int) -> list:
+    """
+    (name, start, end) for each top-level statement, with classes too large for one
+    chunk split into their header and methods.
+    """
+    tree = ast.parse(source)
+    units = []
+    for node in tree.body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+        name = getattr(node, "name", None)
+        size = sum(len(line) for line in lines[start - 1:node.end_lineno])
+        if isinstance(node, ast.ClassDef) and size > max_chars:
+            methods = [child for child in node.body if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            boundary = start
+            for method in methods:
+                method_start = min([method.lineno] + [decorator.lineno for decorator in method.decorator_list])
+                if method_start > boundary:
+                    units.append((name if boundary == start else None, boundary, method_start - 1))
+                units.append((f"{name}.{method.name}", method_start, method.end_lineno))
+                boundary = method.end_lineno + 1
+            if boundary <= node.end_lineno:
+                units.append((None, boundary, node.end_lineno))
+        else:
+            units.append((name, start, node.end_lineno))
+    return units
+
+
+def _block_units(lines: list) -> list:
+    """
+    Language-agnostic fallback: a new unit starts at a line that begins at column 0
+    after a blank line (a top-level function, class, comment block, ...).
+    """
+    starts = [1]
+    for number in range(2, len(lines) + 1):
+        line = lines[number - 1]
+        if (not lines[number - 2].strip() and line.strip() and not line[0].isspace()
+                and line[0] not in "})]"):
+            starts.append(number)
+    units = []
+    for index, start in enumerate(starts):
+        end = starts[index + 1] - 1 if index + 1 < len(starts) else len(lines)
+        units.append((lines[start - 1].strip()[:60], start, end))
+    return units
+
+
+def _anchor(name, header: str, size: int, max_chars: int) -> bool:
+    # Decided by the unit alone (its name or first line, and whether it is large), so
+    # resizing one function does not move the chunk boundaries in the rest of the file
+    if size >= max_chars // 4:
+        return True
+    return zlib.crc32((name or header).encode("utf-8")) % ANCHOR_EVERY == 0
+
+
+def split_source(source: str, max_chars: int) -> list:
+    """
+    Split source code into chunks of at most about max_chars characters, cutting only
+    at function and class boundaries (Python is parsed with ast; other languages are
+    split at top-level blocks). Neighbouring small units are packed together, and a
+    source that fits in one chunk is returned whole.
+
+    A chunk also starts at every anchor unit (see _anchor), not only where the previous
+    one is full, so an edit only changes the chunks up to the next anchor and the
+    others keep their text (and their cached responses).
+    """
+    lines = source.splitlines(keepends=True)
+    if len(source) <= max_chars or len(lines) < 2:
+        return [Chunk("whole file", 1, len(lines), source)]
+
+    try:
+        units = _python_units(source, lines, max_chars)
+    except (SyntaxError, ValueError):
+        units = _block_units(lines)
+    if not units:
+        return [Chunk("whole file", 1, len(lines), source)]
+
+    # Comments and blank lines between units stay with the unit that follows them,
+    # and anything after the last unit stays with it
+    covered = []
+    for index, (name, start, end) in enumerate(units):
+        header = lines[start - 1].strip()
+        start = covered[-1][3] + 1 if covered else 1
+        end = len(lines) if index == len(units) - 1 else end
+        covered.append((name, header, start, end))
+
+    chunks = []
+    names, first, last, size = [], None, None, 0
+    for name, header, start, end in covered:
+        unit_size = sum(len(line) for line in lines[start - 1:end])
+        if first is not None and (size + unit_size > max_chars or _anchor(name, header, unit_size, max_chars)):
+            chunks.append(_chunk(names, first, last, lines))
+            names, first, size = [], None, 0
+        if first is None:
+            first = start
+        names.append(name or "module level")
+        last, size = end, size + unit_size
+    chunks.append(_chunk(names, first, last, lines))
+    return chunks
+
+
+def _chunk(names: list, start: int, end: int, lines: list) -> Chunk:
+    distinct = list(dict.fromkeys(names))
+    name = ", ".join(distinct[:4]) + (f" and {len(distinct) - 4} more" if len(distinct) > 4 else "")
+    return Chunk(name, start, end, "".join(lines[start - 1:end]))
+
+
+def import_lines(source: str) -> str:
+    """
+    The import (include, require, ...) lines of a source file, as context for chunks.
+    """
+    return "".join(line for line in source.splitlines(keepends=True) if IMPORT_LINE.match(line))
+
+
+def strip_code_fence(text: str) -> str:
+    """
+    Remove a markdown code fence wrapped around a response, if there is one.
+    """
+    match = _FENCE.match(text)
+    return match.group(1) if match else text
+
+
+def merge_tests(parts: list) -> str:
+    """
+    Join test code generated per chunk, moving the import lines of every part to the
+    top once.
+    """
+    imports, bodies = [], []
+    for part in parts:
+        body = []
+        for line in strip_code_fence(part).strip("\n").splitlines():
+            if IMPORT_LINE.match(line):
+                if line not in imports:
+                    imports.append(line)
+            else:
+                body.append(line)
+        bodies.append("\n".join(body).strip("\n"))
+    header = "\n".join(imports) + "\n\n\n" if imports else ""
+    return header + "\n\n\n".join(body for body in bodies if body) + "\n"
@@ -0,0 +1,91 @@
+"""
+Thin command-line client for CodeSH.
+
+    python cli/codesh.py "list files in current directory"   forward a query to the daemon
+    python cli/codesh.py daemon                               start the warm daemon
+    python cli/codesh.py stats                                timings recorded by the daemon
+    python cli/codesh.py serve [port]                         multi-session HTTP/WebSocket server
+    python cli/codesh.py batch queries.jsonl -o results.jsonl run a JSONL file of queries
+    python cli/codesh.py stop                                 stop the daemon
+    python cli/codesh.py                                      interactive session
+
+Only the standard library is imported here, so forwarding a query costs little more
+than starting the interpreter. Without a running daemon the query runs in-process.
+"""
+import json
+import os
+import socket
+import sys
+
+
+def socket_path() -> str:
+    """
+    Return the Unix socket path the daemon listens on.
+    """
+    if os.getenv("CODESH_SOCKET"):
+        return os.getenv("CODESH_SOCKET")
+    directory = os.getenv("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "codesh")
+    return os.path.join(directory, "codesh.sock")
+
+
+def send(request: dict) -> int:
+    """
+    Send a request to the daemon and stream its output to stdout.
+    Returns the exit status reported by the daemon.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path())
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        status = 1
+        with connection.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if reply["type"] == "output":
+                    sys.stdout.write(reply["text"])
+                    sys.stdout.flush()
+                elif reply["type"] == "done":
+                    status = reply.get("status", 0)
+                    break
+        return status
+
+
+def main(argv) -> int:
+    if not argv:
+        import main as agent
+        agent.main()
+        return 0
+
+    if argv[0] == "daemon":
+        import daemon
+        daemon.run(socket_path())
+        return 0
+
+    if argv[0] == "batch":
+        import batch
+        return batch.main(argv[1:])
+
+    if argv[0] == "serve":
+        import server
+        server.run(port=int(argv[1]) if len(argv) > 1 else None)
+        return 0
+
+    if argv[0] in ("stop", "stats"):
+        try:
+            return send({"command": argv[0]})
+        except (FileNotFoundError, ConnectionRefusedError):
+            print("CodeSH daemon is not running.")
+            return 1
+
+    query = " ".join(argv)
+    try:
+        return send({"query": query, "cwd": os.getcwd()})
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No daemon: pay the start-up cost and answer in this process
+        import main as agent
+        agent.answer_query(query)
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
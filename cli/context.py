@@ -0,0 +1,176 @@
+import json
+import os
+import tempfile
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+def _make_token_counter():
+    """
+    Return a function counting tokens in a string, using tiktoken when it is installed
+    and a characters-per-token estimate otherwise.
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.get_encoding("o200k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return lambda text: len(text) // 4 + 1
+
+
+def _shorten(text, limit):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class ConversationWindow:
+    """
+    Conversation history kept inside a token budget.
+
+    The system prompt is always sent. When the history grows past the budget the
+    oldest turns are rolled into a compact summary message, and large observations
+    are stored on disk and replaced by a head/tail excerpt with a reference to the file.
+    """
+
+    def __init__(self, system_prompt: str, budget: int = 12000, observation_limit: int = 1000,
+                 summary_limit: int = 800):
+        self.count_tokens = _make_token_counter()
+        self.budget = budget
+        self.observation_limit = observation_limit
+        self.summary_limit = min(summary_limit, budget // 4)
+        self.system = {"role": "system", "content": system_prompt}
+        self.system_tokens = self._message_tokens(self.system)
+        self.summary_lines = []
+        self.turns = []
+        self.tokens = 0
+        self._observation_dir = None
+        self._observation_count = 0
+
+    def _message_tokens(self, message):
+        # Each message carries a few tokens of role/formatting overhead
+        tokens = self.count_tokens(message.get("content") or "") + 4
+        if message.get("tool_calls"):
+            tokens += self.count_tokens(json.dumps(message["tool_calls"]))
+        return tokens
+
+    def append(self, message: dict):
+        """
+        Add a message to the conversation, starting a new turn on every user message.
+        """
+        if message.get("role") == "user" or not self.turns:
+            self.turns.append([])
+        tokens = self._message_tokens(message)
+        self.turns[-1].append((message, tokens))
+        self.tokens += tokens
+        self._compact()
+
+    def append_observation(self, output):
+        """
+        Add an observe step, replacing oversized tool output with an excerpt and a file reference.
+        """
+        text = output if isinstance(output, str) else json.dumps(output)
+        if self.count_tokens(text) > self.observation_limit:
+            output = self._store_observation(text)
+        self.append({"role": "assistant", "content": json.dumps({"step": "observe", "output": output})})
+
+    def append_tool_result(self, tool_call_id: str, output):
+        """
+        Add the result of a native tool call, compacting oversized output the same way as observations.
+        """
+        text = output if isinstance(output, str) else json.dumps(output)
+        if self.count_tokens(text) > self.observation_limit:
+            text = self._store_observation(text)
+        self.append({"role": "tool", "tool_call_id": tool_call_id, "content": text})
+
+    def _store_observation(self, text):
+        if self._observation_dir is None:
+            self._observation_dir = tempfile.mkdtemp(prefix="codesh-observations-")
+        self._observation_count += 1
+        path = os.path.join(self._observation_dir, f"observation-{self._observation_count}.txt")
+        with open(path, "w") as f:
+            f.write(text)
+
+        # Keep roughly observation_limit tokens, split between the start and the end
+        keep = min(self.observation_limit * 2, len(text) // 4)
+        return (
+            f"{text[:keep]}\n"
+            f"... [{len(text) - keep * 2} characters omitted, full output saved to {path}] ...\n"
+            f"{text[-keep:]}"
+        )
+
+    def _summary_message(self):
+        if not self.summary_lines:
+            return None
+        return {
+            "role": "system",
+            "content": "Summary of earlier conversation:\n" + "\n".join(self.summary_lines)
+        }
+
+    def _summarize_turn(self, turn):
+        query, answer, tools = "", "", []
+        for message, _ in turn:
+            if message.get("role") == "user":
+                query = message.get("content", "")
+                continue
+            if message.get("tool_calls"):
+                tools.extend(call["function"]["name"] for call in message["tool_calls"])
+                continue
+            if message.get("role") == "tool":
+                continue
+            try:
+                step = json.loads(message.get("content") or "")
+            except (TypeError, json.JSONDecodeError):
+                step = None
+            if not isinstance(step, dict):
+                # Plain-text answers come from the native tool calling mode
+                answer = message.get("content") or answer
+                continue
+            if step.get("step") == "action" and step.get("function"):
+                tools.append(step["function"])
+            elif step.get("step") == "output":
+                answer = step.get("content", "")
+
+        line = f"- User asked: {_shorten(query, 200)}"
+        if tools:
+            line += f" | Tools used: {', '.join(dict.fromkeys(tools))}"
+        if answer:
+            line += f" | Answer: {_shorten(answer, 300)}"
+        return line
+
+    def _compact(self):
+        # The current turn is never dropped, even if it alone exceeds the budget
+        while len(self.turns) > 1 and self._request_tokens() > self.budget:
+            turn = self.turns.pop(0)
+            self.tokens -= sum(tokens for _, tokens in turn)
+            self.summary_lines.append(self._summarize_turn(turn))
+
+            while len(self.summary_lines) > 1 and self.count_tokens("\n".join(self.summary_lines)) > self.summary_limit:
+                self.summary_lines.pop(0)
+
+    def _request_tokens(self):
+        summary = self._summary_message()
+        summary_tokens = self._message_tokens(summary) if summary else 0
+        return self.system_tokens + summary_tokens + self.tokens
+
+    def request_messages(self) -> list:
+        """
+        Return the messages to send with the next request.
+        """
+        summary = self._summary_message()
+        request = [self.system] + ([summary] if summary else [])
+        for turn in self.turns:
+            request.extend(message for message, _ in turn)
+        return request
+
+    def __len__(self):
+        return len(self.request_messages())
+
+    def __iter__(self):
+        return iter(self.request_messages())
+
+    def __getitem__(self, index):
+        return self.request_messages()[index]
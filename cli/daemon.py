@@ -0,0 +1,116 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+
+import main as agent
+from output import redirect_output
+
+
+class SocketWriter:
+    """
+    File-like writer that forwards printed text to a client as output messages.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        try:
+            self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        except OSError:
+            # The client went away; keep running the query but stop sending
+            self.closed = True
+
+    def write(self, text):
+        if text:
+            self.send({"type": "output", "text": text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Handle one client request: a query to answer, or a command to report stats or stop the daemon.
+    """
+
+    def handle(self):
+        writer = SocketWriter(self.wfile)
+        try:
+            request = json.loads(self.rfile.readline())
+        except (ValueError, OSError):
+            writer.send({"type": "output", "text": "Error: invalid request\n"})
+            writer.send({"type": "done", "status": 1})
+            return
+
+        if request.get("command") == "stop":
+            writer.send({"type": "output", "text": "CodeSH daemon stopping.\n"})
+            writer.send({"type": "done", "status": 0})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        if request.get("command") == "stats":
+            writer.send({"type": "output", "text": json.dumps(agent.tracer.stats(), indent=2) + "\n"})
+            writer.send({"type": "done", "status": 0})
+            return
+
+        status = 0
+        # Each query gets a shell of its own in the caller's directory, so concurrent
+        # queries never change each other's (or the process's) working directory
+        shell = agent.ShellSession(cwd=request.get("cwd"))
+        with redirect_output(writer), agent.session_shell(shell):
+            try:
+                agent.answer_query(request.get("query", ""), agent.new_conversation())
+            except Exception as e:
+                print(f"Error: {str(e)}")
+                status = 1
+            finally:
+                shell.close()
+        writer.send({"type": "done", "status": status})
+
+
+def _already_running(path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+def run(path: str):
+    """
+    Serve queries on a Unix domain socket until stopped, keeping the interpreter,
+    OpenAI client and caches warm between invocations.
+    """
+    if os.path.exists(path):
+        if _already_running(path):
+            print(f"CodeSH daemon is already running on {path}")
+            return
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Only the current user may connect
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, DaemonHandler)
+    finally:
+        os.umask(old_umask)
+    server.daemon_threads = True
+
+    print(f"CodeSH daemon listening on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
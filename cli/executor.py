@@ -0,0 +1,154 @@
+import asyncio
+import os
+import signal
+import time
+
+from capture import OutputCapture
+
+
+def normalize_commands(commands: list, chain: bool = True) -> list:
+    """
+    Turn a list of command strings and/or {"command", "depends_on"} dicts into command
+    specs with ids. Plain strings depend on the entry before them when chain is True;
+    dicts declare their dependencies explicitly as indexes or ids of earlier entries.
+    """
+    specs = []
+    for index, entry in enumerate(commands):
+        if isinstance(entry, str):
+            spec = {"command": entry, "depends_on": [index - 1] if chain and index > 0 else []}
+        else:
+            spec = dict(entry)
+            spec.setdefault("depends_on", [])
+        spec.setdefault("id", str(index + 1))
+        specs.append(spec)
+
+    ids = [spec["id"] for spec in specs]
+    for spec in specs:
+        spec["depends_on"] = [ids[dep] if isinstance(dep, int) and 0 <= dep < len(ids) else str(dep)
+                              for dep in spec["depends_on"]]
+    return specs
+
+
+def run_commands(commands: list, max_workers: int = None, cwd: str = None, timeout: float = None,
+                 on_output=None, new_capture=OutputCapture) -> list:
+    """
+    Run a batch of commands, starting each one as soon as its dependencies have succeeded
+    and running independent commands concurrently, up to max_workers at a time.
+
+    commands is a list of {"id", "command", "cwd" (optional), "depends_on" (optional)} specs.
+    on_output is called with (command_id, stream, line) for every line of output.
+    Output is kept in bounded OutputCapture objects made by new_capture, and each
+    result holds their digests.
+    Returns one result dict per command, in the order given.
+    """
+    return asyncio.run(run_batch(commands, max_workers=max_workers, cwd=cwd, timeout=timeout,
+                                 on_output=on_output, new_capture=new_capture))
+
+
+async def run_batch(commands, max_workers=None, cwd=None, timeout=None, on_output=None, new_capture=OutputCapture):
+    """
+    Async version of run_commands.
+    """
+    specs = {spec["id"]: spec for spec in commands}
+    for spec in commands:
+        unknown = [dep for dep in spec.get("depends_on", []) if dep not in specs]
+        if unknown:
+            raise ValueError(f"Command {spec['id']} depends on unknown commands: {', '.join(unknown)}")
+    _check_cycles(specs)
+
+    semaphore = asyncio.Semaphore(max_workers or os.cpu_count() or 4)
+    tasks = {}
+
+    async def run_one(spec):
+        for dep in spec.get("depends_on", []):
+            result = await tasks[dep]
+            if result["status"] != "ok":
+                return _result(spec, "skipped", None, "", f"Skipped because {dep} did not succeed", 0.0)
+        async with semaphore:
+            return await _run_command(spec, _command_cwd(spec, cwd), timeout, on_output, new_capture)
+
+    for command_id, spec in specs.items():
+        tasks[command_id] = asyncio.ensure_future(run_one(spec))
+    results = await asyncio.gather(*tasks.values())
+    by_id = dict(zip(tasks, results))
+    return [by_id[spec["id"]] for spec in commands]
+
+
+def _command_cwd(spec, cwd):
+    # A command's own cwd is relative to the batch's, not to this process's directory
+    if not spec.get("cwd"):
+        return cwd
+    return os.path.join(cwd or os.getcwd(), os.path.expanduser(spec["cwd"]))
+
+
+def _check_cycles(specs):
+    state = {}
+
+    def visit(command_id):
+        if state.get(command_id) == "done":
+            return
+        if state.get(command_id) == "visiting":
+            raise ValueError(f"Dependency cycle involving command {command_id}")
+        state[command_id] = "visiting"
+        for dep in specs[command_id].get("depends_on", []):
+            visit(dep)
+        state[command_id] = "done"
+
+    for command_id in specs:
+        visit(command_id)
+
+
+def _result(spec, status, exit_code, stdout, stderr, duration):
+    return {
+        "id": spec["id"],
+        "command": spec["command"],
+        "status": status,
+        "exit_code": exit_code,
+        "stdout": stdout,
+        "stderr": stderr,
+        "duration": round(duration, 3),
+    }
+
+
+async def _run_command(spec, cwd, timeout, on_output, new_capture):
+    started = time.monotonic()
+    try:
+        process = await asyncio.create_subprocess_shell(
+            spec["command"],
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=True
+        )
+    except OSError as e:
+        # A missing cwd and the like fail this command, not the whole batch
+        return _result(spec, "failed", None, "", f"Could not start command: {str(e)}", time.monotonic() - started)
+
+    async def read(stream, name, capture):
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            text = line.decode("utf-8", errors="replace")
+            capture.write(text)
+            if on_output is not None:
+                on_output(spec["id"], name, text)
+
+    stdout, stderr = new_capture(), new_capture()
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(read(process.stdout, "stdout", stdout), read(process.stderr, "stderr", stderr), process.wait()),
+            timeout
+        )
+    except asyncio.TimeoutError:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        stderr.write(f"\nCommand timed out after {timeout} seconds\n")
+        return _result(spec, "timeout", process.returncode, stdout.digest(), stderr.digest(), time.monotonic() - started)
+
+    status = "ok" if process.returncode == 0 else "failed"
+    return _result(spec, status, process.returncode, stdout.digest(), stderr.digest(), time.monotonic() - started)
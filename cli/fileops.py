@@ -0,0 +1,287 @@
+import os
+import re
+import shlex
+import shutil
+
+HEREDOC_PATTERN = re.compile(r"<<(-?)\s*(['\"]?)([A-Za-z_][A-Za-z0-9_]*)\2")
+
+# Anything containing these is left to the shell
+SHELL_SYNTAX = re.compile(r"[`$*?\[\]{}|;()\\]|\|\||(?<![&])&(?!&)")
+
+
+def split_commands(text: str) -> list:
+    """
+    Split generated shell text into commands, one per line, keeping heredoc bodies
+    together with the command that opens them.
+    """
+    commands = []
+    lines = text.split("\n")
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        if not line.strip():
+            continue
+
+        block = [line]
+        match = HEREDOC_PATTERN.search(line)
+        if match:
+            strip_tabs, delimiter = match.group(1) == "-", match.group(3)
+            while i < len(lines):
+                body_line = lines[i]
+                i += 1
+                block.append(body_line)
+                candidate = body_line.lstrip("\t") if strip_tabs else body_line
+                if candidate.rstrip() == delimiter:
+                    break
+        commands.append("\n".join(block))
+    return commands
+
+
+def _tokenize(text):
+    lexer = shlex.shlex(text, posix=True, punctuation_chars="<>&")
+    lexer.whitespace_split = True
+    return list(lexer)
+
+
+class FileOpEngine:
+    """
+    Run common file operations (mkdir, touch, echo/cat redirections, cp, mv) as direct
+    filesystem calls instead of starting a shell for each one.
+
+    Writes and directory creation are buffered and applied in batches; they are
+    flushed before any operation that reads the filesystem and before falling back
+    to the shell for commands that are not recognized. Parent directories of
+    written files are created as needed.
+    """
+
+    def __init__(self, fallback, cwd: str = "."):
+        self.fallback = fallback
+        self.cwd = cwd
+        self.handled = 0
+        self.delegated = 0
+        self._dirs = set()
+        self._created = set()
+        self._writes = {}
+        self._errors = []
+
+    def _path(self, path):
+        return os.path.normpath(os.path.join(self.cwd, os.path.expanduser(path)))
+
+    def run(self, command: str) -> str:
+        """
+        Run a command, in-process when it is recognized and through the fallback otherwise.
+        """
+        operations = self._parse(command)
+        if operations is None:
+            self.flush()
+            # The shell may remove or move directories this engine created ("rm -rf build")
+            self._created.clear()
+            self.delegated += 1
+            return self.fallback(command)
+
+        try:
+            for operation, args in operations:
+                operation(*args)
+        except OSError as e:
+            return f"Command failed: {e}"
+        self.handled += 1
+        return "Command executed successfully."
+
+    def appended_paths(self, command: str) -> list:
+        """
+        The files a recognized command appends to ("echo ... >> file"), as full paths.
+        """
+        operations = self._parse(command) or []
+        return [self._path(args[0]) for operation, args in operations if operation == self._write and args[2]]
+
+    def _parse(self, command):
+        """
+        Return a list of (operation, args) for a recognized command, or None.
+        """
+        first_line, _, body = command.partition("\n")
+        heredoc = HEREDOC_PATTERN.search(first_line)
+        if heredoc:
+            strip_tabs, quoted, delimiter = heredoc.group(1) == "-", heredoc.group(2), heredoc.group(3)
+            body_lines = body.split("\n")
+            if not body_lines or (body_lines[-1].lstrip("\t") if strip_tabs else body_lines[-1]).rstrip() != delimiter:
+                return None
+            body_lines = body_lines[:-1]
+            if strip_tabs:
+                body_lines = [line.lstrip("\t") for line in body_lines]
+            content = "".join(line + "\n" for line in body_lines)
+            # Unquoted delimiters let the shell expand variables and command substitutions
+            if not quoted and re.search(r"[`$\\]", content):
+                return None
+            first_line = first_line[:heredoc.start()] + first_line[heredoc.end():]
+            return self._parse_heredoc(first_line, content)
+
+        if "\n" in command.strip() or SHELL_SYNTAX.search(command):
+            return None
+
+        try:
+            tokens = _tokenize(command)
+        except ValueError:
+            return None
+
+        # Simple "a && b" chains are handled when every part is recognized
+        operations = []
+        part = []
+        for token in tokens + ["&&"]:
+            if token != "&&":
+                part.append(token)
+                continue
+            parsed = self._parse_simple(part)
+            if parsed is None:
+                return None
+            operations.append(parsed)
+            part = []
+        return operations
+
+    def _parse_heredoc(self, line, content):
+        if SHELL_SYNTAX.search(line):
+            return None
+        try:
+            tokens = _tokenize(line)
+        except ValueError:
+            return None
+        if not tokens or tokens[0] != "cat":
+            return None
+
+        target, append = self._redirect(tokens[1:])
+        if target is None or len(tokens) != 3:
+            return None
+        return [(self._write, (target, content, append))]
+
+    def _redirect(self, tokens):
+        """
+        Return the (target, append) of a trailing "> file" or ">> file" redirection.
+        """
+        if len(tokens) >= 2 and tokens[-2] in (">", ">>"):
+            return tokens[-1], tokens[-2] == ">>"
+        return None, False
+
+    def _parse_simple(self, tokens):
+        if not tokens:
+            return None
+        name, args = tokens[0], tokens[1:]
+
+        if name == "echo":
+            target, append = self._redirect(args)
+            if target is None:
+                return None
+            words = args[:-2]
+            newline = True
+            if words and words[0] == "-n":
+                newline = False
+                words = words[1:]
+            if (words and words[0].startswith("-")) or any(word in (">", ">>", "<", "<<", "&") for word in words):
+                return None
+            return (self._write, (target, " ".join(words) + ("\n" if newline else ""), append))
+
+        if any(token in (">", ">>", "<", "<<", "&") for token in args):
+            return None
+
+        if name == "mkdir":
+            parents = "-p" in args
+            paths = [arg for arg in args if arg != "-p"]
+            if not paths or any(path.startswith("-") for path in paths):
+                return None
+            return (self._mkdir, (paths, parents))
+
+        if name == "touch":
+            if not args or any(arg.startswith("-") for arg in args):
+                return None
+            return (self._touch, (args,))
+
+        if name in ("cp", "mv"):
+            recursive = False
+            paths = []
+            for arg in args:
+                if arg in ("-r", "-R") and name == "cp":
+                    recursive = True
+                elif arg.startswith("-"):
+                    return None
+                else:
+                    paths.append(arg)
+            if len(paths) != 2:
+                return None
+            if name == "cp":
+                return (self._copy, (paths[0], paths[1], recursive))
+            return (self._move, (paths[0], paths[1]))
+
+        return None
+
+    def _ensure_parent(self, path):
+        parent = os.path.dirname(path)
+        if parent and parent not in self._created:
+            self._dirs.add(parent)
+
+    def _mkdir(self, paths, parents):
+        for path in paths:
+            full = self._path(path)
+            if parents:
+                if full not in self._created:
+                    self._dirs.add(full)
+            else:
+                self.flush()
+                os.mkdir(full)
+                self._created.add(full)
+
+    def _touch(self, paths):
+        for path in paths:
+            full = self._path(path)
+            self._ensure_parent(full)
+            self._writes.setdefault(full, {"truncate": False, "chunks": []})
+
+    def _write(self, target, content, append):
+        full = self._path(target)
+        self._ensure_parent(full)
+        pending = self._writes.get(full)
+        if not append or pending is None:
+            pending = {"truncate": not append, "chunks": []}
+            self._writes[full] = pending
+        pending["chunks"].append(content)
+
+    def _copy(self, source, destination, recursive):
+        self.flush()
+        source, destination = self._path(source), self._path(destination)
+        if os.path.isdir(source):
+            if not recursive:
+                raise IsADirectoryError(f"cp: {source} is a directory (not copied)")
+            if os.path.isdir(destination):
+                destination = os.path.join(destination, os.path.basename(source))
+            shutil.copytree(source, destination, dirs_exist_ok=True)
+        else:
+            shutil.copy2(source, destination)
+
+    def _move(self, source, destination):
+        self.flush()
+        self._created.clear()
+        shutil.move(self._path(source), self._path(destination))
+
+    def flush(self) -> list:
+        """
+        Apply buffered directory creation and file writes.
+        Returns the errors met since the previous flush.
+        """
+        for directory in sorted(self._dirs):
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._created.add(directory)
+            except OSError as e:
+                self._errors.append(f"mkdir {directory}: {e}")
+        self._dirs.clear()
+
+        for path, pending in self._writes.items():
+            try:
+                with open(path, "w" if pending["truncate"] else "a") as f:
+                    f.write("".join(pending["chunks"]))
+                if not pending["truncate"] and not pending["chunks"]:
+                    os.utime(path)
+            except OSError as e:
+                self._errors.append(f"write {path}: {e}")
+        self._writes.clear()
+
+        errors, self._errors = self._errors, []
+        return errors
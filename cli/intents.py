@@ -0,0 +1,140 @@
+import os
+import re
+import shlex
+from collections import namedtuple
+
+Intent = namedtuple("Intent", ["name", "command"])
+
+# A path slot: a quoted string, or a single word made of path characters
+_PATH = r"""(?P<{}>"[^"]+"|'[^']+'|[\w.~/@+-]+)"""
+
+# Words that name the directory commands already run in
+_HERE = r"(?:here|(?:the |this )?(?:current|working|present)(?: working)? (?:directory|folder|dir)|this (?:directory|folder|dir))"
+
+_FOLDER = r"(?:folder|directory|dir)"
+_CALLED = r"(?:(?:called|named) )?"
+
+# Extensions that mark a bare word as a file name ("print notes.txt", but not "print 3.14")
+FILE_EXTENSIONS = {
+    "bash", "bat", "c", "cc", "cfg", "cjs", "conf", "cpp", "cs", "css", "csv", "dart", "env", "gitignore",
+    "go", "gradle", "h", "hpp", "htm", "html", "ini", "java", "js", "json", "jsx", "kt", "less", "lock",
+    "log", "lua", "md", "mjs", "php", "pl", "properties", "ps1", "py", "r", "rb", "rs", "rst", "sass",
+    "scala", "scss", "sh", "sql", "svelte", "swift", "tf", "toml", "ts", "tsx", "txt", "vue", "xml",
+    "yaml", "yml", "zsh",
+}
+
+
+def _pattern(text: str):
+    return re.compile(text.replace(" ", r"\s+"), re.IGNORECASE)
+
+
+def _path(name: str) -> str:
+    return _PATH.format(name)
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+
+def shell_path(value: str) -> str:
+    """
+    Quote a path slot for the shell, keeping a leading ~ so it still expands.
+    """
+    value = _unquote(value)
+    if value == "~":
+        return "~"
+    if value.startswith("~/"):
+        return "~/" + shlex.quote(value[2:])
+    return shlex.quote(value)
+
+
+def _local_path(value: str, cwd: str) -> str:
+    return os.path.join(cwd, os.path.expanduser(_unquote(value)))
+
+
+def _file_name(slots, cwd) -> bool:
+    path = _unquote(slots["path"])
+    return path.rsplit(".", 1)[-1].lower() in FILE_EXTENSIONS or os.path.isfile(_local_path(path, cwd))
+
+
+def _directory(slots, cwd) -> bool:
+    return os.path.isdir(_local_path(slots["path"], cwd))
+
+
+def _list(slots):
+    return f"ls -la {shell_path(slots['path'])}" if slots.get("path") else "ls -la"
+
+
+def _mkdir(slots):
+    path = _unquote(slots["name"])
+    if slots.get("parent"):
+        path = os.path.join(_unquote(slots["parent"]), path)
+    return f"mkdir -p -- {shell_path(path)}"
+
+
+# Ordered table of (intent name, compiled pattern, command builder[, check]). A query must
+# match a pattern in full, and pass the check (called with the slots and the directory
+# commands run in) where there is one; anything else is left to the model.
+INTENTS = [
+    ("list_files", _pattern(
+        rf"(?:ls(?: (?:-la|-al|-l|-a))?|(?:list|show)(?: me)?(?: all)?(?: the)? (?:files|files and (?:folders|directories)|(?:folders|directories))"
+        rf"(?: (?:in|of|inside) (?:{_HERE}|(?:the )?(?:{_FOLDER} )?{_path('path')}))?)"), _list),
+    ("list_files", _pattern(rf"ls(?: (?:-la|-al|-l|-a))? {_path('path')}"), _list),
+    ("current_directory", _pattern(
+        rf"(?:pwd|where am i|(?:show|print|display|what is|what's)(?: me)? (?:the )?(?:current|working|present)(?: working)? (?:directory|folder|dir|path))"),
+        lambda slots: "pwd"),
+    ("create_directory", _pattern(
+        rf"(?:create|make|add)(?: a| an)?(?: new)?(?: empty)? {_FOLDER} {_CALLED}{_path('name')}"
+        rf"(?: (?:in|inside|under) (?:{_HERE}|(?:the )?(?:{_FOLDER} )?{_path('parent')}))?"),
+        _mkdir),
+    ("create_directory", _pattern(rf"mkdir(?: -p)? {_path('name')}"), _mkdir),
+    ("create_file", _pattern(
+        rf"(?:touch |(?:create|make|add)(?: a| an)?(?: new)?(?: empty| blank)? file {_CALLED}){_path('name')}"),
+        lambda slots: f"touch -- {shell_path(slots['name'])}"),
+    ("show_file", _pattern(
+        rf"(?:show|display|print|cat|read)(?: me)?(?: the)? (?:(?:contents?|text) of (?:the )?(?:file )?|file ){_path('path')}"),
+        lambda slots: f"cat -- {shell_path(slots['path'])}"),
+    ("show_file", _pattern(
+        rf"(?:show|display|print|cat|read)(?: me)? (?P<path>[\w.~/@+-]*\.\w+)"),
+        lambda slots: f"cat -- {shell_path(slots['path'])}", _file_name),
+    ("change_directory", _pattern(
+        rf"(?:cd|(?:go|change directory) (?:in)?to(?: the)?(?: {_FOLDER})?|(?:switch|move) (?:in)?to(?: the)? {_FOLDER}) {_path('path')}"),
+        lambda slots: f"cd -- {shell_path(slots['path'])}"),
+    # "switch to main" is more likely about a git branch than a folder
+    ("change_directory", _pattern(
+        rf"(?:switch|move) (?:in)?to(?: the)? {_path('path')}"),
+        lambda slots: f"cd -- {shell_path(slots['path'])}", _directory),
+    ("copy", _pattern(
+        rf"(?:copy|duplicate)(?: the)?(?: file| {_FOLDER})? {_path('source')} (?:to|into|as) {_path('target')}"),
+        lambda slots: f"cp -rn -- {shell_path(slots['source'])} {shell_path(slots['target'])}"),
+    ("move", _pattern(
+        rf"(?:move|rename)(?: the)?(?: file| {_FOLDER})? {_path('source')} (?:to|into|as) {_path('target')}"),
+        lambda slots: f"mv -n -- {shell_path(slots['source'])} {shell_path(slots['target'])}"),
+]
+
+# Politeness and trailing punctuation; a dot that is part of a path such as ".." is kept
+_POLITE = re.compile(r"^(?:please|can you|could you|kindly)\s+|\s+please$|(?<=\w)[.!?]+$|\s+$", re.IGNORECASE)
+
+
+def match_intent(query: str, cwd: str = None):
+    """
+    Map a simple file or directory request to a shell command with the pattern table.
+    cwd is the directory the command would run in, for the checks that look at the files
+    there. Returns an Intent, or None when no pattern matches the whole query.
+    """
+    cwd = cwd or os.getcwd()
+    text = query.strip()
+    previous = None
+    while previous != text:
+        previous, text = text, _POLITE.sub("", text).strip()
+
+    for name, pattern, build, *check in INTENTS:
+        match = pattern.fullmatch(text)
+        if match:
+            slots = {key: value for key, value in match.groupdict().items() if value}
+            if check and not check[0](slots, cwd):
+                continue
+            return Intent(name, build(slots))
+    return None
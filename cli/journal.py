@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "codesh", "journals")
+
+
+def step_id(*parts) -> str:
+    """
+    Stable id of a step built from what it does (its command or content and where it
+    runs), so a step that changed never matches an earlier run's record.
+    """
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ProjectJournal:
+    """
+    Append-only JSON Lines journal of one project's creation. It starts with the plan
+    (everything needed to redo the job without asking the model again) followed by one
+    record per finished step with its status, exit code and the artifacts it produced.
+    A step counts as done when its latest record since the plan succeeded and its
+    artifacts are still on disk unchanged.
+    """
+
+    def __init__(self, path: str, project_dir: str, enabled: bool = True):
+        self.path = path
+        self.project_dir = project_dir
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.records = self._load()
+
+    @classmethod
+    def for_project(cls, root: str, project_dir: str, enabled: bool = True):
+        """
+        The journal of the project in project_dir, kept under root.
+        """
+        key = hashlib.sha256(os.path.realpath(project_dir).encode()).hexdigest()[:16]
+        return cls(os.path.join(root or DEFAULT_JOURNAL_DIR, f"{key}.jsonl"), project_dir, enabled)
+
+    def _load(self) -> list:
+        records = []
+        if not self.enabled or not os.path.exists(self.path):
+            return records
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+        return records
+
+    def _append(self, record: dict):
+        record = {"time": round(time.time(), 3), **record}
+        with self.lock:
+            self.records.append(record)
+            if not self.enabled:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _current(self) -> list:
+        """
+        Records since the latest plan.
+        """
+        with self.lock:
+            for index in range(len(self.records) - 1, -1, -1):
+                if self.records[index]["event"] == "plan":
+                    return self.records[index:]
+        return []
+
+    def plan(self):
+        """
+        The latest plan record ({"kind", "plan", ...}), or None.
+        """
+        current = self._current()
+        return current[0] if current else None
+
+    def begin(self, kind: str, plan, fresh: bool = False) -> bool:
+        """
+        Record the plan of a run. Running the same plan again after an unfinished run keeps
+        the earlier step records, so finished steps are skipped; a different plan, a run
+        that completed, or fresh starts over. Returns True when an earlier run is continued.
+        """
+        current = self.plan()
+        if not fresh and current and not self.finished() and current["kind"] == kind and current["plan"] == plan:
+            self._append({"event": "resume"})
+            return True
+        self._append({"event": "plan", "kind": kind, "plan": plan, "project_dir": self.project_dir})
+        return False
+
+    def resume(self):
+        self._append({"event": "resume"})
+
+    def entry(self, entry: dict):
+        """
+        Record part of a plan that arrives while the run is already going (a manifest entry).
+        """
+        self._append({"event": "entry", "entry": entry})
+
+    def entries(self) -> list:
+        return [record["entry"] for record in self._current() if record["event"] == "entry"]
+
+    def mark(self, event: str):
+        self._append({"event": event})
+
+    def has(self, event: str) -> bool:
+        return any(record["event"] == event for record in self._current())
+
+    def is_done(self, step: str) -> bool:
+        latest = None
+        for record in self._current():
+            if record["event"] == "step" and record["step"] == step:
+                latest = record
+        if latest is None or latest["status"] != "ok":
+            return False
+        for artifact in latest.get("artifacts", []):
+            path = os.path.join(self.project_dir, artifact["path"])
+            if not os.path.exists(path):
+                return False
+            if artifact.get("sha256") and (not os.path.isfile(path) or file_digest(path) != artifact["sha256"]):
+                return False
+        return True
+
+    def record(self, step: str, label: str, status: str, exit_code: int = None, artifacts=(),
+               hashed: bool = False, error: str = None):
+        """
+        Record a finished step. artifacts are paths relative to the project directory
+        that the step produced; with hashed, files are also checked for changes later.
+        """
+        produced = []
+        for path in artifacts:
+            artifact = {"path": path}
+            full_path = os.path.join(self.project_dir, path)
+            if hashed and status == "ok" and os.path.isfile(full_path):
+                artifact["sha256"] = file_digest(full_path)
+            produced.append(artifact)
+        self._append({"event": "step", "step": step, "label": label[:200], "status": status,
+                      "exit_code": exit_code, "artifacts": produced, "error": (error or "")[-500:] or None})
+
+    def finish(self, status: str = "ok"):
+        self._append({"event": "finished", "status": status})
+
+    def finished(self) -> bool:
+        current = self._current()
+        return bool(current) and current[-1]["event"] == "finished" and current[-1]["status"] == "ok"
+
+    def summary(self) -> dict:
+        latest = {}
+        for record in self._current():
+            if record["event"] == "step":
+                latest[record["step"]] = record["status"]
+        statuses = list(latest.values())
+        return {"done": statuses.count("ok"), "failed": len(statuses) - statuses.count("ok")}
@@ -1,99 +1,615 @@
+import contextvars
+import hashlib
 import json
 import os
 import subprocess
+import sys
 import threading
 import time
-import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from cache import ResponseCache, request_key
+from capture import OutputCapture
+from chunking import import_lines, merge_tests, split_source, strip_code_fence
+from context import ConversationWindow
+from executor import normalize_commands, run_commands
+from fileops import FileOpEngine, split_commands
+from intents import match_intent
+from journal import DEFAULT_JOURNAL_DIR, ProjectJournal, step_id
+from output import emit
+from patching import PATCH_INSTRUCTIONS, apply_hunks, atomic_file, format_hunk, parse_hunks, unified_diff, write_atomic
+from plans import PlanIndex
+from routing import DEFAULT_ROUTES, ModelRouter, parse_routes
+from scaffold import ScaffoldCache
+from scheduler import RequestScheduler
+from shell import ShellSession
+from streaming import FenceStripper, ManifestStreamParser, StepStreamParser
+from testrun import TestRunner, can_run, referenced_names, replace_tests, test_units, trim_traceback
+from toolcalls import parse_arguments, tool_call_message, tool_schemas
+from tracing import Tracer, current_span
+from workspace import WorkspaceIndex, extract_symbols, is_project_root
+
 load_dotenv()
 
-client = OpenAI()
+# Timing spans for LLM calls, tool dispatches and commands, summarized by the 'stats'
+# command (CODESH_TRACE=0 to disable) and appended to a JSONL trace file only when
+# CODESH_TRACE_PATH is set
+tracer = Tracer(
+    path=os.getenv("CODESH_TRACE_PATH") or None,
+    enabled=os.getenv("CODESH_TRACE", "1") != "0",
+    max_bytes=int(os.getenv("CODESH_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+)
+
+# One client for the whole process, so its pool of keep-alive connections is reused
+# by every request; retries are left to the scheduler so they respect the shared limits
+MAX_CONCURRENT_REQUESTS = int(os.getenv("CODESH_MAX_CONCURRENT_REQUESTS", "8"))
+client = OpenAI(max_retries=0)
+
+# Shared request layer: rate limits, bounded concurrency, backoff and per-call deadlines
+scheduler = RequestScheduler(
+    client.chat.completions.create,
+    requests_per_minute=int(os.getenv("CODESH_RPM", "500")),
+    tokens_per_minute=int(os.getenv("CODESH_TPM", "30000")),
+    max_concurrency=MAX_CONCURRENT_REQUESTS,
+    max_retries=int(os.getenv("CODESH_MAX_RETRIES", "5")),
+    deadline=float(os.getenv("CODESH_REQUEST_DEADLINE", "120"))
+)
+
+# Model for each tool ("agent" is the step loop): CODESH_MODEL_ROUTES entries like
+# "generate_command=gpt-4o-mini,gpt-4o" are tried in order, and a model that gets slow or
+# keeps failing is skipped for a cool-down period
+router = ModelRouter(
+    routes={**DEFAULT_ROUTES, **parse_routes(os.getenv("CODESH_MODEL_ROUTES", ""))},
+    default=os.getenv("CODESH_MODEL", "gpt-4o"),
+    slow_seconds=float(os.getenv("CODESH_MODEL_SLOW_SECONDS", "30")),
+    cooldown=float(os.getenv("CODESH_MODEL_COOLDOWN", "60"))
+)
+
+def record_usage(span, response):
+    """
+    Copy the token usage reported with a response (or final stream chunk) onto a span.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+def traced_stream(stream, span, on_finish=None):
+    """
+    Pass a streamed response through, finishing its span once the stream has been read.
+    on_finish is then called with the error that ended the stream, if any.
+    """
+    received = 0
+    error = None
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not received:
+                    span.set(first_token_ms=round(span.elapsed_ms(), 2))
+                received += len(chunk.choices[0].delta.content)
+            record_usage(span, chunk)
+            yield chunk
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # Stop the download too if the reader gave up on the rest of the stream
+        if hasattr(stream, "close"):
+            stream.close()
+        span.set(output_bytes=received)
+        span.finish(error=error)
+        if on_finish is not None:
+            on_finish(error)
+
+def chat_completion(tool: str = "agent", on_model=None, **request):
+    """
+    Send a chat completion request through the shared scheduler, recording a trace span
+    with the model, token usage, request and response sizes, queue wait and retries.
+    A streamed response is timed until it has been fully read.
+    The model comes from the tool's route; if a model fails once the scheduler has given
+    up retrying it, the request moves on to the next model in the route. on_model, if
+    given, is called with the model that answered.
+    """
+    streaming = bool(request.get("stream"))
+    if streaming and tracer.enabled:
+        request.setdefault("stream_options", {"include_usage": True})
+    models = [request.pop("model")] if "model" in request else router.candidates(tool)
+    input_bytes = len(json.dumps(request, ensure_ascii=False, default=str))
+    for attempt, model in enumerate(models):
+        span = tracer.start("llm", model, tool=tool, stream=streaming, fallback=attempt, input_bytes=input_bytes)
+        started = time.monotonic()
+        try:
+            response = scheduler.call(span=span, model=model, **request)
+            break
+        except Exception as e:
+            span.finish(error=e)
+            router.record(tool, model, time.monotonic() - started, error=e)
+            if attempt == len(models) - 1:
+                raise
+
+    if on_model is not None:
+        on_model(model)
+    if streaming:
+        return traced_stream(response, span, lambda error: router.record(tool, model, time.monotonic() - started, error))
+    router.record(tool, model, time.monotonic() - started)
+    message = response.choices[0].message
+    record_usage(span, response)
+    span.set(output_bytes=len(message.content or "") + sum(len(call.function.arguments or "") for call in message.tool_calls or []))
+    span.finish()
+    return response
+
+# Stream agent steps as they are generated (set CODESH_STREAM=0 to wait for whole responses)
+STREAM_STEPS = os.getenv("CODESH_STREAM", "1") != "0"
+
+# Cache for the deterministic single-shot helpers (set CODESH_CACHE=0 to disable)
+response_cache = ResponseCache(
+    path=os.getenv("CODESH_CACHE_PATH"),
+    max_bytes=int(os.getenv("CODESH_CACHE_MAX_MB", "50")) * 1024 * 1024,
+    enabled=os.getenv("CODESH_CACHE", "1") != "0"
+)
+
+# How long cached responses stay valid for each tool, in seconds
+CACHE_TTLS = {
+    "generate_command": 7 * 24 * 3600,
+    "generate_code": 24 * 3600,
+    "detect_project_type": 24 * 3600,
+    "explain_code": 7 * 24 * 3600,
+    "improve_code": 24 * 3600,
+    "generate_test": 24 * 3600,
+}
+
+# Snapshots of npm project skeletons, reused by later projects with the same type and
+# dependencies instead of reinstalling (set CODESH_SCAFFOLD_CACHE=0 to disable)
+scaffold_cache = ScaffoldCache(
+    root=os.getenv("CODESH_SCAFFOLD_CACHE_PATH"),
+    max_bytes=int(os.getenv("CODESH_SCAFFOLD_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+    enabled=os.getenv("CODESH_SCAFFOLD_CACHE", "1") != "0"
+)
+
+# Run commands in one long-lived shell (set CODESH_PERSISTENT_SHELL=0 for a new shell per command)
+PERSISTENT_SHELL = os.getenv("CODESH_PERSISTENT_SHELL", "1") != "0"
+shell_session = ShellSession()
+
+# Shell of the session being served in the current context; the API server gives each
+# of its sessions its own, so working directories stay isolated
+_session_shell = contextvars.ContextVar("codesh_shell", default=None)
+
+# Default per-command timeout in seconds (0 means no limit)
+COMMAND_TIMEOUT = float(os.getenv("CODESH_COMMAND_TIMEOUT", "0")) or None
+
+# How much command output is kept for the model: the first and last lines, plus error
+# lines in between; the full output is saved to a temp log (CODESH_SPILL_LOGS=0 to disable)
+OUTPUT_HEAD_LINES = int(os.getenv("CODESH_OUTPUT_HEAD_LINES", "40"))
+OUTPUT_TAIL_LINES = int(os.getenv("CODESH_OUTPUT_TAIL_LINES", "80"))
+SPILL_LOGS = os.getenv("CODESH_SPILL_LOGS", "1") != "0"
+
+# Upper bound on commands the executor runs at the same time
+MAX_WORKERS = int(os.getenv("CODESH_MAX_WORKERS", "0")) or os.cpu_count() or 4
+
+# Sources larger than this many tokens are split at function and class boundaries and
+# their chunks sent concurrently by explain_code, improve_code and generate_test
+CHUNK_TOKENS = int(os.getenv("CODESH_CHUNK_TOKENS", "1500"))
+chunk_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+
+# How improve_code returns its changes: "patch" asks the model for search/replace edits
+# and applies them locally, "full" asks for the whole rewritten code, and "auto" uses
+# patch for file paths and full for code given inline
+IMPROVE_MODE = os.getenv("CODESH_IMPROVE_MODE", "auto")
+
+# generate_test with verify runs the generated tests in a scratch directory, sharded over
+# worker processes with a per-test timeout, and regenerates only the failing tests for up
+# to CODESH_TEST_FIX_ROUNDS rounds; each test's outcome is cached by source and test content
+TEST_FIX_ROUNDS = int(os.getenv("CODESH_TEST_FIX_ROUNDS", "2"))
+test_runner = TestRunner(
+    workers=MAX_WORKERS,
+    timeout=float(os.getenv("CODESH_TEST_TIMEOUT", "10")),
+    cache=response_cache
+)
+
+# Generate projects from one streamed manifest call that also detects the project type,
+# writing files while the rest is still arriving (set CODESH_PROJECT_MANIFEST=0 for the
+# separate detection call followed by generated shell commands)
+PROJECT_MANIFEST = os.getenv("CODESH_PROJECT_MANIFEST", "1") != "0"
+
+# Append-only journal of each project creation's plan and steps, so one that fails or is
+# interrupted can be finished with resume_project instead of starting over
+# (CODESH_JOURNAL=0 to disable)
+JOURNAL_DIR = os.getenv("CODESH_JOURNAL_PATH") or DEFAULT_JOURNAL_DIR
+JOURNAL_ENABLED = os.getenv("CODESH_JOURNAL", "1") != "0"
+
+# Plans of projects created successfully, reused for later descriptions that match one
+# once paths, names and filler words are taken out, so those projects are built without
+# any model calls; a weaker match than the threshold goes to the model
+# (CODESH_PLAN_REUSE=0 to disable)
+plan_index = PlanIndex(
+    path=os.getenv("CODESH_PLAN_INDEX_PATH"),
+    threshold=float(os.getenv("CODESH_PLAN_REUSE_THRESHOLD", "0.9")),
+    enabled=os.getenv("CODESH_PLAN_REUSE", "1") != "0"
+)
+
+# Symbol table and search index of the source files under each working directory, kept
+# in memory and updated incrementally whenever find_symbol, read_symbol or search_code run
+INDEX_MAX_FILES = int(os.getenv("CODESH_INDEX_MAX_FILES", "20000"))
+# Lookups within this many seconds of the last refresh use the index as it is
+INDEX_REFRESH_INTERVAL = float(os.getenv("CODESH_INDEX_REFRESH_INTERVAL", "2"))
+workspace_indexes = {}
+workspace_indexes_lock = threading.Lock()
+
+# Runs actions dispatched while the rest of a streamed step is still arriving (one at a
+# time per conversation, but the API server runs many conversations at once)
+tool_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CODESH_TOOL_WORKERS", "8")))
+
+# Answer simple file and directory requests with the local intent router, without any
+# API calls (set CODESH_FAST_PATH=0 to send every query to the model)
+FAST_PATH = os.getenv("CODESH_FAST_PATH", "1") != "0"
+
+# Use OpenAI native tool calling instead of the JSON step protocol (set CODESH_TOOL_CALLING=1)
+TOOL_CALLING = os.getenv("CODESH_TOOL_CALLING", "0") == "1"
+
+# Runs the tool calls of a single response concurrently in tool calling mode
+parallel_tool_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CODESH_TOOL_WORKERS", "8")))
+
+def complete(tool: str, prompt: str, **params) -> str:
+    """
+    Send a single-prompt completion for a tool and return the response text.
+    Identical requests are answered from the response cache without a network round trip.
+    """
+    request = {"messages": [{"role": "user", "content": prompt}], **params}
+    # Keyed by the route's first choice, so changing a tool's model starts a fresh cache
+    primary = router.route(tool)[0]
+    key = request_key({"model": primary, **request})
+
+    cached = response_cache.get(tool, key, ttl=CACHE_TTLS.get(tool))
+    if cached is not None:
+        return cached
+
+    answered = []
+    response = chat_completion(tool, on_model=answered.append, **request)
+    content = response.choices[0].message.content
+    # An answer from a fallback model is not kept as the first choice's
+    if answered == [primary]:
+        response_cache.put(tool, key, content)
+    return content
+
+def describe_written_file(output_path: str, content: str) -> str:
+    """
+    Short digest of a generated file for the agent: size, hash and what it defines.
+    """
+    digest = hashlib.sha256(content.encode()).hexdigest()[:12]
+    lines = content.count("\n")
+    summary = f"Wrote {output_path} ({lines} lines, {len(content.encode())} bytes, sha256 {digest})."
+    names = [symbol.name for symbol in extract_symbols(output_path, content) if "." not in symbol.name]
+    if names:
+        summary += " Defines: " + ", ".join(names[:20]) + (f" and {len(names) - 20} more." if len(names) > 20 else ".")
+    return summary
+
+def stream_to_file(tool: str, prompt: str, output_path: str) -> str:
+    """
+    Stream a completion straight into a file instead of returning it. Deltas go to a
+    temporary file as they arrive, with a markdown fence around the code removed on the
+    way, and the file is moved into place once the completion is done. Only the path
+    and a short digest are returned, so the content never goes back through the
+    conversation. Identical requests are written from the response cache.
+    """
+    request = {"messages": [{"role": "user", "content": prompt}]}
+    primary = router.route(tool)[0]
+    key = request_key({"model": primary, **request})
+    cached = response_cache.get(tool, key, ttl=CACHE_TTLS.get(tool))
+    answered = []
+
+    path = os.path.join(working_directory(), os.path.expanduser(output_path))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stripper = FenceStripper()
+    received, written = [], []
+    with atomic_file(path) as f:
+        def write(text):
+            if text:
+                f.write(text)
+                written.append(text)
+
+        if cached is not None:
+            received.append(cached)
+            write(stripper.feed(cached))
+        else:
+            for chunk in chat_completion(tool, stream=True, on_model=answered.append, **request):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    received.append(chunk.choices[0].delta.content)
+                    write(stripper.feed(received[-1]))
+        write(stripper.close())
+        if written and not written[-1].endswith("\n"):
+            write("\n")
+
+    if cached is None and answered == [primary]:
+        response_cache.put(tool, key, "".join(received))
+    print(f"💾 Wrote {output_path}")
+    return describe_written_file(output_path, "".join(written))
+
+def load_source(code: str):
+    """
+    Return (source, path) for a code argument that may be the path of a file instead
+    of the code itself; path is None when code was given directly.
+    """
+    candidate = code.strip()
+    if candidate and "\n" not in candidate and len(candidate) < 1024:
+        path = os.path.join(working_directory(), os.path.expanduser(candidate))
+        if os.path.isfile(path):
+            with open(path, errors="replace") as f:
+                return f.read(), candidate
+    return code, None
+
+def map_chunks(tool: str, chunks: list, prompt_for) -> list:
+    """
+    Send one completion per chunk concurrently and return the responses in chunk order.
+    Each chunk's request is cached on its own, so unchanged functions are not sent again.
+    """
+    futures = [chunk_executor.submit(contextvars.copy_context().run, complete, tool, prompt_for(chunk))
+               for chunk in chunks]
+    return [future.result() for future in futures]
+
+def workspace_index(min_interval: float = None) -> WorkspaceIndex:
+    """
+    Return the index of the current working directory, brought up to date with the files
+    on disk unless it was within min_interval seconds. Only files whose size or
+    modification time changed are read again. The home directory and the filesystem
+    root are only indexed if they are a project themselves.
+    """
+    root = working_directory()
+    if root in (os.path.expanduser("~"), os.path.abspath(os.sep)) and not is_project_root(root):
+        raise ValueError(f"{root} is not a project directory; change to a project directory first")
+    with workspace_indexes_lock:
+        index = workspace_indexes.get(root)
+        if index is None:
+            index = workspace_indexes[root] = WorkspaceIndex(root, max_files=INDEX_MAX_FILES)
+    index.refresh(INDEX_REFRESH_INTERVAL if min_interval is None else min_interval)
+    return index
+
+def new_output_capture() -> OutputCapture:
+    """
+    Create an output capture with the configured retention.
+    """
+    return OutputCapture(head_lines=OUTPUT_HEAD_LINES, tail_lines=OUTPUT_TAIL_LINES, spill=SPILL_LOGS)
+
+def current_shell() -> ShellSession:
+    """
+    Return the shell session commands run in for the current context.
+    """
+    return _session_shell.get() or shell_session
 
-def execute_command(command: str, show_realtime_output: bool = False) -> str:
+@contextmanager
+def session_shell(shell: ShellSession):
+    """
+    Run commands and file operations in the current context in shell (and its
+    working directory) instead of the process-wide session.
+    """
+    token = _session_shell.set(shell)
+    try:
+        yield shell
+    finally:
+        _session_shell.reset(token)
+
+def working_directory() -> str:
+    """
+    Return the directory commands currently run in.
+    """
+    if PERSISTENT_SHELL or _session_shell.get() is not None:
+        return current_shell().cwd
+    return os.getcwd()
+
+@tracer.traced("command")
+def execute_command(command: str, show_realtime_output: bool = False, cwd: str = None, timeout: float = None) -> str:
     """
     Execute a shell command and return its output.
     Optionally show real-time output for long-running commands.
+    Commands run in the persistent shell session unless it is disabled; cwd runs
+    the command in another directory without changing the session's. While the
+    session is busy (tool calls running in parallel) a separate shell is used.
     """
+    timeout = timeout or COMMAND_TIMEOUT
+    shell = current_shell()
+    use_session = PERSISTENT_SHELL and not shell.busy
+    if not use_session:
+        cwd = os.path.join(working_directory(), cwd or "")
+    span = current_span().set(shell="session" if use_session else "subprocess")
     try:
         if show_realtime_output:
             # For real-time output display during command execution
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            output_lines = []
             print("\nExecuting command: ", command)
             print("Command output:")
             print("-" * 40)
             
-            for line in iter(process.stdout.readline, ''):
+            # Only a bounded digest of the output is kept for the model
+            capture = new_output_capture()
+            
+            def show_line(line):
                 print(f"  {line.rstrip()}")
-                output_lines.append(line)
+                capture.write(line)
                 sys.stdout.flush()  # Ensure output is displayed in real-time
             
-            process.stdout.close()
-            return_code = process.wait()
+            if use_session:
+                result = shell.run(command, timeout=timeout, cwd=cwd, on_output=show_line, on_error=show_line)
+                return_code = result.exit_code
+                capture.write(result.stderr)
+            else:
+                process = subprocess.Popen(
+                    command,
+                    shell=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                    universal_newlines=True,
+                    cwd=cwd
+                )
+                
+                for line in iter(process.stdout.readline, ''):
+                    show_line(line)
+                
+                process.stdout.close()
+                return_code = process.wait()
             print("-" * 40)
+            span.set(exit_code=return_code)
             
+            output = capture.digest()
             if return_code != 0:
-                return f"Command completed with non-zero exit code: {return_code}\nOutput:\n{''.join(output_lines)}"
+                return f"Command completed with non-zero exit code: {return_code}\nOutput:\n{output}"
             
-            return f"Command completed successfully.\nOutput:\n{''.join(output_lines)}"
+            return f"Command completed successfully.\nOutput:\n{output}"
         else:
             # Standard execution for simple commands
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True,
-                check=False
-            )
+            stdout_capture, stderr_capture = new_output_capture(), new_output_capture()
+            if use_session:
+                result = shell.run(command, timeout=timeout, cwd=cwd,
+                                   on_output=stdout_capture.write, on_error=stderr_capture.write)
+                return_code = result.exit_code
+                stderr_capture.write(result.stderr)
+            else:
+                result = subprocess.run(
+                    command, 
+                    shell=True, 
+                    capture_output=True, 
+                    text=True,
+                    check=False,
+                    cwd=cwd,
+                    timeout=timeout
+                )
+                return_code = result.returncode
+                stdout_capture.write(result.stdout)
+                stderr_capture.write(result.stderr)
+            
+            stdout, stderr = stdout_capture.digest(), stderr_capture.digest()
+            span.set(exit_code=return_code)
             
-            if result.returncode != 0:
-                return f"Command failed with error code {result.returncode}:\n{result.stderr}"
+            if return_code != 0:
+                return f"Command failed with error code {return_code}:\n{stderr}"
             
-            return result.stdout.strip() or "Command executed successfully."
+            return stdout.strip() or "Command executed successfully."
     except Exception as e:
         return f"Error executing command: {str(e)}"
 
-def execute_long_running_command(command: str) -> str:
+def execute_long_running_command(command: str, cwd: str = None) -> str:
     """
     Execute a command that might take a while, with real-time feedback.
     Used for project creation, npm installs, etc.
     """
-    # Start a spinner in a separate thread to show activity
-    stop_spinner = threading.Event()
-    
-    def spinner():
-        spinner_chars = "|/-\\"
-        i = 0
-        while not stop_spinner.is_set():
-            i = (i + 1) % len(spinner_chars)
-            sys.stdout.write(f"\r[{spinner_chars[i]}] Command running...")
-            sys.stdout.flush()
-            time.sleep(0.1)
-    
-    # Only start spinner if not showing real-time output
-    spinner_thread = threading.Thread(target=spinner)
-    spinner_thread.start()
-    
+    return execute_command(command, show_realtime_output=True, cwd=cwd)
+
+def run_command_batch(commands: list, cwd: str = None) -> list:
+    """
+    Run a batch of command specs with the async executor, running independent commands
+    concurrently and printing each output line prefixed with its command id.
+    """
+    for spec in commands:
+        after = f" (after {', '.join(spec['depends_on'])})" if spec.get("depends_on") else ""
+        print(f"  [{spec['id']}] {spec['command']}{after}")
+    print()
+
+    def show_line(command_id, stream, line):
+        print(f"  [{command_id}] {line.rstrip()}", flush=True)
+
+    results = run_commands(commands, max_workers=MAX_WORKERS, cwd=cwd, timeout=COMMAND_TIMEOUT,
+                           on_output=show_line, new_capture=new_output_capture)
+    for result in results:
+        if result["status"] != "skipped":
+            tracer.record("command", result["command"], result["duration"] * 1000, shell="executor",
+                          exit_code=result["exit_code"], status=result["status"])
+    return results
+
+def summarize_command_batch(results: list) -> str:
+    """
+    Summarize executor results, one line per command.
+    """
+    icons = {"ok": "✅", "failed": "❌", "timeout": "⏱️", "skipped": "⏭️"}
+    lines = []
+    for result in results:
+        if result.get("resumed"):
+            lines.append(f"↩️ [{result['id']}] {result['command']} - done in an earlier run")
+            continue
+        line = f"{icons.get(result['status'], '?')} [{result['id']}] {result['command']} - {result['status']}"
+        if result["exit_code"] is not None:
+            line += f" (exit code {result['exit_code']}, {result['duration']}s)"
+        if result["status"] != "ok" and result["stderr"]:
+            line += f"\n    {result['stderr'].strip()[-500:]}"
+        lines.append(line)
+    return "\n".join(lines)
+
+def command_failed(result) -> bool:
+    """
+    Whether a result returned by execute_command (or a tool) reports a failure.
+    """
+    return isinstance(result, str) and result.startswith(("Error", "Command failed", "Command completed with non-zero"))
+
+def creation_succeeded(result: str) -> bool:
+    """
+    Whether a project creation tool reported success (in the last line of its result).
+    """
+    lines = (result or "").strip().splitlines()
+    return bool(lines) and "successfully" in lines[-1]
+
+def project_journal(project_path: str) -> ProjectJournal:
+    """
+    The creation journal of the project in project_path (relative to the working directory).
+    """
+    project_dir = os.path.normpath(os.path.join(working_directory(), os.path.expanduser(project_path)))
+    return ProjectJournal.for_project(JOURNAL_DIR, project_dir, enabled=JOURNAL_ENABLED)
+
+def resume_hint(project_path: str) -> str:
+    if not JOURNAL_ENABLED:
+        return ""
+    return f"\nRun resume_project with project_path \"{project_path}\" to retry only the steps that did not complete."
+
+def run_journaled(journal: ProjectJournal, label: str, run, key=None, artifacts=(), hashed: bool = False):
+    """
+    Run one project creation step unless the journal shows it already done, with its
+    artifacts (paths relative to the project) still in place, and record how it went.
+    run() returns a result string like execute_command's.
+    """
+    step = step_id(label, key)
+    if journal.is_done(step):
+        print(f"↩️  Already done in an earlier run: {label}")
+        return "Command completed successfully (done in an earlier run)."
     try:
-        result = execute_command(command, show_realtime_output=True)
-        return result
-    finally:
-        # Stop spinner thread when command completes
-        stop_spinner.set()
-        spinner_thread.join()
-        sys.stdout.write("\r" + " " * 30 + "\r")  # Clear spinner line
-        sys.stdout.flush()
+        result = run()
+    except Exception as e:
+        journal.record(step, label, "failed", error=str(e))
+        raise
+    failed = command_failed(result)
+    journal.record(step, label, "failed" if failed else "ok", artifacts=artifacts, hashed=hashed,
+                   error=result if failed else None)
+    return result
+
+def run_journaled_batch(journal: ProjectJournal, commands: list, cwd: str = None, artifacts: dict = None) -> list:
+    """
+    run_command_batch for a project creation. Commands the journal shows as done are not
+    run again (and no longer hold back the commands that depend on them); they come back
+    as results marked resumed. artifacts maps command ids to the paths they produce.
+    """
+    artifacts = artifacts or {}
+    steps = {spec["id"]: step_id(spec["command"], spec.get("cwd") or cwd) for spec in commands}
+    done = {command_id for command_id, step in steps.items() if journal.is_done(step)}
+    pending = [dict(spec, depends_on=[dep for dep in spec.get("depends_on", []) if dep not in done])
+               for spec in commands if spec["id"] not in done]
+    if done:
+        print(f"  ↩️  {len(done)} of them already done in an earlier run")
+    results = {}
+    if pending:
+        results = {result["id"]: result for result in run_command_batch(pending, cwd=cwd)}
+
+    ordered = []
+    for spec in commands:
+        if spec["id"] in done:
+            ordered.append({"id": spec["id"], "command": spec["command"], "status": "ok", "exit_code": None,
+                            "stdout": "", "stderr": "", "duration": 0.0, "resumed": True})
+            continue
+        result = results[spec["id"]]
+        if result["status"] != "skipped":
+            ok = result["status"] == "ok"
+            journal.record(steps[spec["id"]], spec["command"], "ok" if ok else "failed", exit_code=result["exit_code"],
+                           artifacts=artifacts.get(spec["id"], ()), error=None if ok else result["stderr"] or result["status"])
+        ordered.append(result)
+    return ordered
 
 def generate_command(operation_description: str) -> str:
     """
@@ -115,13 +631,8 @@ def generate_command(operation_description: str) -> str:
         Example output: ls -la
         """
         
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
         # Extract command from response
-        generated_command = response.choices[0].message.content.strip()
+        generated_command = complete("generate_command", prompt).strip()
         
         # Basic safety check
         dangerous_patterns = ['sudo', 'rm -rf /', '> /dev/', '| rm', '& rm', '; rm', '&& rm']
@@ -132,20 +643,18 @@ def generate_command(operation_description: str) -> str:
     except Exception as e:
         return f"Error generating command: {str(e)}"
 
-def generate_code(prompt: str, language: str = "python") -> str:
+def generate_code(prompt: str, language: str = "python", output_path: str = "") -> str:
     """
     Generate code based on the provided prompt and language.
+    With output_path the code is streamed into that file and only a digest is returned.
     """
     try:
         code_prompt = f"Generate {language} code for: {prompt}\n\nOnly provide the code without any explanations or markdown formatting."
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": code_prompt}]
-        )
-        
+        if output_path:
+            return stream_to_file("generate_code", code_prompt, output_path)
+
         # Extract code from response
-        generated_code = response.choices[0].message.content.strip()
+        generated_code = complete("generate_code", code_prompt).strip()
         
         return generated_code
     except Exception as e:
@@ -173,16 +682,16 @@ def detect_project_type(project_description: str) -> str:
             "dependencies": ["dep1", "dep2", ...] if custom_installation is true
         }}
         
+        CLI commands run one after another. When some commands do not depend on the one
+        before them (for example installs in sibling packages), give them as objects instead:
+        {{"command": "...", "depends_on": [indexes of the earlier commands it needs]}}
+        and they will run in parallel.
+        
         Only provide the JSON without any explanations or additional text.
         """
         
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            response_format={"type": "json_object"},
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        project_info = json.loads(response.choices[0].message.content)
+        content = complete("detect_project_type", prompt, response_format={"type": "json_object"})
+        project_info = json.loads(content)
         return project_info
     except Exception as e:
         return {"project_type": "unknown", "use_cli": False, "error": str(e)}
@@ -209,14 +718,20 @@ def create_project_using_cli(project_info, project_path):
         if project_info.get("custom_installation", False):
             return create_custom_node_project(project_path, project_info)
         
-        # Execute each CLI command with real-time feedback
-        for i, command in enumerate(cli_commands):
-            print(f"\n[{i+1}/{len(cli_commands)}] Running: {command}\n")
-            result = execute_long_running_command(command)
-            results.append(f"Command: {command}\nResult: {result}")
-            print(f"\n✅ Command completed\n")
-        
-        return "\n\nProject creation completed successfully!"
+        # Run the CLI commands from the same base directory, since generated commands
+        # like "cd my-app && npm install" assume it. Independent commands run concurrently.
+        commands = normalize_commands(cli_commands)
+        journal = project_journal(project_path)
+        journal.begin("cli", {"project_info": project_info, "project_path": project_path, "cwd": working_directory()})
+        print(f"Running {len(commands)} commands (up to {MAX_WORKERS} at a time):")
+        results = run_journaled_batch(journal, commands, cwd=working_directory())
+        summary = summarize_command_batch(results)
+        print(f"\n{summary}\n")
+
+        if any(result["status"] != "ok" for result in results):
+            return f"{summary}\n\nProject creation finished with errors.{resume_hint(project_path)}"
+        journal.finish()
+        return f"{summary}\n\nProject creation completed successfully!"
     except Exception as e:
         return f"Error creating project using CLI: {str(e)}"
 
@@ -231,36 +746,51 @@ def create_express_project(project_path, project_info):
             execute_command(mkdir_cmd)
             print(f"Created directory: {project_path}")
 
-        # Initialize npm project
-        init_cmd = f"cd {project_path} && npm init -y"
-        print("\n[1/3] Running: npm init -y")
-        result = execute_long_running_command(init_cmd)
-        print(f"\n✅ npm init completed\n")
-        
-        # Install express and core dependencies
-        deps_cmd = f"cd {project_path} && npm install express"
-        print("\n[2/3] Running: npm install express")
-        result = execute_long_running_command(deps_cmd)
-        print(f"\n✅ Express installation completed\n")
-        
-        # Install additional dependencies if specified
-        if project_info.get("dependencies"):
-            additional_deps = " ".join(project_info.get("dependencies"))
-            if additional_deps:
-                deps_cmd = f"cd {project_path} && npm install {additional_deps}"
-                print(f"\n[3/3] Running: npm install {additional_deps}")
-                result = execute_long_running_command(deps_cmd)
-                print(f"\n✅ Additional dependencies installation completed\n")
-        
+        # Steps that succeeded in an earlier, unfinished run of the same project are skipped
+        journal = project_journal(project_path)
+        journal.begin("express", {"project_info": project_info, "project_path": project_path, "cwd": working_directory()})
+
+        # npm steps with what each leaves in the project
+        steps = [("npm init -y", "npm init", ["package.json"]),
+                 ("npm install express", "Express installation", ["node_modules/express"])]
+        additional_deps = " ".join(project_info.get("dependencies") or [])
+        if additional_deps:
+            steps.append((f"npm install {additional_deps}", "Additional dependencies installation", ["node_modules"]))
+
+        # Reuse a cached skeleton with the same dependencies; a directory that already
+        # has a package.json is left to npm
+        project_dir = os.path.join(working_directory(), project_path)
+        dependencies = ["express"] + (project_info.get("dependencies") or [])
+        fresh = not os.path.exists(os.path.join(project_dir, "package.json"))
+        restored = scaffold_cache.restore("express", dependencies, project_dir) if fresh else None
+
+        if restored is not None:
+            print(f"\n♻️ Restored cached npm scaffold ({restored} files), skipping npm install\n")
+            for command, _, artifacts in steps:
+                journal.record(step_id(command, project_path), command, "ok", artifacts=artifacts)
+        else:
+            results = []
+            for i, (command, description, artifacts) in enumerate(steps):
+                print(f"\n[{i + 1}/{len(steps)}] Running: {command}")
+                result = run_journaled(journal, command, partial(execute_long_running_command, command, cwd=project_path),
+                                       key=project_path, artifacts=artifacts)
+                if command_failed(result):
+                    return f"\n\nExpress project creation failed at: {command}\n{result}{resume_hint(project_path)}"
+                results.append(result)
+                print(f"\n✅ {description} completed\n")
+
+            if fresh and all(result.startswith("Command completed successfully") for result in results):
+                scaffold_cache.save("express", dependencies, project_dir)
+
         # Create basic server.js file
-        server_file = os.path.join(project_path, "server.js")
+        server_file = os.path.join(project_dir, "server.js")
         server_content = generate_express_server_template()
-        
-        with open(server_file, "w") as f:
-            f.write(server_content)
-        
+        run_journaled(journal, "write server.js", partial(write_project_file, server_file, server_content),
+                      artifacts=["server.js"], hashed=True)
+
         print(f"\n✅ Created Express server.js file\n")
-        
+
+        journal.finish()
         return "\n\nExpress project created successfully using standard npm init approach!"
     except Exception as e:
         return f"Error creating Express project: {str(e)}"
@@ -276,28 +806,50 @@ def create_custom_node_project(project_path, project_info):
             execute_command(mkdir_cmd)
             print(f"Created directory: {project_path}")
 
-        # Initialize npm project
-        init_cmd = f"cd {project_path} && npm init -y"
-        print("\n[1/3] Running: npm init -y")
-        result = execute_long_running_command(init_cmd)
-        print(f"\n✅ npm init completed\n")
+        journal = project_journal(project_path)
+        journal.begin("custom_node", {"project_info": project_info, "project_path": project_path, "cwd": working_directory()})
+
+        # Reuse a cached skeleton with the same type and dependencies; a directory that
+        # already has a package.json is left to npm
+        project_dir = os.path.join(working_directory(), project_path)
+        project_type = project_info.get("project_type", "node")
+        dependencies = project_info.get("dependencies") or []
+        fresh = not os.path.exists(os.path.join(project_dir, "package.json"))
+        restored = scaffold_cache.restore(project_type, dependencies, project_dir) if fresh and dependencies else None
         
-        # Install dependencies if specified
-        if project_info.get("dependencies"):
-            dependencies = " ".join(project_info.get("dependencies"))
+        # npm init, then the dependency install; the project is snapshotted at this
+        # point, before CLI commands add anything of their own
+        commands = []
+        if restored is not None:
+            print(f"\n♻️ Restored cached npm scaffold ({restored} files), skipping npm install\n")
+        else:
+            commands.append({"id": "init", "command": "npm init -y", "cwd": project_path, "depends_on": []})
             if dependencies:
-                deps_cmd = f"cd {project_path} && npm install {dependencies}"
-                print(f"\n[2/3] Running: npm install {dependencies}")
-                result = execute_long_running_command(deps_cmd)
-                print(f"\n✅ Dependencies installation completed\n")
+                commands.append({"id": "install", "command": f"npm install {' '.join(dependencies)}", "cwd": project_path, "depends_on": ["init"]})
         
-        # Execute any additional CLI commands
-        cli_commands = project_info.get("cli_commands", [])
-        for i, command in enumerate(cli_commands):
-            print(f"\n[{i+3}/{len(cli_commands)+2}] Running: {command}\n")
-            result = execute_long_running_command(command)
-            print(f"\n✅ Command completed\n")
+        results = []
+        if commands:
+            print(f"Running {len(commands)} commands (up to {MAX_WORKERS} at a time):")
+            results = run_journaled_batch(journal, commands, cwd=working_directory(),
+                                          artifacts={"init": ["package.json"], "install": ["node_modules"]})
+            if fresh and dependencies and all(result["status"] == "ok" for result in results):
+                scaffold_cache.save(project_type, dependencies, project_dir)
+        
+        # Then any additional CLI commands (from the base directory); those that declare
+        # their own dependencies may run concurrently with each other
+        cli_commands = normalize_commands(project_info.get("cli_commands", []))
+        if cli_commands and all(result["status"] == "ok" for result in results):
+            print(f"Running {len(cli_commands)} commands (up to {MAX_WORKERS} at a time):")
+            results += run_journaled_batch(journal, cli_commands, cwd=working_directory())
+        elif cli_commands:
+            print(f"Skipping {len(cli_commands)} CLI commands because the npm setup failed.")
         
+        summary = summarize_command_batch(results)
+        print(f"\n{summary}\n")
+        
+        if any(result["status"] != "ok" for result in results):
+            return f"{summary}\n\nNode.js project creation finished with errors.{resume_hint(project_path)}"
+        journal.finish()
         return "\n\nNode.js project created successfully with custom dependency installation!"
     except Exception as e:
         return f"Error creating custom Node.js project: {str(e)}"
@@ -325,6 +877,174 @@ app.listen(port, () => {
 });
 '''
 
+def project_file_path(root: str, path: str) -> str:
+    """
+    Resolve a manifest path inside the project directory, refusing paths that leave it.
+    """
+    if not isinstance(path, str) or not path:
+        raise ValueError(f"invalid path {json.dumps(path)}")
+    full_path = os.path.normpath(os.path.join(root, path))
+    if os.path.isabs(path) or os.path.commonpath([root, full_path]) != root:
+        raise ValueError(f"{path} is outside the project directory")
+    return full_path
+
+def manifest_content(entry: dict) -> str:
+    """
+    The content of a manifest file entry. A JSON object or array (a package.json sent as
+    an object instead of as text) is written out as JSON; anything else but text is refused.
+    """
+    content = entry.get("content", "")
+    if isinstance(content, (dict, list)):
+        return json.dumps(content, indent=2) + "\n"
+    if not isinstance(content, str):
+        raise ValueError(f"content of {entry['path']} is not text")
+    return content
+
+def write_project_file(full_path: str, content: str):
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as f:
+        f.write(content)
+
+def generate_project_manifest(project_description: str, project_path: str = ".") -> str:
+    """
+    Manifest mode of generate_project: one streamed call returns the project type, then
+    the project's directories, files and commands as JSON Lines. Each entry is carried
+    out on a background worker, in order, as soon as its line is complete, so files land
+    on disk and installs run while the rest of the manifest is still being generated.
+    """
+    prompt = f"""
+        Create the project described as: "{project_description}" in the directory "{project_path}".
+
+        Reply in JSON Lines: one JSON object per line, without markdown or any other text.
+
+        The first line describes the project:
+        {{"type": "project", "project_type": "react|vue|angular|nextjs|nuxt|express|flask|django|static|...", "use_cli": true|false, "cli_commands": ["command 1", ...] if use_cli is true, "package_manager": "npm|yarn|pnpm", "custom_installation": true|false, "dependencies": ["dep1", ...] if custom_installation is true}}
+
+        If use_cli or custom_installation is true, or this is an Express.js project, stop after that line:
+        the project will be created with its CLI, or with npm init followed by manual installation
+        of the dependencies (NOT express-generator).
+        CLI commands run one after another. When some commands do not depend on the one
+        before them (for example installs in sibling packages), give them as objects instead:
+        {{"command": "...", "depends_on": [indexes of the earlier commands it needs]}}
+        and they will run in parallel.
+
+        Otherwise continue with the project's directories, files and commands, in the order they
+        should be created, with paths relative to the project directory:
+        {{"type": "dir", "path": "src"}}
+        {{"type": "file", "path": "src/index.js", "content": "the complete file content"}}
+        {{"type": "command", "command": "npm install"}}
+        Each file goes on one line with its whole content as a JSON string. List a file before any
+        command that needs it. For Node.js projects, write package.json as a file and install
+        its dependencies with a command.
+        """
+
+    # Each entry is journaled as it arrives, so an interrupted creation can be resumed
+    # without generating the manifest again
+    journal = project_journal(project_path)
+    journal.begin("manifest", {"description": project_description, "project_path": project_path,
+                               "cwd": working_directory()}, fresh=True)
+    stream = chat_completion("generate_project", messages=[{"role": "user", "content": prompt}], stream=True)
+    parser = ManifestStreamParser()
+    received = []
+
+    def entries():
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                for entry in parser.feed(chunk.choices[0].delta.content):
+                    if entry["type"] != "invalid":
+                        journal.entry(entry)
+                        received.append(entry)
+                    yield entry
+        for entry in parser.close():
+            if entry["type"] != "invalid":
+                journal.entry(entry)
+                received.append(entry)
+            yield entry
+        journal.mark("manifest_complete")
+
+    print("\n🔍 Analyzing project requirements...")
+    result = build_from_manifest(entries(), project_path, journal)
+    # A project set up with its CLI stops the manifest after the first line
+    if journal.has("manifest_complete") or (received and uses_setup_commands(received[0])):
+        remember_plan(project_description, project_path, {"kind": "manifest", "entries": received}, result)
+    return result
+
+def uses_setup_commands(project_info: dict) -> bool:
+    """
+    Whether a project is created with its CLI or npm init rather than from generated files.
+    """
+    return bool(project_info.get("use_cli", False) or project_info.get("custom_installation", False)
+                or project_info.get("project_type", "").lower() == "express")
+
+def build_from_manifest(manifest, project_path: str, journal: ProjectJournal) -> str:
+    """
+    Carry out manifest entries on a background worker, in order, as they come in: from
+    the streamed reply, or from the journal on a resume. Files and commands are journaled
+    steps, so those already done in an earlier run are skipped.
+    """
+    root = os.path.normpath(os.path.join(working_directory(), os.path.expanduser(project_path)))
+    worker = ThreadPoolExecutor(max_workers=1)
+    tasks = []
+    errors = []
+    counts = {"dir": 0, "file": 0, "command": 0}
+
+    def submit(label, fn, *args, **kwargs):
+        tasks.append((label, worker.submit(contextvars.copy_context().run, fn, *args, **kwargs)))
+
+    try:
+        for entry in manifest:
+            kind = entry["type"]
+            if kind == "project":
+                if uses_setup_commands(entry):
+                    manifest.close()
+                    print(f"\n🚀 This appears to be a {entry.get('project_type', 'framework')} project. Using appropriate setup...")
+                    return create_project_using_cli(entry, project_path)
+                print(f"\n📂 Generating {entry.get('project_type', 'project')} project structure in {project_path}...")
+                submit(project_path, os.makedirs, root, exist_ok=True)
+                continue
+            try:
+                if kind == "dir":
+                    submit(entry["path"], os.makedirs, project_file_path(root, entry["path"]), exist_ok=True)
+                elif kind == "file":
+                    full_path = project_file_path(root, entry["path"])
+                    content = manifest_content(entry)
+                    print(f"  📄 {entry['path']}")
+                    submit(entry["path"], run_journaled, journal, f"write {entry['path']}",
+                           partial(write_project_file, full_path, content),
+                           key=hashlib.sha256(content.encode()).hexdigest(),
+                           artifacts=[os.path.relpath(full_path, root)], hashed=True)
+                elif kind == "command":
+                    if not isinstance(entry["command"], str) or not entry["command"].strip():
+                        raise ValueError(f"invalid command {json.dumps(entry['command'])}")
+                    print(f"  ▶️  {entry['command']}")
+                    os.makedirs(root, exist_ok=True)
+                    submit(entry["command"], run_journaled, journal, entry["command"],
+                           partial(execute_command, entry["command"], cwd=root), key=root)
+                else:
+                    errors.append(f"Skipped manifest line: {entry.get('line', json.dumps(entry))[:200]}")
+                    continue
+                counts[kind] += 1
+            except (KeyError, ValueError) as e:
+                errors.append(f"Skipped {kind} entry: {str(e)}")
+    finally:
+        worker.shutdown(wait=True)
+
+    for label, task in tasks:
+        try:
+            result = task.result()
+        except Exception as e:
+            errors.append(f"{label}: {str(e)}")
+            continue
+        if command_failed(result):
+            errors.append(f"{label}: {result}")
+
+    summary = f"Created {counts['file']} files and {counts['dir']} directories and ran {counts['command']} commands in {project_path}."
+    if errors:
+        return f"\n\n{summary}\n\nProject creation completed with errors:\n" + "\n".join(errors) + resume_hint(project_path)
+    if journal.has("manifest_complete"):
+        journal.finish()
+    return f"\n\n{summary}\n\nProject creation completed successfully!"
+
 def generate_project(project_description: str, project_path: str = ".") -> str:
     """
     Generates a complete project structure based on the description.
@@ -332,6 +1052,18 @@ def generate_project(project_description: str, project_path: str = ".") -> str:
     And improved real-time feedback for long-running operations.
     """
     try:
+        # A project described like an earlier one is built from that project's plan
+        match = plan_index.lookup(project_description, project_path)
+        if match is not None:
+            print(f"\n♻️ Reusing the plan of a similar earlier project ({match.confidence:.0%} match), no model calls needed...")
+            result = run_saved_plan(match.plan, project_description, project_path)
+            if not creation_succeeded(result):
+                plan_index.forget(match.key)
+            return result
+
+        if PROJECT_MANIFEST:
+            return generate_project_manifest(project_description, project_path)
+
         # Detect project type to determine if CLI commands should be used
         project_info = detect_project_type(project_description)
         
@@ -340,8 +1072,10 @@ def generate_project(project_description: str, project_path: str = ".") -> str:
         # If we should use CLI commands (like npm create vite@latest)
         if isinstance(project_info, dict) and (project_info.get("use_cli", False) or project_info.get("project_type", "").lower() == "express"):
             print(f"\n🚀 This appears to be a {project_info.get('project_type', 'framework')} project. Using appropriate setup...")
-            return create_project_using_cli(project_info, project_path)
-        
+            result = create_project_using_cli(project_info, project_path)
+            remember_plan(project_description, project_path, {"kind": "cli", "project_info": project_info}, result)
+            return result
+
         print("\n📂 Generating project structure...")
         
         # Otherwise, generate a series of commands to create the project structure
@@ -362,100 +1096,483 @@ def generate_project(project_description: str, project_path: str = ".") -> str:
         Only provide the commands without any explanations or markdown.
         """
         
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        response = chat_completion(
+            "generate_project",
             messages=[{"role": "user", "content": prompt}]
         )
         
-        # Get the commands
-        commands = response.choices[0].message.content.strip().split('\n')
-        
-        # Execute each command with progress indicator
-        results = []
-        for i, command in enumerate(commands):
-            if command.strip():
-                print(f"\n[{i+1}/{len(commands)}] Executing: {command}")
-                result = execute_command(command)
-                results.append(f"Command: {command}\nResult: {result}")
-                print(f"  Result: {result}")
-        
-        return "\n\nProject creation completed successfully!"
+        # Get the commands, keeping heredoc bodies with their command
+        commands = split_commands(response.choices[0].message.content.strip())
+
+        journal = project_journal(project_path)
+        journal.begin("commands", {"description": project_description, "commands": commands,
+                                   "project_path": project_path, "cwd": working_directory()}, fresh=True)
+        result = run_project_commands(commands, project_path, journal)
+        remember_plan(project_description, project_path, {"kind": "commands", "commands": commands}, result)
+        return result
     except Exception as e:
         return f"Error generating project: {str(e)}"
 
+def remember_plan(project_description: str, project_path: str, plan: dict, result: str):
+    """
+    Keep the plan of a project that was created successfully for similar requests later.
+    """
+    if not creation_succeeded(result):
+        return
+    entries = plan.get("entries") or [{}]
+    project_info = plan.get("project_info") or entries[0]
+    # Commands run from the base directory have to name the project path to be reusable
+    # for another path; npm init setups and manifest files are relative to the project
+    needs_path = plan["kind"] == "commands" or bool(
+        project_info.get("use_cli", False) and not project_info.get("custom_installation", False)
+        and project_info.get("project_type", "").lower() != "express")
+    plan_index.add(project_description, project_path, plan, needs_path=needs_path)
+
+def run_saved_plan(plan: dict, project_description: str, project_path: str) -> str:
+    """
+    Create a project from a plan remembered by remember_plan(), journaled like a new one.
+    """
+    if plan["kind"] == "cli":
+        return create_project_using_cli(plan["project_info"], project_path)
+    journal = project_journal(project_path)
+    if plan["kind"] == "commands":
+        journal.begin("commands", {"description": project_description, "commands": plan["commands"],
+                                   "project_path": project_path, "cwd": working_directory()}, fresh=True)
+        return run_project_commands(plan["commands"], project_path, journal)
+    journal.begin("manifest", {"description": project_description, "project_path": project_path,
+                               "cwd": working_directory()}, fresh=True)
+    for entry in plan["entries"]:
+        journal.entry(entry)
+    journal.mark("manifest_complete")
+    return build_from_manifest((entry for entry in plan["entries"]), project_path, journal)
+
+def run_project_commands(commands: list, project_path: str, journal: ProjectJournal) -> str:
+    """
+    Run generated project commands in order. File operations run in-process and are
+    replayed on a resume, except appends, which would add their text twice: those are
+    journaled steps with the appended files hashed, like the shell commands anything
+    else falls back to. Journaled steps are skipped once they have succeeded.
+    """
+    engine = FileOpEngine(fallback=lambda command: run_journaled(journal, command, partial(execute_command, command, cwd=engine.cwd),
+                                                                 key=engine.cwd), cwd=working_directory())
+
+    def append(command):
+        result = engine.run(command)
+        errors = engine.flush()
+        return f"Command failed: {'; '.join(errors)}" if errors else result
+
+    failed = []
+    for i, command in enumerate(commands):
+        first_line = command.split('\n', 1)[0]
+        extra_lines = command.count('\n')
+        if extra_lines:
+            first_line += f" ({extra_lines} more lines)"
+        print(f"\n[{i+1}/{len(commands)}] Executing: {first_line}")
+        appended = engine.appended_paths(command)
+        if appended:
+            # Earlier writes to the files must be on disk before their hashes are checked
+            failed.extend(engine.flush())
+            artifacts = [os.path.relpath(path, journal.project_dir) for path in appended]
+            result = run_journaled(journal, command, partial(append, command), key=engine.cwd,
+                                   artifacts=artifacts, hashed=True)
+        else:
+            result = engine.run(command)
+        if command_failed(result):
+            failed.append(f"{first_line}: {result}")
+        print(f"  Result: {result}")
+
+    errors = failed + engine.flush()
+    if errors:
+        return "\n\nProject creation completed with errors:\n" + "\n".join(errors) + resume_hint(project_path)
+
+    journal.finish()
+    return "\n\nProject creation completed successfully!"
+
+def resume_project(project_path: str = ".") -> str:
+    """
+    Finish a project creation that failed or was interrupted, from its journal. The
+    recorded plan is run again without asking the model, from the directory it was first
+    run in; steps that already succeeded (with their files unchanged) are skipped.
+    """
+    try:
+        journal = project_journal(project_path)
+        record = journal.plan()
+        if record is None:
+            return f"No project creation journal found for {project_path}."
+        if journal.finished():
+            return f"The creation of {project_path} already completed successfully; nothing to resume."
+        if record["kind"] == "manifest" and not journal.has("manifest_complete"):
+            return (f"The project manifest for {project_path} was cut off before it was complete. "
+                    f"Run generate_project again to create the project.")
+
+        summary = journal.summary()
+        print(f"\n🔁 Resuming {record['kind']} project creation in {project_path} ({summary['done']} steps done, {summary['failed']} failed)...")
+        plan = record["plan"]
+        # A shell of its own in the original directory; the process's cwd is shared by
+        # every session
+        shell = ShellSession(cwd=plan["cwd"])
+        try:
+            with session_shell(shell):
+                return resume_plan(record["kind"], plan, journal)
+        finally:
+            shell.close()
+    except Exception as e:
+        return f"Error resuming project: {str(e)}"
+
+def resume_plan(kind: str, plan: dict, journal: ProjectJournal) -> str:
+    if kind == "express":
+        return create_express_project(plan["project_path"], plan["project_info"])
+    if kind == "custom_node":
+        return create_custom_node_project(plan["project_path"], plan["project_info"])
+    if kind == "cli":
+        return create_project_using_cli(plan["project_info"], plan["project_path"])
+    journal.resume()
+    if kind == "commands":
+        return run_project_commands(plan["commands"], plan["project_path"], journal)
+    return build_from_manifest((entry for entry in journal.entries()), plan["project_path"], journal)
+
 def explain_code(code: str) -> str:
     """
-    Provide an explanation for the given code.
+    Provide an explanation for the given code, or for the file at the given path.
+    Large sources are explained chunk by chunk, concurrently, and the parts merged in order.
     """
     try:
-        prompt = f"Explain the following code in detail:\n\n```\n{code}\n```\n\nProvide a clear, line-by-line explanation."
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.choices[0].message.content
+        source, path = load_source(code)
+        chunks = split_source(source, CHUNK_TOKENS * 4)
+        if len(chunks) == 1:
+            prompt = f"Explain the following code in detail:\n\n```\n{source}\n```\n\nProvide a clear, line-by-line explanation."
+
+            return complete("explain_code", prompt)
+
+        print(f"🧩 Explaining {path or 'the code'} in {len(chunks)} parts...")
+        explanations = map_chunks("explain_code", chunks, lambda chunk: (
+            f"Explain the following part of a larger file ({chunk.name}) in detail:\n\n```\n{chunk.text}\n```\n\n"
+            "Provide a clear, line-by-line explanation."
+        ))
+        return "\n\n".join(f"### {chunk.name} (lines {chunk.start}-{chunk.end})\n\n{explanation}"
+                           for chunk, explanation in zip(chunks, explanations))
     except Exception as e:
         return f"Error explaining code: {str(e)}"
 
-def improve_code(code: str, improvement_prompt: str = "") -> str:
+def patch_chunk(chunk, focus: str, whole: bool):
+    """
+    Ask for search/replace edits to one chunk and apply them to it. Edits that cannot be
+    placed are sent back once, with the reason and the chunk as it now reads, for a retry.
+    Returns (patched text, number of edits applied, [(hunk, reason)] still rejected).
     """
-    Improve the given code based on the improvement prompt.
+    where = "the following code" if whole else f"the following part of a larger file ({chunk.name})"
+    response = complete("improve_code", f"Improve {where}:\n\n```\n{chunk.text}\n```\n\n{focus}{PATCH_INSTRUCTIONS}")
+    hunks = parse_hunks(response)
+    patched, rejected = apply_hunks(chunk.text, hunks)
+    applied = len(hunks) - len(rejected)
+    if rejected:
+        failures = "\n\n".join(f"{reason}:\n{format_hunk(hunk)}" for hunk, reason in rejected)
+        response = complete("improve_code", (
+            f"These edits could not be applied:\n\n{failures}\n\nThe code now reads:\n\n```\n{patched}\n```\n\n"
+            "Send corrected blocks for these edits only, with SEARCH text copied exactly from the code above.\n\n"
+            f"{PATCH_INSTRUCTIONS}"
+        ))
+        hunks = parse_hunks(response)
+        if hunks:
+            patched, rejected = apply_hunks(patched, hunks)
+            applied += len(hunks) - len(rejected)
+    return patched, applied, rejected
+
+def improve_with_patches(source: str, path: str, chunks: list, focus: str) -> str:
+    """
+    Patch mode of improve_code: the model sends only the edits, so output tokens follow
+    the size of the change rather than the size of the file. A file is rewritten once,
+    atomically, after every chunk has been patched.
+    """
+    if len(chunks) > 1:
+        print(f"🧩 Improving {path or 'the code'} in {len(chunks)} parts...")
+    futures = [chunk_executor.submit(contextvars.copy_context().run, patch_chunk, chunk, focus, len(chunks) == 1)
+               for chunk in chunks]
+    results = [future.result() for future in futures]
+    patched = "".join(text for text, _, _ in results)
+    applied = sum(count for _, count, _ in results)
+    rejected = [failure for _, _, failures in results for failure in failures]
+
+    report = ""
+    if rejected:
+        report = f"\n\n{len(rejected)} edit(s) could not be applied:\n\n" + "\n\n".join(
+            f"{reason}:\n{format_hunk(hunk)}" for hunk, reason in rejected)
+    if path is None:
+        return patched + report
+
+    diff = unified_diff(source, patched, path)
+    if not diff:
+        return f"No changes applied to {path}.{report}"
+    write_atomic(os.path.join(working_directory(), os.path.expanduser(path)), patched)
+    changed = diff.splitlines()[2:]
+    added = sum(1 for line in changed if line.startswith("+"))
+    removed = sum(1 for line in changed if line.startswith("-"))
+    print(f"✏️  Applied {applied} edit(s) to {path} (+{added} -{removed} lines)")
+    return f"Applied {applied} edit(s) to {path}:\n\n{diff}{report}"
+
+def improve_code(code: str, improvement_prompt: str = "", mode: str = "") -> str:
+    """
+    Improve the given code (or the file at the given path) based on the improvement prompt.
+    Large sources are improved chunk by chunk, concurrently, and reassembled in order.
+    In patch mode a file is edited in place and the diff is returned.
     """
     try:
-        prompt = f"Improve the following code:\n\n```\n{code}\n```\n\n"
-        
+        source, path = load_source(code)
         if improvement_prompt:
-            prompt += f"Specifically focus on: {improvement_prompt}\n\n"
+            focus = f"Specifically focus on: {improvement_prompt}\n\n"
         else:
-            prompt += "Focus on improving: performance, readability, and best practices.\n\n"
-            
-        prompt += "Only provide the improved code without explanations."
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.choices[0].message.content
+            focus = "Focus on improving: performance, readability, and best practices.\n\n"
+
+        chunks = split_source(source, CHUNK_TOKENS * 4)
+        mode = mode or IMPROVE_MODE
+        if mode == "patch" or (mode == "auto" and path is not None):
+            return improve_with_patches(source, path, chunks, focus)
+
+        if len(chunks) == 1:
+            prompt = f"Improve the following code:\n\n```\n{source}\n```\n\n"
+            prompt += focus
+            prompt += "Only provide the improved code without explanations."
+
+            return complete("improve_code", prompt)
+
+        print(f"🧩 Improving {path or 'the code'} in {len(chunks)} parts...")
+        parts = map_chunks("improve_code", chunks, lambda chunk: (
+            f"Improve the following part of a larger file ({chunk.name}). Keep its names, signatures "
+            f"and indentation so it still fits the rest of the file:\n\n```\n{chunk.text}\n```\n\n"
+            f"{focus}Only provide the improved code without explanations."
+        ))
+        # Keep the blank lines that separated the chunks in the original
+        improved = []
+        for chunk, part in zip(chunks, parts):
+            separator = chunk.text[len(chunk.text.rstrip("\n")):] or "\n"
+            improved.append(strip_code_fence(part).rstrip("\n") + separator)
+        return "".join(improved)
     except Exception as e:
         return f"Error improving code: {str(e)}"
 
-def generate_test(code: str, test_framework: str = "pytest") -> str:
+def test_module_name(path: str) -> str:
+    """
+    Module name generated tests import the code under test from when they are verified.
+    """
+    name = os.path.splitext(os.path.basename(path or ""))[0]
+    return name if path and path.endswith(".py") and name.isidentifier() else "code_under_test"
+
+def test_fix_context(source: str, module: str, failing_code: str) -> str:
+    """
+    The part of the code under test that failing tests use: the whole source when it is
+    small, otherwise its imports and the definitions the tests refer to.
+    """
+    if len(source) <= CHUNK_TOKENS * 4:
+        return source
+    names = referenced_names(failing_code)
+    lines = source.splitlines(keepends=True)
+    parts, covered = [import_lines(source)], []
+    for symbol in extract_symbols(f"{module}.py", source):
+        inside = any(start <= symbol.start and symbol.end <= end for start, end in covered)
+        if symbol.name.split(".")[-1] in names and not inside:
+            parts.append("".join(lines[symbol.start - 1:symbol.end]))
+            covered.append((symbol.start, symbol.end))
+    return "\n".join(part for part in parts if part)[:CHUNK_TOKENS * 8]
+
+def test_fix_prompt(source: str, module: str, tests: str, failed: dict, test_framework: str) -> str:
+    if "<module>" in failed:
+        return f"""
+        This {test_framework} test module for the module `{module}` cannot be run:
+
+        ```
+        {trim_traceback(failed["<module>"])}
+        ```
+
+        ```
+        {tests}
+        ```
+
+        Fix it and return the whole corrected test module, as code without any explanations.
+        """
+
+    failing_code = "\n\n".join(unit.text for unit in test_units(tests) if any(test in failed for test in unit.tests))
+    failures = "\n\n".join(f"{test}:\n{trim_traceback(trace)}" for test, trace in failed.items())
+    return f"""
+        These {test_framework} tests for the module `{module}` fail:
+
+        {failures}
+
+        The failing tests:
+        ```
+        {failing_code}
+        ```
+
+        The code they test:
+        ```
+        {test_fix_context(source, module, failing_code)}
+        ```
+
+        Fix the tests that are wrong. Return only the corrected test functions (whole classes for test
+        methods) with any imports they need, as code without any explanations. If a failure shows a
+        bug in the code under test rather than in the test, return that test unchanged.
+        """
+
+def verify_tests(source: str, path: str, tests: str, test_framework: str) -> tuple:
+    """
+    Run generated tests and regenerate only the failing ones, for up to TEST_FIX_ROUNDS
+    rounds. Each fix request carries just the failing tests, their trimmed tracebacks and
+    the code they use. Returns the final tests and a report of the last run.
+    """
+    module = test_module_name(path)
+    paths = [working_directory()]
+    if path:
+        paths.insert(0, os.path.dirname(os.path.join(working_directory(), os.path.expanduser(path))))
+
+    for round_number in range(TEST_FIX_ROUNDS + 1):
+        result = test_runner.run(source, module, tests, paths)
+        print(f"🧪 {len(result['passed'])} passed, {len(result['failed'])} failed "
+              f"({result['ran']} run, {result['cached']} cached, {result['seconds']}s)")
+        if not result["failed"] or round_number == TEST_FIX_ROUNDS:
+            break
+        print(f"🔧 Regenerating {len(result['failed'])} failing tests...")
+        fixed = strip_code_fence(complete("generate_test", test_fix_prompt(source, module, tests, result["failed"], test_framework)))
+        try:
+            fixed = fixed if "<module>" in result["failed"] else replace_tests(tests, fixed)
+        except SyntaxError as e:
+            print(f"⚠️ The regenerated tests do not parse, keeping the previous ones: {str(e)}")
+            break
+        if fixed == tests:
+            # The model kept every failing test: the failures point at the code under test
+            break
+        tests = fixed
+
+    report = f"\n\nVerified with pytest: {len(result['passed'])} passed, {len(result['failed'])} failed."
+    for test, trace in result["failed"].items():
+        report += f"\n\nFAILED {test}\n{trim_traceback(trace)}"
+    return tests, report
+
+def generate_test(code: str, test_framework: str = "pytest", output_path: str = "", verify: bool = False) -> str:
     """
-    Generate tests for the given code.
+    Generate tests for the given code, or for the file at the given path.
+    Large sources get tests chunk by chunk, concurrently, merged into one test module.
+    With output_path the tests are written to that file and only a digest is returned.
+    With verify the tests are run first and failing ones regenerated (see verify_tests).
     """
     try:
-        prompt = f"""
+        source, path = load_source(code)
+        verify = str(verify).lower() in ("true", "1", "yes")
+        note = ""
+        if verify and not can_run(source, test_framework):
+            verify = False
+            note = "\n\nNot verified: only tests for Python code (pytest or unittest) can be run."
+        hint = f" The code is in the module `{test_module_name(path)}`; import it from there." if verify else ""
+
+        chunks = split_source(source, CHUNK_TOKENS * 4)
+        if len(chunks) == 1:
+            prompt = f"""
         Generate tests for the following code using {test_framework}:
-        
+
         ```
-        {code}
+        {source}
         ```
-        
+
         Create comprehensive tests that cover different scenarios and edge cases.
-        Only provide the test code without any explanations.
+        Only provide the test code without any explanations.{hint}
         """
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.choices[0].message.content
+
+            if not verify:
+                if output_path:
+                    return stream_to_file("generate_test", prompt, output_path) + note
+                return complete("generate_test", prompt) + note
+            tests = strip_code_fence(complete("generate_test", prompt))
+        else:
+            print(f"🧩 Generating tests for {path or 'the code'} in {len(chunks)} parts...")
+            location = f" from {path}" if path else ""
+            imports = import_lines(source)
+            context = f"The file imports:\n```\n{imports}```\n\n" if imports else ""
+            parts = map_chunks("generate_test", chunks, lambda chunk: (
+                f"Generate tests using {test_framework} for the following part of a larger file{location} ({chunk.name}):\n\n"
+                f"```\n{chunk.text}\n```\n\n{context}"
+                "Create comprehensive tests that cover different scenarios and edge cases. "
+                "Only provide the test code without any explanations." + hint
+            ))
+            tests = merge_tests(parts)
+
+        report = note
+        if verify:
+            tests, report = verify_tests(source, path, tests, test_framework)
+        if output_path:
+            full_path = os.path.join(working_directory(), os.path.expanduser(output_path))
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            write_atomic(full_path, tests)
+            print(f"💾 Wrote {output_path}")
+            return describe_written_file(output_path, tests) + report
+        return tests + report
     except Exception as e:
         return f"Error generating tests: {str(e)}"
 
+def find_symbol(name: str, kind: str = "") -> str:
+    """
+    List the functions, classes and methods with the given name in the workspace, with their locations.
+    """
+    try:
+        symbols = workspace_index().find(name, kind)
+        if not symbols:
+            return f"No symbol named {name} found in the workspace."
+        listing = "\n".join(f"{symbol.path}:{symbol.start}-{symbol.end} {symbol.kind} {symbol.name}" for symbol in symbols[:30])
+        if len(symbols) > 30:
+            listing += f"\n... and {len(symbols) - 30} more"
+        return listing
+    except Exception as e:
+        return f"Error finding symbol: {str(e)}"
+
+def read_symbol(name: str, path: str = "") -> str:
+    """
+    Return the source of a function, class or method from the workspace, without the rest of its file.
+    """
+    try:
+        index = workspace_index()
+        path = os.path.normpath(path).removeprefix("./") if path else ""
+        symbols = [symbol for symbol in index.find(name)
+                   if not path or symbol.path == path or symbol.path.endswith(os.sep + path)]
+        if not symbols:
+            return f"No symbol named {name} found in the workspace."
+        exact = [symbol for symbol in symbols if symbol.name == name]
+        if len(exact) == 1:
+            symbols = exact
+        if len(symbols) > 3:
+            listing = "\n".join(f"{symbol.path}:{symbol.start}-{symbol.end} {symbol.kind} {symbol.name}" for symbol in symbols[:30])
+            return f"{len(symbols)} symbols match {name}; pass path or a qualified name to choose one:\n{listing}"
+        return "\n\n".join(
+            f"{symbol.path}:{symbol.start}-{symbol.end} {symbol.kind} {symbol.name}\n```\n"
+            f"{index.read_lines(symbol.path, symbol.start, symbol.end)}```"
+            for symbol in symbols
+        )
+    except Exception as e:
+        return f"Error reading symbol: {str(e)}"
+
+def search_code(query: str, limit: int = 10) -> str:
+    """
+    Find the workspace files most relevant to the query words, with their best matching lines.
+    """
+    try:
+        index = workspace_index()
+        results = index.search(query, int(limit))
+        if not results:
+            return f"No files in the workspace match {query}."
+        found = []
+        for path, score in results:
+            lines = "\n".join(f"  {number}: {line}" + (f"  (in {name})" if name else "")
+                              for number, line, name in index.matching_lines(path, query))
+            found.append(f"{path}\n{lines}")
+        return "\n".join(found)
+    except Exception as e:
+        return f"Error searching code: {str(e)}"
+
 # Available tools dictionary - now with improved command execution tools
 available_tools = {
     "execute_command": {
         "fn": execute_command,
-        "description": "Executes a shell command directly. Parameters: command, show_realtime_output (optional)."
+        "description": "Executes a shell command directly. Parameters: command, show_realtime_output (optional), cwd (optional), timeout (optional)."
     },
     "execute_long_running_command": {
         "fn": execute_long_running_command,
-        "description": "Executes a potentially long-running command with real-time feedback. Parameters: command."
+        "description": "Executes a potentially long-running command with real-time feedback. Parameters: command, cwd (optional)."
     },
     "generate_command": {
         "fn": generate_command,
@@ -463,23 +1580,39 @@ available_tools = {
     },
     "generate_code": {
         "fn": generate_code,
-        "description": "Generates code based on the provided prompt and language. Parameters: prompt, language (optional, defaults to python)."
+        "description": "Generates code based on the provided prompt and language. Parameters: prompt, language (optional, defaults to python), output_path (optional: write the code to this file and return only a summary)."
     },
     "generate_project": {
         "fn": generate_project,
         "description": "Generates a complete project structure based on the description. Parameters: project_description, project_path (optional)."
     },
+    "resume_project": {
+        "fn": resume_project,
+        "description": "Finishes a project creation that failed or was interrupted, re-running only the steps that did not complete. Parameters: project_path (optional)."
+    },
     "explain_code": {
         "fn": explain_code,
-        "description": "Provides an explanation for the given code. Parameters: code."
+        "description": "Provides an explanation for the given code. Parameters: code (the code, or a file path)."
     },
     "improve_code": {
         "fn": improve_code,
-        "description": "Improves the given code based on the improvement prompt. Parameters: code, improvement_prompt (optional)."
+        "description": "Improves the given code based on the improvement prompt. Parameters: code (the code, or a file path), improvement_prompt (optional), mode (optional: patch or full; patch edits a file in place and returns the diff, full returns the whole improved code)."
     },
     "generate_test": {
         "fn": generate_test,
-        "description": "Generates tests for the given code. Parameters: code, test_framework (optional, defaults to pytest)."
+        "description": "Generates tests for the given code. Parameters: code (the code, or a file path), test_framework (optional, defaults to pytest), output_path (optional: write the tests to this file and return only a summary), verify (optional: run the tests and fix failing ones before returning them, with the remaining failures)."
+    },
+    "find_symbol": {
+        "fn": find_symbol,
+        "description": "Finds functions, classes and methods by name in the workspace and returns their file and line range. Parameters: name, kind (optional: function, class or method)."
+    },
+    "read_symbol": {
+        "fn": read_symbol,
+        "description": "Returns the source of one function, class or method from the workspace. Parameters: name (Class.method for a method), path (optional)."
+    },
+    "search_code": {
+        "fn": search_code,
+        "description": "Finds the workspace files most relevant to some words or identifiers, with their best matching lines. Parameters: query, limit (optional, defaults to 10)."
     }
 }
 
@@ -504,6 +1637,11 @@ system_prompt = f"""
     - For file and directory operations, use generate_command to get the appropriate shell command.
     - For simple commands, use execute_command.
     - For potentially long-running commands, use execute_long_running_command to show real-time progress.
+    - Commands run in one persistent shell, so the working directory and exported variables carry over between commands.
+    - To look at existing code, use find_symbol, read_symbol and search_code rather than printing whole files.
+    - To save generated code or tests to a file, pass output_path to generate_code or generate_test instead of writing the file with a command.
+    - To check generated Python tests, pass verify to generate_test instead of running them with a command.
+    - If a project creation failed partway (for example an install failed), fix the cause and use resume_project instead of generating the project again.
     - Always show each minor step to the user like creating a file, reading a file, etc.
 
     Output JSON Format:
@@ -515,14 +1653,18 @@ system_prompt = f"""
     }}
 
     Available Tools:
-    - execute_command: Executes a shell command directly. Parameters: command, show_realtime_output (optional).
-    - execute_long_running_command: Executes a potentially long-running command with real-time feedback. Parameters: command.
+    - execute_command: Executes a shell command directly. Parameters: command, show_realtime_output (optional), cwd (optional), timeout (optional).
+    - execute_long_running_command: Executes a potentially long-running command with real-time feedback. Parameters: command, cwd (optional).
     - generate_command: Generates a shell command based on the operation description. Parameters: operation_description.
-    - generate_code: Generates code based on the provided prompt and language. Parameters: prompt, language (optional, defaults to python).
+    - generate_code: Generates code based on the provided prompt and language. Parameters: prompt, language (optional, defaults to python), output_path (optional: write the code to this file and return only a summary).
     - generate_project: Generates a complete project structure based on the description. Parameters: project_description, project_path (optional).
-    - explain_code: Provides an explanation for the given code. Parameters: code.
-    - improve_code: Improves the given code based on the improvement prompt. Parameters: code, improvement_prompt (optional).
-    - generate_test: Generates tests for the given code. Parameters: code, test_framework (optional, defaults to pytest).
+    - resume_project: Finishes a project creation that failed or was interrupted, re-running only the steps that did not complete. Parameters: project_path (optional).
+    - explain_code: Provides an explanation for the given code. Parameters: code (the code, or a file path).
+    - improve_code: Improves the given code based on the improvement prompt. Parameters: code (the code, or a file path), improvement_prompt (optional), mode (optional: patch or full; patch edits a file in place and returns the diff, full returns the whole improved code).
+    - generate_test: Generates tests for the given code. Parameters: code (the code, or a file path), test_framework (optional, defaults to pytest), output_path (optional: write the tests to this file and return only a summary), verify (optional: run the tests and fix failing ones before returning them, with the remaining failures).
+    - find_symbol: Finds functions, classes and methods by name in the workspace and returns their file and line range. Parameters: name, kind (optional: function, class or method).
+    - read_symbol: Returns the source of one function, class or method from the workspace. Parameters: name (Class.method for a method), path (optional).
+    - search_code: Finds the workspace files most relevant to some words or identifiers, with their best matching lines. Parameters: query, limit (optional, defaults to 10).
     
     Example:
     User Query: Create a React app with Vite in a folder called my-app
@@ -532,18 +1674,286 @@ system_prompt = f"""
     Output: {{ "step": "output", "content": "I've created a new React application using Vite in the 'my-app' folder. The project has been set up with npm and all the necessary dependencies have been installed. You can now navigate to the my-app directory and start the development server with 'npm run dev'." }}
 """
 
+tool_system_prompt = """
+    You are CodeSH, an intelligent code generation assistant that helps users create code, develop projects, and work with files.
+    Use the provided tools to carry out the user's request, then reply with a short summary of what was done.
+
+    Rules:
+    - When several tool calls do not depend on each other's results, request them together in one response;
+      they will run in parallel.
+    - NEVER execute sudo commands or any commands that could harm the system.
+    - Be helpful and informative about code generation and programming concepts.
+    - For Express.js projects, ALWAYS use the standard npm init approach followed by manual installation
+      of dependencies (NOT express-generator).
+    - For Node.js projects, ensure dependencies are properly installed with npm.
+    - For file and directory operations, use generate_command to get the appropriate shell command.
+    - For potentially long-running commands, use execute_long_running_command to show real-time progress.
+    - Commands run in one persistent shell, so the working directory and exported variables carry over between commands.
+    - To look at existing code, use find_symbol, read_symbol and search_code rather than printing whole files.
+    - To save generated code or tests to a file, pass output_path to generate_code or generate_test instead of writing the file with a command.
+    - To check generated Python tests, pass verify to generate_test instead of running them with a command.
+    - If a project creation failed partway (for example an install failed), fix the cause and use resume_project instead of generating the project again.
+"""
+
+# Function definitions for native tool calling, generated from available_tools
+TOOL_SCHEMAS = tool_schemas(available_tools)
+
+@tracer.traced("tool")
 def process_function_input(function_name, input_data):
     """Process the function input based on its type and the expected parameters."""
     if isinstance(input_data, dict):
         # If input is a dictionary, pass it as kwargs
-        return available_tools[function_name]["fn"](**input_data)
+        output = available_tools[function_name]["fn"](**input_data)
     else:
         # If input is not a dictionary, pass it as a single argument
-        return available_tools[function_name]["fn"](input_data)
+        output = available_tools[function_name]["fn"](input_data)
+    current_span().set(input_bytes=len(json.dumps(input_data, default=str)), output_bytes=len(str(output)))
+    return output
+
+def new_conversation() -> ConversationWindow:
+    """
+    Start a conversation history that is kept inside the configured token budget.
+    """
+    return ConversationWindow(
+        tool_system_prompt if TOOL_CALLING else system_prompt,
+        budget=int(os.getenv("CODESH_CONTEXT_TOKENS", "12000")),
+        observation_limit=int(os.getenv("CODESH_OBSERVATION_TOKENS", "1000"))
+    )
+
+# Conversation history of the interactive session
+messages = new_conversation()
+
+def request_step(history):
+    """
+    Request the next step and wait for the complete JSON response.
+    """
+    response = chat_completion(
+        "agent",
+        response_format={"type": "json_object"},
+        messages=history.request_messages()
+    )
+    return json.loads(response.choices[0].message.content), None
+
+def stream_step(history):
+    """
+    Request the next step as a stream of deltas.
+    Plan and output content is printed as it arrives, and an action is dispatched
+    as soon as its function and input fields are complete, while the rest of the
+    completion is still being received.
+    Returns the parsed step and the dispatched action's future (if any). If the step
+    breaks off after its action was dispatched, the action is returned as the step.
+    """
+    stream = chat_completion(
+        "agent",
+        response_format={"type": "json_object"},
+        messages=history.request_messages(),
+        stream=True
+    )
+
+    parser = StepStreamParser()
+    pending_text = []
+    printing = False
+    action = None
+    prefixes = {"plan": "🧠: ", "output": "🤖: "}
+
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+
+            for kind, key, value in parser.feed(delta):
+                step = parser.fields.get("step")
+                if kind == "text" and key == "content":
+                    if printing:
+                        sys.stdout.write(value)
+                        sys.stdout.flush()
+                    else:
+                        pending_text.append(value)
+                elif kind == "field" and key == "step" and value in prefixes:
+                    # "content" may have started before "step" was known
+                    sys.stdout.write(prefixes[value] + "".join(pending_text))
+                    sys.stdout.flush()
+                    printing = True
+
+                fields = parser.fields
+                if (action is None and step == "action" and "function" in fields
+                        and "input" in fields and fields["function"] in available_tools):
+                    action = tool_executor.submit(contextvars.copy_context().run, process_function_input,
+                                                  fields["function"], fields["input"])
+    except Exception:
+        # An action already running must not be dropped with the rest of the step
+        if action is None:
+            raise
+        broken = True
+    else:
+        broken = False
+
+    if printing:
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+
+    parsed_output = None
+    if not broken:
+        try:
+            parsed_output = json.loads(parser.text)
+        except json.JSONDecodeError:
+            if action is None:
+                raise
+    if parsed_output is None:
+        # Keep the dispatched action as the step, so its output is waited for and
+        # recorded in the conversation like any other action's
+        print("⚠️ The rest of the step could not be read; keeping its action.")
+        parsed_output = {"step": "action", "function": parser.fields["function"], "input": parser.fields["input"]}
+    return parsed_output, action
+
+def run_query(user_query, history=None):
+    """
+    Run the plan/action/observe loop for a single user query until the assistant
+    produces its output step. Uses the global conversation unless a history is given.
+    """
+    history = messages if history is None else history
+    history.append({"role": "user", "content": user_query})
+
+    while True:
+        try:
+            if STREAM_STEPS:
+                parsed_output, action = stream_step(history)
+            else:
+                parsed_output, action = request_step(history)
+            history.append({"role": "assistant", "content": json.dumps(parsed_output)})
+
+            if parsed_output.get("step") == "plan":
+                emit({"type": "plan", "content": parsed_output.get("content")})
+                if not STREAM_STEPS:
+                    print(f"🧠: {parsed_output.get('content')}")
+                continue
+
+            if parsed_output.get("step") == "action":
+                tool_name = parsed_output.get("function")
+                tool_input = parsed_output.get("input")
+                emit({"type": "action", "function": tool_name, "input": tool_input})
+
+                if action is not None:
+                    output = action.result()
+                elif tool_name in available_tools:
+                    output = process_function_input(tool_name, tool_input)
+                else:
+                    output = f"Error: Tool '{tool_name}' not found."
+                emit({"type": "observation", "function": tool_name, "output": output})
+                history.append_observation(output)
+                continue
+
+            if parsed_output.get("step") == "output":
+                emit({"type": "answer", "content": parsed_output.get("content")})
+                if not STREAM_STEPS:
+                    print(f"🤖: {parsed_output.get('content')}")
+                break
+
+        except json.JSONDecodeError:
+            emit({"type": "error", "message": "Invalid JSON response from assistant."})
+            print("Error: Invalid JSON response from assistant.")
+            break
+        except Exception as e:
+            emit({"type": "error", "message": str(e)})
+            print(f"Error: {str(e)}")
+            break
+
+def run_tool_calls(tool_calls):
+    """
+    Run the tool calls from one response concurrently and return their outputs in order.
+    """
+    def run(call):
+        name = call.function.name
+        if name not in available_tools:
+            return f"Error: Tool '{name}' not found."
+        try:
+            arguments = parse_arguments(call)
+            emit({"type": "action", "function": name, "input": arguments})
+            print(f"🛠️: {name}")
+            output = process_function_input(name, arguments)
+        except Exception as e:
+            output = f"Error: {str(e)}"
+        emit({"type": "observation", "function": name, "output": output})
+        return output
 
-messages = [
-    {"role": "system", "content": system_prompt}
-]
+    # Each call runs in a copy of the caller's context, so output routing follows it
+    futures = [parallel_tool_executor.submit(contextvars.copy_context().run, run, call) for call in tool_calls]
+    return [future.result() for future in futures]
+
+def run_query_with_tools(user_query, history=None):
+    """
+    Answer a user query using native tool calling. All tool calls returned in one
+    response run concurrently and their results go back in a single follow-up request.
+    """
+    history = messages if history is None else history
+    history.append({"role": "user", "content": user_query})
+
+    while True:
+        try:
+            response = chat_completion(
+                "agent",
+                messages=history.request_messages(),
+                tools=TOOL_SCHEMAS,
+                parallel_tool_calls=True
+            )
+            message = response.choices[0].message
+
+            if not message.tool_calls:
+                history.append({"role": "assistant", "content": message.content or ""})
+                emit({"type": "answer", "content": message.content})
+                print(f"🤖: {message.content}")
+                break
+
+            history.append(tool_call_message(message))
+            if message.content:
+                emit({"type": "plan", "content": message.content})
+                print(f"🧠: {message.content}")
+
+            for call, output in zip(message.tool_calls, run_tool_calls(message.tool_calls)):
+                history.append_tool_result(call.id, output)
+
+        except Exception as e:
+            emit({"type": "error", "message": str(e)})
+            print(f"Error: {str(e)}")
+            break
+
+def run_fast_path(user_query, intent, history=None):
+    """
+    Run the command for a locally matched intent and record the exchange in the
+    conversation, so follow-up queries sent to the model still see it.
+    """
+    history = messages if history is None else history
+    emit({"type": "action", "function": "execute_command", "input": {"command": intent.command}})
+    print(f"⚡: {intent.command}")
+    output = execute_command(intent.command)
+    emit({"type": "observation", "function": "execute_command", "output": output})
+    emit({"type": "answer", "content": output})
+    print(f"🤖: {output}")
+
+    content = f"Ran `{intent.command}`:\n{output}"
+    history.append({"role": "user", "content": user_query})
+    history.append({"role": "assistant", "content": content if TOOL_CALLING else json.dumps({"step": "output", "content": content})})
+
+@tracer.traced("query")
+def answer_query(user_query, history=None):
+    """
+    Answer a user query. Common file and directory operations matched by the intent
+    router run directly; anything else goes to the configured agent loop.
+    """
+    intent = match_intent(user_query, working_directory()) if FAST_PATH else None
+    # cd only carries over to later commands in the persistent shell
+    if intent is not None and (intent.name != "change_directory" or PERSISTENT_SHELL):
+        current_span().set(intent=intent.name)
+        run_fast_path(user_query, intent, history)
+        return
+
+    if TOOL_CALLING:
+        run_query_with_tools(user_query, history)
+    else:
+        run_query(user_query, history)
 
 def display_banner():
     """Display a banner for the code generation tool."""
@@ -571,6 +1981,42 @@ def main():
             print("Exiting CODESH. Goodbye!")
             break
             
+        if user_query.lower() in ('cache', 'cache clear'):
+            if user_query.lower() == 'cache clear':
+                response_cache.clear()
+                print("Response cache cleared.")
+            print(json.dumps(response_cache.stats(), indent=2))
+            continue
+
+        if user_query.lower() in ('scaffolds', 'scaffolds clear'):
+            if user_query.lower() == 'scaffolds clear':
+                scaffold_cache.clear()
+                print("Scaffold cache cleared.")
+            print(json.dumps(scaffold_cache.stats(), indent=2))
+            continue
+
+        if user_query.lower() in ('plans', 'plans clear'):
+            if user_query.lower() == 'plans clear':
+                plan_index.clear()
+                print("Saved project plans cleared.")
+            print(json.dumps(plan_index.stats(), indent=2))
+            continue
+
+        if user_query.lower() == 'stats':
+            print(json.dumps(tracer.stats(), indent=2))
+            continue
+
+        if user_query.lower() == 'models':
+            print(json.dumps(router.stats(), indent=2))
+            continue
+
+        if user_query.lower() == 'index':
+            try:
+                print(json.dumps(workspace_index(min_interval=0).stats(), indent=2))
+            except ValueError as e:
+                print(f"Error: {str(e)}")
+            continue
+
         if user_query.lower() == 'help':
             print("\nAvailable operations:")
             print("  - File & Directory operations: 'List files in current directory', 'Create a new folder called projects', etc.")
@@ -582,49 +2028,16 @@ def main():
             print("  - Improve code: 'Improve this code for performance: <paste code here>'")
             print("  - Generate tests: 'Write tests for: <paste code here>'")
             print("\nCommands are automatically generated and executed based on natural language descriptions")
+            print("\nType 'cache' to show response cache hits and misses, 'cache clear' to empty it")
+            print("Type 'scaffolds' to list cached npm project skeletons, 'scaffolds clear' to invalidate them")
+            print("Type 'plans' to show how many project plans are saved for reuse, 'plans clear' to forget them")
+            print("Type 'stats' to show timings for this session and its slowest steps")
+            print("Type 'models' to show the model route of each tool and the latency and errors seen per model")
+            print("Type 'index' to build or update the code index of the current directory and show its size")
             print("\nType 'exit' to quit\n")
             continue
         
-        messages.append({"role": "user", "content": user_query})
-
-        while True:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                response_format={"type": "json_object"},
-                messages=messages
-            )
-
-            try:
-                parsed_output = json.loads(response.choices[0].message.content)
-                messages.append({"role": "assistant", "content": json.dumps(parsed_output)})
-
-                if parsed_output.get("step") == "plan":
-                    print(f"🧠: {parsed_output.get('content')}")
-                    continue
-                
-                if parsed_output.get("step") == "action":
-                    tool_name = parsed_output.get("function")
-                    tool_input = parsed_output.get("input")
-
-                    if tool_name in available_tools:
-                        output = process_function_input(tool_name, tool_input)
-                        messages.append({"role": "assistant", "content": json.dumps({"step": "observe", "output": output})})
-                        continue
-                    else:
-                        output = f"Error: Tool '{tool_name}' not found."
-                        messages.append({"role": "assistant", "content": json.dumps({"step": "observe", "output": output})})
-                        continue
-                
-                if parsed_output.get("step") == "output":
-                    print(f"🤖: {parsed_output.get('content')}")
-                    break
-
-            except json.JSONDecodeError:
-                print("Error: Invalid JSON response from assistant.")
-                break
-            except Exception as e:
-                print(f"Error: {str(e)}")
-                break
+        answer_query(user_query)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
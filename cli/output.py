@@ -0,0 +1,65 @@
+import contextvars
+import io
+import sys
+from contextlib import contextmanager
+
+_target = contextvars.ContextVar("codesh_output", default=None)
+
+
+class ContextStdout(io.TextIOBase):
+    """
+    Stand-in for sys.stdout that sends writes to the writer set for the current
+    context (thread or task), or to the real stdout when none is set.
+    Lets one process serve several clients while tools keep using print().
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def _writer(self):
+        return _target.get() or self.fallback
+
+    def write(self, text):
+        self._writer().write(text)
+        return len(text)
+
+    def flush(self):
+        self._writer().flush()
+
+    def isatty(self):
+        return _target.get() is None and self.fallback.isatty()
+
+    @property
+    def encoding(self):
+        return getattr(self.fallback, "encoding", "utf-8")
+
+
+def install():
+    """
+    Replace sys.stdout with a ContextStdout, once.
+    """
+    if not isinstance(sys.stdout, ContextStdout):
+        sys.stdout = ContextStdout(sys.stdout)
+
+
+@contextmanager
+def redirect_output(writer):
+    """
+    Send everything printed in the current context to writer.
+    """
+    install()
+    token = _target.set(writer)
+    try:
+        yield writer
+    finally:
+        _target.reset(token)
+
+
+def emit(event: dict):
+    """
+    Send a structured event (a plan, action, observation or answer) to the writer set
+    for the current context, if it accepts events. Printed output is unaffected.
+    """
+    handler = getattr(_target.get(), "event", None)
+    if handler is not None:
+        handler(event)
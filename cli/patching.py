@@ -0,0 +1,151 @@
+import difflib
+import os
+import re
+import shutil
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+# One edit: text to find in the source (copied exactly) and the text to put in its place
+Hunk = namedtuple("Hunk", ["search", "replace"])
+
+# Tells the model which edit format parse_hunks understands
+PATCH_INSTRUCTIONS = """Do not repeat the whole code. Reply only with the edits, each as a block:
+
+<<<<<<< SEARCH
+lines copied exactly from the code, enough of them to be unique
+=======
+the lines that replace them
+>>>>>>> REPLACE
+
+Leave out parts that do not change. Reply with no blocks if nothing should change."""
+
+_BLOCK = re.compile(r"^<{5,}[ \t]*SEARCH[^\n]*\n(.*?)^={5,}[ \t]*\n(.*?)^>{5,}[ \t]*REPLACE[^\n]*$",
+                    re.DOTALL | re.MULTILINE)
+
+
+def _unified_hunks(text: str) -> list:
+    """
+    Hunks of a unified diff. Line numbers are ignored; hunks are placed by their
+    context and removed lines like search/replace blocks.
+    """
+    hunks = []
+    search, replace, inside = [], [], False
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        # Inside a hunk, "--- " is a removed line starting "-- " (a SQL or Lua comment)
+        # unless the "+++ " line of a file header follows it
+        next_line = lines[index + 1] if index + 1 < len(lines) else ""
+        header = line.startswith("--- ") and (not inside or next_line.startswith("+++ "))
+        if line.startswith("@@") or line.startswith("```") or header or line.startswith("diff "):
+            if search or replace:
+                hunks.append(Hunk("".join(search), "".join(replace)))
+            search, replace, inside = [], [], line.startswith("@@")
+            continue
+        if not inside or line.startswith("\\"):
+            continue
+        marker, content = (line[0], line[1:]) if line else (" ", "")
+        if marker in " -":
+            search.append(content + "\n")
+        if marker in " +":
+            replace.append(content + "\n")
+    if search or replace:
+        hunks.append(Hunk("".join(search), "".join(replace)))
+    return hunks
+
+
+def parse_hunks(text: str) -> list:
+    """
+    Edits from a model response: SEARCH/REPLACE blocks, or a unified diff if there are none.
+    """
+    blocks = [Hunk(search, replace) for search, replace in _BLOCK.findall(text)]
+    return blocks or _unified_hunks(text)
+
+
+def _locate(source: str, search: str):
+    """
+    (start, end) of the one place search occurs in source, or an error message.
+    Falls back to comparing lines without trailing whitespace.
+    """
+    count = source.count(search)
+    if count == 1:
+        start = source.index(search)
+        return (start, start + len(search)), None
+
+    lines = source.splitlines(keepends=True)
+    wanted = [line.rstrip() for line in search.splitlines()]
+    stripped = [line.rstrip() for line in lines]
+    matches = [index for index in range(len(lines) - len(wanted) + 1)
+               if stripped[index:index + len(wanted)] == wanted]
+    if count > 1 or len(matches) > 1:
+        return None, f"SEARCH text matches {max(count, len(matches))} places"
+    if not matches:
+        return None, "SEARCH text not found"
+    start = sum(len(line) for line in lines[:matches[0]])
+    return (start, start + sum(len(line) for line in lines[matches[0]:matches[0] + len(wanted)])), None
+
+
+def apply_hunks(source: str, hunks: list):
+    """
+    Apply hunks one after another. Returns the patched source and a list of
+    (hunk, reason) for the hunks that could not be placed, which leave the source as is.
+    """
+    rejected = []
+    for hunk in hunks:
+        if not hunk.search.strip():
+            rejected.append((hunk, "SEARCH text is empty"))
+            continue
+        span, reason = _locate(source, hunk.search)
+        if span is None:
+            rejected.append((hunk, reason))
+            continue
+        start, end = span
+        replace = hunk.replace
+        # Keep the line ending the matched text had, however the reply ended its block
+        if replace and source[start:end].endswith("\n") != replace.endswith("\n"):
+            replace = replace + "\n" if source[start:end].endswith("\n") else replace.rstrip("\n")
+        source = source[:start] + replace + source[end:]
+    return source, rejected
+
+
+def format_hunk(hunk: Hunk) -> str:
+    return f"<<<<<<< SEARCH\n{hunk.search}=======\n{hunk.replace}>>>>>>> REPLACE"
+
+
+def _diff_lines(text: str) -> list:
+    lines = text.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n\\ No newline at end of file\n"
+    return lines
+
+
+def unified_diff(before: str, after: str, path: str = "code") -> str:
+    name = path.lstrip("/")
+    return "".join(difflib.unified_diff(_diff_lines(before), _diff_lines(after), f"a/{name}", f"b/{name}"))
+
+
+@contextmanager
+def atomic_file(path: str):
+    """
+    Open a temporary file next to path for writing and move it into place when the
+    block ends, so readers see either the old file or the new one. A symlink is
+    followed, not replaced, and an existing file keeps its permissions. If the block
+    fails, the temporary file is removed and path is left as it was.
+    """
+    path = os.path.realpath(path)
+    temporary = f"{path}.{uuid.uuid4().hex}"
+    try:
+        with open(temporary, "w") as f:
+            yield f
+        if os.path.exists(path):
+            shutil.copymode(path, temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def write_atomic(path: str, text: str):
+    with atomic_file(path) as f:
+        f.write(text)
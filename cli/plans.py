@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_PLAN_INDEX = os.path.join(os.path.expanduser("~"), ".cache", "codesh", "plans.jsonl")
+
+# Stand for the project path, and its last part (the project's name), in stored plans
+PLACEHOLDER = "<<codesh:project_path>>"
+NAME_PLACEHOLDER = "<<codesh:project_name>>"
+
+# Words that do not change what gets built
+STOPWORDS = {
+    "a", "an", "the", "in", "at", "to", "into", "inside", "under", "of", "for", "on", "with", "using", "use",
+    "and", "create", "make", "build", "generate", "scaffold", "set", "setup", "up", "start", "new", "simple",
+    "basic", "project", "folder", "directory", "dir", "called", "named", "name", "please", "me", "i", "we",
+    "want", "need", "that", "which", "some", "my", "our", "it", "there", "here",
+}
+
+# Words after which a project's directory name usually appears ("a folder called my-app")
+NAME_CUES = {"called", "named", "in", "at", "into", "inside", "folder", "directory", "dir"}
+
+# Different words for the same thing
+SYNONYMS = {
+    "api": "server", "backend": "server", "service": "server", "webserver": "server", "rest": "server",
+    "application": "app", "webapp": "app", "website": "site", "webpage": "site", "page": "site",
+    "db": "database", "mongo": "mongodb", "postgresql": "postgres", "ts": "typescript",
+}
+
+# MinHash signature size and the banding used to find candidates: 16 bands of 4 rows
+# make descriptions with a Jaccard similarity around 0.5 or more likely candidates
+NUM_PERM = 64
+BANDS = 16
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(0x5eed)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+PlanMatch = namedtuple("PlanMatch", ["plan", "confidence", "key"])
+
+
+def clean_path(project_path: str) -> str:
+    path = (project_path or ".").strip().rstrip("/") or "/"
+    while path.startswith("./"):
+        path = path[2:]
+    return path or "."
+
+
+def description_tokens(description: str, project_path: str = ".") -> list:
+    """
+    The words of a project description that say what to build: lowercased, without
+    paths, the project's own name, filler words or plural endings, and with common
+    synonyms folded together ("Express API with mongoose in ./api" gives express,
+    server, mongoose).
+    """
+    path = clean_path(project_path)
+    name = os.path.basename(path) if path not in (".", "/") else ""
+    tokens = []
+    previous = ""
+    for word in description.lower().split():
+        word, before = word.strip(".,;:!?\"'()[]{}`"), previous
+        previous = word
+        # Paths and the project's directory name are parameters, not part of the request;
+        # a plain word like "api" only counts as the name where it reads as one
+        if not word or "/" in word or word.startswith("."):
+            continue
+        if word in (path, name) and (not word.isalpha() or before in NAME_CUES):
+            continue
+        for token in re.findall(r"[a-z0-9+#]+", word.replace(".js", "js")):
+            if token.endswith("js") and len(token) > 4:
+                token = token[:-2]
+            if token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+                token = token[:-1]
+            token = SYNONYMS.get(token, token)
+            if token and token != "js" and token not in STOPWORDS and token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+def minhash(shingles) -> list:
+    """
+    MinHash signature of a set of shingles: for each of NUM_PERM hash permutations, the
+    smallest value over the set. The share of equal positions estimates the Jaccard
+    similarity of two sets.
+    """
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+              for shingle in shingles]
+    if not hashes:
+        return [_MERSENNE] * NUM_PERM
+    return [min((a * value + b) % _MERSENNE for value in hashes) for a, b in _PERMUTATIONS]
+
+
+def _bands(signature: list) -> list:
+    rows = NUM_PERM // BANDS
+    return [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(BANDS)]
+
+
+def _path_pattern(path: str):
+    # The path where it is used as one: not inside a longer word or path ("/api/users")
+    return re.compile(r"(?<![\w./-])(?:\./)?" + re.escape(path) + r"(?=$|[\s'\"/;&|)])")
+
+
+def _name_pattern(name: str):
+    # The name as a whole word ("shop-api" in package.json or "# shop-api"), not part of
+    # a longer name or path
+    return re.compile(r"(?<![\w./-])" + re.escape(name) + r"(?![\w-])")
+
+
+def project_name(project_path: str) -> str:
+    path = clean_path(project_path)
+    return os.path.basename(path) if path not in (".", "/") else ""
+
+
+def mentions_plain_name(value, project_path: str) -> bool:
+    """
+    Whether file contents in a plan use a project name that is a plain word ("blog",
+    "app"). Such a name cannot be told apart from the same word used in code, so it is
+    not replaced (see parameterize()).
+    """
+    name = project_name(project_path)
+    if not name or not name.isalpha():
+        return False
+    pattern = _name_pattern(name)
+
+    def walk(item, key=None):
+        if isinstance(item, str):
+            return key == "content" and bool(pattern.search(item))
+        if isinstance(item, list):
+            return any(walk(element, key) for element in item)
+        if isinstance(item, dict):
+            # Content sent as a JSON object is content all the way down
+            return any(walk(element, key if key == "content" else child) for child, element in item.items())
+        return False
+    return walk(value)
+
+
+def parameterize(value, project_path: str, skip=("path",)):
+    """
+    Replace the project path in a plan with PLACEHOLDER, and its name with
+    NAME_PLACEHOLDER. File contents only get the name replaced, and only a name that
+    is not a plain word (see mentions_plain_name()). Values under the keys in skip
+    (paths that are already relative to the project) are left alone.
+    """
+    path = clean_path(project_path)
+    if path in (".", "/"):
+        return value
+    pattern = _path_pattern(path)
+    name = project_name(path)
+    name_pattern = _name_pattern(name)
+
+    def walk(item, key=None):
+        if isinstance(item, str):
+            if key == "content":
+                return item if name.isalpha() else name_pattern.sub(NAME_PLACEHOLDER, item)
+            return name_pattern.sub(NAME_PLACEHOLDER, pattern.sub(PLACEHOLDER, item))
+        if isinstance(item, list):
+            return [walk(element, key) for element in item]
+        if isinstance(item, dict):
+            if key == "content":
+                return {child: walk(element, key) for child, element in item.items()}
+            return {child: element if child in skip else walk(element, child) for child, element in item.items()}
+        return item
+    return walk(value)
+
+
+def instantiate(value, project_path: str):
+    """
+    Put a project path back into a plan stored with parameterize().
+    """
+    path = clean_path(project_path)
+    if isinstance(value, str):
+        return value.replace(PLACEHOLDER, path).replace(NAME_PLACEHOLDER, project_name(path))
+    if isinstance(value, list):
+        return [instantiate(element, path) for element in value]
+    if isinstance(value, dict):
+        return {key: instantiate(element, path) for key, element in value.items()}
+    return value
+
+
+class PlanIndex:
+    """
+    Plans of projects that were created successfully, keyed by their normalized
+    description, kept in an append-only JSON Lines file. A new description is matched
+    with MinHash signatures of its words, bucketed by band (locality-sensitive hashing)
+    so only likely candidates are compared; the best candidate is used if the Jaccard
+    similarity of the words reaches threshold. Plans made in place (project path ".")
+    only match requests made in place, and the other way around.
+    """
+
+    def __init__(self, path: str = None, threshold: float = 0.9, max_entries: int = 5000, enabled: bool = True):
+        self.path = path or DEFAULT_PLAN_INDEX
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.buckets = {}
+        self.loaded = False
+
+    def _load(self):
+        # Called with the lock held
+        if self.loaded:
+            return
+        self.loaded = True
+        if not self.enabled or not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("removed"):
+                    self.entries.pop(record["key"], None)
+                else:
+                    self.entries[record["key"]] = record
+        # Only the newest entries are kept
+        for key in sorted(self.entries, key=lambda key: self.entries[key]["time"])[:-self.max_entries]:
+            del self.entries[key]
+        for key, record in self.entries.items():
+            self._bucket(key, record["tokens"])
+
+    def _bucket(self, key: str, tokens: list):
+        for band in _bands(minhash(tokens)):
+            self.buckets.setdefault(band, set()).add(key)
+
+    def _append(self, record: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def _key(tokens: list, in_place: bool) -> str:
+        return ("." if in_place else "") + " ".join(sorted(tokens))
+
+    def lookup(self, description: str, project_path: str = "."):
+        """
+        The plan of the most similar earlier project, with project_path put in, as a
+        PlanMatch; None when nothing reaches the threshold.
+        """
+        tokens = description_tokens(description, project_path)
+        if not self.enabled or not tokens:
+            return None
+        in_place = clean_path(project_path) == "."
+        with self.lock:
+            self._load()
+            candidates = set()
+            for band in _bands(minhash(tokens)):
+                candidates |= self.buckets.get(band, set())
+            best, best_score = None, 0.0
+            words = set(tokens)
+            for key in candidates:
+                record = self.entries.get(key)
+                if record is None or record["in_place"] != in_place:
+                    continue
+                stored = set(record["tokens"])
+                score = len(words & stored) / len(words | stored)
+                if score > best_score:
+                    best, best_score = record, score
+        if best is None or best_score < self.threshold:
+            return None
+        return PlanMatch(instantiate(best["plan"], project_path), best_score, best["key"])
+
+    def add(self, description: str, project_path: str, plan: dict, needs_path: bool = False) -> bool:
+        """
+        Remember the plan of a project that was created successfully. With needs_path,
+        a plan that never mentions its project path is not kept, since it could not be
+        moved to another path. Neither is one whose files mention a project name that
+        could not be replaced (see mentions_plain_name()).
+        """
+        tokens = description_tokens(description, project_path)
+        if not self.enabled or not tokens or mentions_plain_name(plan, project_path):
+            return False
+        in_place = clean_path(project_path) == "."
+        stored = parameterize(plan, project_path)
+        if needs_path and not in_place and PLACEHOLDER not in json.dumps(stored):
+            return False
+        key = self._key(tokens, in_place)
+        record = {"key": key, "tokens": tokens, "in_place": in_place, "plan": stored, "time": round(time.time(), 3)}
+        with self.lock:
+            self._load()
+            self.entries[key] = record
+            self._bucket(key, tokens)
+            self._append(record)
+        return True
+
+    def forget(self, key: str):
+        """
+        Drop a plan that failed when it was reused.
+        """
+        with self.lock:
+            self._load()
+            if self.entries.pop(key, None) is not None:
+                self._append({"key": key, "removed": True})
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.buckets.clear()
+            self.loaded = True
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._load()
+            return {"plans": len(self.entries), "threshold": self.threshold, "path": self.path}
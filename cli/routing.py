@@ -0,0 +1,115 @@
+import threading
+import time
+
+DEFAULT_MODEL = "gpt-4o"
+
+# Steps that only classify a request or write one command line do not need the flagship
+# model; the flagship stays in their route as the fallback
+DEFAULT_ROUTES = {
+    "generate_command": ["gpt-4o-mini", DEFAULT_MODEL],
+    "detect_project_type": ["gpt-4o-mini", DEFAULT_MODEL],
+}
+
+
+def parse_routes(text: str) -> dict:
+    """
+    Parse "tool=model,fallback;tool=model" into {tool: [model, fallback]}.
+    """
+    routes = {}
+    for entry in (text or "").split(";"):
+        if not entry.strip():
+            continue
+        tool, separator, models = entry.partition("=")
+        chain = [model.strip() for model in models.split(",") if model.strip()]
+        if not separator or not tool.strip() or not chain:
+            raise ValueError(f"Invalid model route {entry.strip()!r}, expected tool=model[,fallback...]")
+        routes[tool.strip()] = chain
+    return routes
+
+
+class ModelRouter:
+    """
+    Picks the model for each tool from its route, a preference-ordered chain of models.
+    Latency and errors are tracked per tool and model: a model is demoted for cooldown
+    seconds when its average latency for a tool goes over slow_seconds, or after
+    max_failures failures in a row. Demoted models move to the back of the chain until
+    their cooldown ends, so the next model in the route takes their calls.
+    """
+
+    def __init__(self, routes: dict = None, default: str = DEFAULT_MODEL, slow_seconds: float = 30.0,
+                 cooldown: float = 60.0, max_failures: int = 3, smoothing: float = 0.3):
+        self.routes = dict(routes or {})
+        self.default = default
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.max_failures = max_failures
+        self.smoothing = smoothing
+        self.health = {}
+        self.lock = threading.Lock()
+
+    def route(self, tool: str) -> list:
+        return self.routes.get(tool) or self.routes.get("default") or [self.default]
+
+    def _state(self, tool: str, model: str) -> dict:
+        key = (tool, model)
+        if key not in self.health:
+            self.health[key] = {"calls": 0, "errors": 0, "failures_in_row": 0, "latency": None,
+                                "demoted_until": 0.0, "demotions": 0}
+        return self.health[key]
+
+    def candidates(self, tool: str) -> list:
+        """
+        The tool's route with demoted models moved to the back, soonest recovery first.
+        A model whose cooldown has ended starts over with no latency history.
+        """
+        now = time.monotonic()
+        healthy, demoted = [], []
+        with self.lock:
+            for model in self.route(tool):
+                state = self._state(tool, model)
+                if state["demoted_until"] > now:
+                    demoted.append((state["demoted_until"], model))
+                    continue
+                if state["demoted_until"]:
+                    state.update(demoted_until=0.0, latency=None, failures_in_row=0)
+                healthy.append(model)
+        return healthy + [model for _, model in sorted(demoted)]
+
+    def record(self, tool: str, model: str, seconds: float, error=None):
+        """
+        Record one call's outcome and demote the model if it has become too slow or keeps failing.
+        """
+        with self.lock:
+            state = self._state(tool, model)
+            state["calls"] += 1
+            if error is not None:
+                state["errors"] += 1
+                state["failures_in_row"] += 1
+                failing = state["failures_in_row"] >= self.max_failures
+                slow = False
+            else:
+                state["failures_in_row"] = 0
+                previous = state["latency"]
+                state["latency"] = seconds if previous is None else previous + self.smoothing * (seconds - previous)
+                failing = False
+                slow = self.slow_seconds and state["latency"] > self.slow_seconds
+            if (failing or slow) and len(self.route(tool)) > 1 and state["demoted_until"] <= time.monotonic():
+                state["demoted_until"] = time.monotonic() + self.cooldown
+                state["demotions"] += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            models = {}
+            for (tool, model), state in sorted(self.health.items()):
+                if not state["calls"]:
+                    continue
+                models.setdefault(tool, {})[model] = {
+                    "calls": state["calls"],
+                    "errors": state["errors"],
+                    "latency_s": round(state["latency"], 3) if state["latency"] is not None else None,
+                    "demotions": state["demotions"],
+                    "cooling_down_s": round(max(0.0, state["demoted_until"] - now), 1),
+                }
+            return {"routes": {tool: self.route(tool) for tool in sorted(set(self.routes) | set(models))},
+                    "models": models}
@@ -0,0 +1,301 @@
+import fcntl
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import threading
+import time
+import uuid
+
+DEFAULT_SCAFFOLD_DIR = os.path.join(os.path.expanduser("~"), ".cache", "codesh", "scaffolds")
+
+# What a snapshot holds: the files npm init and npm install leave in a project
+SNAPSHOT_ENTRIES = ("package.json", "package-lock.json", "node_modules")
+
+# ioctl request that asks the filesystem for a copy-on-write clone (Linux FICLONE)
+FICLONE = 0x40049409
+
+
+def normalize_dependencies(dependencies: list) -> list:
+    """
+    Sorted list of distinct dependency specs, so the same set always gives the same key.
+    """
+    return sorted({dependency.strip() for dependency in dependencies or [] if dependency.strip()})
+
+
+def scaffold_key(project_type: str, dependencies: list) -> str:
+    """
+    Build a key from the project type and the normalized dependency list.
+    The platform is included because node_modules may hold native builds.
+    """
+    payload = json.dumps({
+        "project_type": (project_type or "").lower(),
+        "dependencies": normalize_dependencies(dependencies),
+        "platform": f"{platform.system()}-{platform.machine()}",
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def package_name(path: str) -> str:
+    """
+    Package name npm init -y derives from a project directory.
+    """
+    name = os.path.basename(os.path.abspath(path)).lower()
+    return re.sub(r"[^a-z0-9._~-]+", "-", name).lstrip("._") or "project"
+
+
+class ScaffoldCache:
+    """
+    On-disk cache of finished npm project skeletons (package.json, lockfile and
+    node_modules), keyed by scaffold_key(). A cached skeleton is materialized into a new
+    project with copy-on-write clones where the filesystem supports them and hardlinks
+    otherwise, so repeat scaffolds skip npm entirely. The least recently used snapshots
+    are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = 2 * 1024 ** 3, enabled: bool = True):
+        self.enabled = enabled
+        self.root = root or DEFAULT_SCAFFOLD_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._can_clone = True
+
+    def _snapshot_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def _read_meta(self, key: str):
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key: str, meta: dict):
+        temporary = f"{self._meta_path(key)}.{uuid.uuid4().hex}"
+        with open(temporary, "w") as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._meta_path(key))
+
+    def restore(self, project_type: str, dependencies: list, project_dir: str):
+        """
+        Materialize the snapshot for this project type and dependency set into project_dir.
+        Returns the number of files linked or copied, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+
+        key = scaffold_key(project_type, dependencies)
+        meta = self._read_meta(key)
+        source = self._snapshot_dir(key)
+        if meta is None or not os.path.isdir(source):
+            self.misses += 1
+            return None
+
+        os.makedirs(project_dir, exist_ok=True)
+        files = 0
+        for entry in SNAPSHOT_ENTRIES:
+            path = os.path.join(source, entry)
+            if not os.path.lexists(path):
+                continue
+            if entry == "node_modules":
+                files += self._materialize_tree(path, os.path.join(project_dir, entry))
+            else:
+                # Top-level files are real copies: npm and editors change them in place
+                shutil.copy2(path, os.path.join(project_dir, entry))
+                files += 1
+        self._rename_package(project_dir)
+
+        meta["last_used"] = time.time()
+        self._write_meta(key, meta)
+        self.hits += 1
+        return files
+
+    def save(self, project_type: str, dependencies: list, project_dir: str) -> bool:
+        """
+        Snapshot the npm files of a freshly created project for later projects of the
+        same type and dependency set. The snapshot is written to a temporary directory
+        and renamed into place, so concurrent saves of the same key are harmless.
+        """
+        if not self.enabled or not os.path.exists(os.path.join(project_dir, "package.json")):
+            return False
+
+        key = scaffold_key(project_type, dependencies)
+        os.makedirs(self.root, exist_ok=True)
+        target = self._snapshot_dir(key)
+        if os.path.isdir(target) and self._read_meta(key) is not None:
+            return True
+
+        temporary = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(temporary)
+            for entry in SNAPSHOT_ENTRIES:
+                path = os.path.join(project_dir, entry)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.copytree(path, os.path.join(temporary, entry), symlinks=True, copy_function=self._copy)
+                elif os.path.isfile(path):
+                    shutil.copy2(path, os.path.join(temporary, entry))
+
+            size = _tree_size(temporary)
+            try:
+                os.rename(temporary, target)
+            except OSError:
+                # Another process saved the same key first
+                return True
+            now = time.time()
+            self._write_meta(key, {"size": size, "created": now, "last_used": now, "project_type": (project_type or "").lower(),
+                                   "dependencies": normalize_dependencies(dependencies)})
+        finally:
+            if os.path.exists(temporary):
+                shutil.rmtree(temporary, ignore_errors=True)
+
+        self._evict(keep=key)
+        return True
+
+    def _copy(self, source: str, destination: str):
+        # Snapshots are real copies (or clones) so later edits to the project cannot change them
+        if not self._clone(source, destination):
+            shutil.copy2(source, destination)
+
+    def _clone(self, source: str, destination: str) -> bool:
+        if not self._can_clone:
+            return False
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copystat(source, destination)
+            return True
+        except OSError:
+            # Not supported by this filesystem; do not try again
+            self._can_clone = False
+            try:
+                os.unlink(destination)
+            except OSError:
+                pass
+            return False
+
+    def _materialize_tree(self, source: str, destination: str) -> int:
+        files = 0
+        for directory, dirnames, filenames in os.walk(source):
+            relative = os.path.relpath(directory, source)
+            target_dir = os.path.normpath(os.path.join(destination, relative))
+            os.makedirs(target_dir, exist_ok=True)
+
+            for name in dirnames + filenames:
+                path = os.path.join(directory, name)
+                target = os.path.join(target_dir, name)
+                if os.path.islink(path):
+                    # node_modules/.bin holds relative symlinks; recreate them as they are
+                    if not os.path.lexists(target):
+                        os.symlink(os.readlink(path), target)
+                    files += 1
+                elif name in filenames and not os.path.lexists(target):
+                    self._link(path, target)
+                    files += 1
+        return files
+
+    def _link(self, source: str, destination: str):
+        if self._clone(source, destination):
+            return
+        try:
+            os.link(source, destination)
+        except OSError:
+            # Different filesystem: fall back to a plain copy
+            shutil.copy2(source, destination)
+
+    def _rename_package(self, project_dir: str):
+        """
+        Give the restored package.json and lockfile the name npm init would have chosen.
+        """
+        name = package_name(project_dir)
+        for filename in ("package.json", "package-lock.json"):
+            path = os.path.join(project_dir, filename)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if "name" in data:
+                data["name"] = name
+            if isinstance(data.get("packages", {}).get(""), dict) and "name" in data["packages"][""]:
+                data["packages"][""]["name"] = name
+            with open(path, "w") as f:
+                f.write(json.dumps(data, indent=2) + "\n")
+
+    def _entries(self) -> list:
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for filename in os.listdir(self.root):
+            if filename.endswith(".json"):
+                key = filename[:-len(".json")]
+                meta = self._read_meta(key)
+                if meta is not None:
+                    entries.append((key, meta))
+        return entries
+
+    def _evict(self, keep: str = None):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1].get("last_used", 0))
+            total = sum(meta.get("size", 0) for _, meta in entries)
+            for key, meta in entries:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                self.remove(key)
+                total -= meta.get("size", 0)
+
+    def remove(self, key: str):
+        """
+        Drop one snapshot.
+        """
+        try:
+            os.unlink(self._meta_path(key))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(self._snapshot_dir(key), ignore_errors=True)
+
+    def clear(self, project_type: str = None):
+        """
+        Invalidate every snapshot, or only those of one project type.
+        """
+        if not self.enabled:
+            return
+        for key, meta in self._entries():
+            if project_type is None or meta.get("project_type") == project_type.lower():
+                self.remove(key)
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and the snapshots currently stored.
+        """
+        entries = self._entries() if self.enabled else []
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(meta.get("size", 0) for _, meta in entries),
+            "snapshots": [
+                {"project_type": meta.get("project_type"), "dependencies": meta.get("dependencies"), "size": meta.get("size")}
+                for _, meta in entries
+            ],
+        }
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(directory, filename)).st_size
+            except OSError:
+                pass
+    return total
@@ -0,0 +1,215 @@
+import json
+import random
+import threading
+import time
+
+RETRYABLE_ERRORS = ("APITimeoutError", "APIConnectionError", "InternalServerError", "RateLimitError")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request cannot complete within its deadline."""
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most capacity tokens.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float, deadline: float = None):
+        """
+        Take amount tokens, waiting for the bucket to refill if needed.
+        Requests larger than the capacity are let through once the bucket is full.
+        """
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise DeadlineExceeded("Rate limit wait would exceed the request deadline")
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, amount: float):
+        """
+        Correct an earlier estimate: positive amounts take more tokens, negative ones return them.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after(error):
+    """
+    Return the delay in seconds requested by a Retry-After (or retry-after-ms) header, if any.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_retryable(error) -> bool:
+    """
+    Rate limits, server errors, timeouts and connection failures are worth retrying.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def estimate_tokens(request: dict) -> int:
+    """
+    Rough token estimate for a chat request: prompt characters / 4 plus the expected completion.
+    """
+    prompt = json.dumps(request.get("messages", []), ensure_ascii=False)
+    return len(prompt) // 4 + (request.get("max_tokens") or 500)
+
+
+class HeldStream:
+    """
+    A streamed response that keeps its request slot until the stream has been read to
+    the end or closed: the request is still running on the server while the body arrives.
+    """
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self._release = release
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            yield from self.stream
+        finally:
+            self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def close(self):
+        with self._lock:
+            release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            if hasattr(self.stream, "close"):
+                self.stream.close()
+        finally:
+            release()
+
+    def __del__(self):
+        # A stream dropped without being read must not keep its slot forever
+        self.close()
+
+
+class RequestScheduler:
+    """
+    Shared request layer for LLM calls: request and token per-minute limits, a bound
+    on concurrent requests, and retries with exponential backoff and jitter that honour
+    Retry-After. Every call has a deadline that covers queueing, retries and the request itself.
+    A streamed request holds its slot until its response has been read (see HeldStream).
+    """
+
+    def __init__(self, create, requests_per_minute: int = 500, tokens_per_minute: int = 30000,
+                 max_concurrency: int = 8, max_retries: int = 5, base_delay: float = 0.5,
+                 max_delay: float = 30.0, deadline: float = 120.0):
+        self.create = create
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retries = 0
+
+    def backoff(self, attempt: int, error=None) -> float:
+        """
+        Delay before the next attempt: Retry-After when the server gives one, otherwise
+        exponential backoff with full jitter.
+        """
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(requested, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, deadline: float = None, span=None, **request):
+        """
+        Send a request through the limits, retrying transient failures until it
+        succeeds, runs out of attempts or passes its deadline (seconds from now).
+        If a trace span is given, the time spent queued and the retry count are set on it.
+        """
+        expires = time.monotonic() + (deadline or self.deadline)
+        estimate = estimate_tokens(request)
+        attempt = 0
+        queued = 0.0
+        while True:
+            waiting = time.monotonic()
+            self.requests.acquire(1, expires)
+            self.tokens.acquire(estimate, expires)
+
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Request deadline exceeded")
+            if not self.slots.acquire(timeout=remaining):
+                raise DeadlineExceeded("Timed out waiting for a free request slot")
+            queued += time.monotonic() - waiting
+            if span is not None:
+                span.set(queue_ms=round(queued * 1000, 2), retries=attempt)
+            error = None
+            held = False
+            try:
+                response = self.create(timeout=expires - time.monotonic(), **request)
+                if request.get("stream"):
+                    response = HeldStream(response, self.slots.release)
+                    held = True
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            finally:
+                if not held:
+                    self.slots.release()
+
+            if error is not None:
+                delay = self.backoff(attempt, error)
+                if time.monotonic() + delay >= expires:
+                    raise error
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+                continue
+
+            usage = getattr(response, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                self.tokens.adjust(usage.total_tokens - estimate)
+            return response
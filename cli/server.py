@@ -0,0 +1,442 @@
+"""
+Asyncio HTTP and WebSocket server for running CodeSH behind an internal endpoint.
+
+    POST   /sessions                  {"cwd": "..."} -> {"session": id, "cwd": ...}
+    GET    /sessions                  list open sessions
+    DELETE /sessions/<id>             close a session
+    POST   /sessions/<id>/query       {"query": "..."} -> newline-delimited JSON events
+    GET    /sessions/<id>/ws          WebSocket: send {"query": "..."}, receive JSON events
+    GET    /health
+
+Every session has its own conversation history and shell (so its own working
+directory); all sessions share one OpenAI client and request scheduler. Events are
+streamed as they happen: "output" (printed text, including streamed plans and answers),
+"plan", "action", "observation", "answer", "error", and a final "done".
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import main as agent
+from output import redirect_output
+from scheduler import DeadlineExceeded, TokenBucket
+from shell import ShellSession
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 429: "Too Many Requests",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """Raised by request handlers to answer with an error status."""
+
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Session:
+    """
+    One client's state: conversation history, shell and limits.
+    """
+
+    def __init__(self, cwd: str, queries_per_minute: int):
+        self.id = uuid.uuid4().hex
+        self.shell = ShellSession(cwd=cwd)
+        self.history = agent.new_conversation()
+        self.rate = TokenBucket(queries_per_minute)
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        self.busy = False
+        self.queries = 0
+
+    def describe(self) -> dict:
+        return {
+            "session": self.id,
+            "cwd": self.shell.cwd,
+            "busy": self.busy,
+            "queries": self.queries,
+            "idle_seconds": round(time.monotonic() - self.last_active, 1),
+        }
+
+    def close(self):
+        self.shell.close()
+
+
+class EventWriter:
+    """
+    File-like writer for a query running in a worker thread: printed text and emitted
+    events are handed to the event loop's queue for the connection to stream.
+    """
+
+    def __init__(self, loop, events: asyncio.Queue):
+        self.loop = loop
+        self.events = events
+
+    def event(self, event: dict):
+        self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+    def write(self, text):
+        if text:
+            self.event({"type": "output", "text": text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class SessionManager:
+    """
+    Creates, looks up and evicts sessions, and runs their queries on a shared pool of
+    worker threads, one query at a time per session.
+    """
+
+    def __init__(self, max_sessions: int = 64, idle_timeout: float = 900, queries_per_minute: int = 30,
+                 max_query_bytes: int = 32768, workers: int = 32):
+        self.sessions = {}
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.queries_per_minute = queries_per_minute
+        self.max_query_bytes = max_query_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def create(self, cwd: str = None) -> Session:
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle(force=True)
+        if len(self.sessions) >= self.max_sessions:
+            raise HTTPError(503, "Too many open sessions")
+
+        cwd = os.path.abspath(os.path.expanduser(cwd or os.getcwd()))
+        if not os.path.isdir(cwd):
+            raise HTTPError(400, f"Directory not found: {cwd}")
+        session = Session(cwd, self.queries_per_minute)
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, f"Unknown session: {session_id}")
+        return session
+
+    def close(self, session_id: str):
+        session = self.get(session_id)
+        if session.busy:
+            raise HTTPError(409, "Session is running a query")
+        del self.sessions[session_id]
+        session.close()
+
+    def evict_idle(self, force: bool = False):
+        """
+        Close sessions idle for longer than the idle timeout. With force, the single
+        longest idle session goes too, to make room for a new one.
+        """
+        now = time.monotonic()
+        idle = sorted((session for session in self.sessions.values() if not session.busy),
+                      key=lambda session: session.last_active)
+        for session in idle:
+            if now - session.last_active > self.idle_timeout or force:
+                del self.sessions[session.id]
+                session.close()
+                force = False
+
+    async def evict_forever(self):
+        while True:
+            await asyncio.sleep(min(30, self.idle_timeout / 2))
+            self.evict_idle()
+
+    def _answer(self, session: Session, query: str, writer: EventWriter) -> int:
+        # Runs in a worker thread; output and the shell are routed through context variables
+        with redirect_output(writer), agent.session_shell(session.shell), agent.tracer.span("session", session.id):
+            try:
+                agent.answer_query(query, session.history)
+                return 0
+            except Exception as e:
+                writer.event({"type": "error", "message": str(e)})
+                return 1
+
+    async def run_query(self, session: Session, query, send):
+        """
+        Run a query in the session and pass each event to the send coroutine, ending
+        with a "done" event. If the client goes away the query still runs to completion.
+        """
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "Missing query")
+        if len(query.encode("utf-8")) > self.max_query_bytes:
+            raise HTTPError(413, "Query too long")
+        if session.busy:
+            raise HTTPError(409, "Session is already running a query")
+        try:
+            session.rate.acquire(1, deadline=time.monotonic())
+        except DeadlineExceeded:
+            raise HTTPError(429, "Query rate limit exceeded", {"Retry-After": str(max(1, round(60 / self.queries_per_minute)))})
+
+        session.busy = True
+        session.queries += 1
+        session.last_active = time.monotonic()
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        future = loop.run_in_executor(self.executor, self._answer, session, query, EventWriter(loop, events))
+        future.add_done_callback(lambda _: events.put_nowait(None))
+
+        connected = True
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                if connected:
+                    try:
+                        await send(event)
+                    except (ConnectionError, OSError):
+                        connected = False
+            status = await future
+            if connected:
+                await send({"type": "done", "status": status})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            session.busy = False
+            session.last_active = time.monotonic()
+
+
+async def read_request(reader, max_body: int):
+    """
+    Read one HTTP request. Returns (method, path, headers, body), or None at end of stream.
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise HTTPError(400, "Too many headers")
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), urlsplit(target).path.rstrip("/") or "/", headers, body
+
+
+async def send_response(writer, status: int, payload, headers: dict = None):
+    body = json.dumps(payload).encode("utf-8") + b"\n"
+    head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", "Content-Type: application/json",
+            f"Content-Length: {len(body)}", "Connection: close"]
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    if not payload:
+        return payload
+    key = (mask * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(len(payload), "big")
+
+
+async def ws_send(writer, payload: bytes, opcode: int = 0x1):
+    """
+    Send one unfragmented WebSocket frame (text by default).
+    """
+    length = len(payload)
+    if length < 126:
+        head = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    writer.write(head + payload)
+    await writer.drain()
+
+
+async def ws_receive(reader, writer, max_size: int):
+    """
+    Read the next WebSocket data message, answering pings on the way.
+    Returns the message payload, or None once the client closes the connection.
+    """
+    message = b""
+    while True:
+        first, second = await reader.readexactly(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        if len(message) + length > max_size:
+            await ws_send(writer, struct.pack("!H", 1009), opcode=0x8)
+            return None
+        mask = await reader.readexactly(4) if second & 0x80 else b""
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = _unmask(payload, mask)
+
+        if opcode == 0x8:
+            await ws_send(writer, payload[:2], opcode=0x8)
+            return None
+        if opcode == 0x9:
+            await ws_send(writer, payload, opcode=0xA)
+            continue
+        if opcode == 0xA:
+            continue
+        message += payload
+        if first & 0x80:
+            return message
+
+
+class Server:
+    """
+    Routes HTTP and WebSocket requests to the session manager.
+    """
+
+    def __init__(self, manager: SessionManager, token: str = None):
+        self.manager = manager
+        self.token = token
+
+    async def handle(self, reader, writer):
+        try:
+            request = await read_request(reader, self.manager.max_query_bytes + 4096)
+            if request is not None:
+                await self.route(reader, writer, *request)
+        except HTTPError as e:
+            try:
+                await send_response(writer, e.status, {"error": str(e)}, e.headers)
+            except (ConnectionError, OSError):
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, reader, writer, method, path, headers, body):
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            raise HTTPError(401, "Missing or invalid token")
+
+        parts = path.strip("/").split("/")
+        if path == "/health" and method == "GET":
+            await send_response(writer, 200, {"status": "ok", "sessions": len(self.manager.sessions)})
+        elif path == "/sessions" and method == "GET":
+            await send_response(writer, 200, {"sessions": [s.describe() for s in self.manager.sessions.values()]})
+        elif path == "/sessions" and method == "POST":
+            session = self.manager.create(_json_body(body).get("cwd"))
+            await send_response(writer, 201, session.describe())
+        elif len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+            self.manager.close(parts[1])
+            await send_response(writer, 200, {"closed": parts[1]})
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "query" and method == "POST":
+            await self.stream_query(writer, self.manager.get(parts[1]), _json_body(body).get("query"))
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "ws" and method == "GET":
+            await self.websocket(reader, writer, self.manager.get(parts[1]), headers)
+        elif parts[0] in ("health", "sessions"):
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        else:
+            raise HTTPError(404, f"Not found: {path}")
+
+    async def stream_query(self, writer, session: Session, query):
+        started = False
+
+        async def send(event):
+            nonlocal started
+            if not started:
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                             b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+                started = True
+            data = json.dumps(event).encode("utf-8") + b"\n"
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+
+        await self.manager.run_query(session, query, send)
+        if started:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+    async def websocket(self, reader, writer, session: Session, headers: dict):
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            raise HTTPError(400, "Expected a WebSocket upgrade")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        async def send(event):
+            await ws_send(writer, json.dumps(event).encode("utf-8"))
+
+        while True:
+            message = await ws_receive(reader, writer, self.manager.max_query_bytes + 4096)
+            if message is None:
+                return
+            try:
+                await self.manager.run_query(session, _json_body(message).get("query"), send)
+            except HTTPError as e:
+                await send({"type": "error", "status": e.status, "message": str(e)})
+
+
+def _json_body(body: bytes) -> dict:
+    if not body:
+        return {}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "Body must be JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Body must be a JSON object")
+    return data
+
+
+async def serve(host: str, port: int, manager: SessionManager, token: str = None):
+    server = await asyncio.start_server(Server(manager, token).handle, host, port)
+    eviction = asyncio.ensure_future(manager.evict_forever())
+    print(f"CodeSH server listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        eviction.cancel()
+        for session in list(manager.sessions.values()):
+            session.close()
+
+
+def run(host: str = None, port: int = None):
+    """
+    Start the API server with limits from the environment.
+    """
+    manager = SessionManager(
+        max_sessions=int(os.getenv("CODESH_SERVER_MAX_SESSIONS", "64")),
+        idle_timeout=float(os.getenv("CODESH_SERVER_IDLE_TIMEOUT", "900")),
+        queries_per_minute=int(os.getenv("CODESH_SERVER_SESSION_QPM", "30")),
+        max_query_bytes=int(os.getenv("CODESH_SERVER_MAX_QUERY_BYTES", "32768")),
+        workers=int(os.getenv("CODESH_SERVER_WORKERS", "32"))
+    )
+    host = host or os.getenv("CODESH_SERVER_HOST", "127.0.0.1")
+    port = port or int(os.getenv("CODESH_SERVER_PORT", "8765"))
+    try:
+        asyncio.run(serve(host, port, manager, os.getenv("CODESH_SERVER_TOKEN")))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,189 @@
+import os
+import queue
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+ShellResult = namedtuple("ShellResult", ["exit_code", "stdout", "stderr", "timed_out"])
+
+TIMEOUT_EXIT_CODE = 124
+
+
+class ShellSession:
+    """
+    A long-lived shell that runs commands one after another, so start-up cost is paid
+    once and state such as the working directory and exported variables carries over.
+
+    Each command is sent as a NUL-terminated string and run with eval; the worker then
+    prints a sentinel line on stdout (with the exit code and working directory) and on
+    stderr, which marks the end of the command's output on both streams. A worker that
+    dies or times out is killed and restarted on the next command.
+    """
+
+    def __init__(self, cwd: str = None, env: dict = None):
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        self.env = env
+        self.starts = 0
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+        self._marker = f"__CODESH_{uuid.uuid4().hex}__"
+
+    @property
+    def busy(self) -> bool:
+        """Whether a command is currently running in the session."""
+        return self._lock.locked()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self):
+        bash = shutil.which("bash")
+        if bash is None:
+            raise RuntimeError("A persistent shell session requires bash")
+
+        self._process = subprocess.Popen(
+            [bash, "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            env=self.env,
+            start_new_session=True
+        )
+        self.starts += 1
+        # Both streams feed one queue, so their lines are handled in the order they arrive
+        self._lines = queue.Queue()
+        for stream, name in ((self._process.stdout, "stdout"), (self._process.stderr, "stderr")):
+            threading.Thread(target=self._pump, args=(stream, name, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _pump(stream, name, lines):
+        for line in iter(stream.readline, b""):
+            lines.put((name, line.decode("utf-8", errors="replace")))
+        lines.put((name, None))
+
+    def _kill(self):
+        """
+        Kill the worker and its children, returning the worker's exit code.
+        """
+        if self._process is None:
+            return None
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        return_code = self._process.wait()
+        self._process = None
+        return return_code
+
+    def close(self):
+        """
+        Stop the worker shell.
+        """
+        with self._lock:
+            self._kill()
+
+    def run(self, command: str, timeout: float = None, cwd: str = None, on_output=None,
+            on_error=None) -> ShellResult:
+        """
+        Run a command in the session and return its exit code and separated stdout/stderr.
+        If cwd is given the command runs there and the session's directory is left unchanged.
+        on_output and on_error, if given, are called with each stdout/stderr line as it
+        arrives; that stream is then not kept in memory and is returned empty.
+        """
+        with self._lock:
+            if not self.alive:
+                self._kill()
+                self._start()
+
+            marker = self._marker
+            if cwd:
+                run = f'__codesh_prev=$PWD; cd -- {shlex.quote(cwd)} && eval "$__codesh_cmd" </dev/null; __codesh_rc=$?; cd -- "$__codesh_prev"'
+            else:
+                run = 'eval "$__codesh_cmd" </dev/null; __codesh_rc=$?'
+            # The control script is a single line, so bash has parsed all of it before
+            # read consumes the command text that follows
+            script = (
+                f"IFS= read -r -d '' __codesh_cmd; {run}; "
+                f"printf '\\n%s %d %s\\n' '{marker}' \"$__codesh_rc\" \"$PWD\"; "
+                f"printf '\\n%s\\n' '{marker}' >&2\n"
+            )
+            try:
+                self._process.stdin.write(script.encode("utf-8") + command.encode("utf-8") + b"\0")
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self._kill()
+                return ShellResult(-1, "", "Shell session exited unexpectedly", False)
+
+            stdout, stderr, exit_code, timed_out = self._collect(marker, timeout, on_output, on_error)
+
+            if exit_code is None:
+                # The worker died or hung; replace it before the next command
+                return_code = self._kill()
+                if timed_out:
+                    return ShellResult(TIMEOUT_EXIT_CODE, stdout, f"Command timed out after {timeout} seconds", True)
+                return ShellResult(return_code if return_code is not None else -1, stdout, "Shell session exited", False)
+
+            return ShellResult(exit_code, stdout, stderr, False)
+
+    def _collect(self, marker, timeout, on_output, on_error):
+        """
+        Read stdout and stderr lines as they arrive, up to each stream's sentinel.
+        Returns (stdout, stderr, exit_code, timed_out); exit_code is None if the stdout
+        sentinel never arrived. stderr gets 5 more seconds after the stdout sentinel.
+        """
+        callbacks = {"stdout": on_output, "stderr": on_error}
+        collected = {"stdout": [], "stderr": []}
+        held = {"stdout": None, "stderr": None}
+        pending = {"stdout", "stderr"}
+        exit_code = None
+        timed_out = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while pending:
+            try:
+                name, line = self._lines.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                timed_out = exit_code is None
+                break
+            if line is None:
+                # The worker exited
+                break
+            if line.startswith(marker):
+                pending.discard(name)
+                if name == "stdout":
+                    fields = line.split(" ", 2)
+                    exit_code = int(fields[1]) if len(fields) > 1 else 0
+                    if len(fields) > 2:
+                        self.cwd = fields[2].rstrip("\n")
+                    deadline = time.monotonic() + 5
+                continue
+            callback = callbacks[name]
+            if callback is None:
+                collected[name].append(line)
+            else:
+                # Hold back a bare newline, which may be the one printed before the sentinel
+                if held[name] is not None:
+                    callback(held[name])
+                    held[name] = None
+                if line == "\n":
+                    held[name] = line
+                else:
+                    callback(line)
+
+        texts = []
+        for name in ("stdout", "stderr"):
+            if held[name] is not None and name in pending:
+                callbacks[name](held[name])
+            text = "".join(collected[name])
+            # The sentinel is preceded by a newline of its own
+            if name not in pending and text.endswith("\n"):
+                text = text[:-1]
+            texts.append(text)
+        return texts[0], texts[1], exit_code, timed_out
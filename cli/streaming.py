@@ -0,0 +1,287 @@
+import json
+import re
+
+_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+
+class StepStreamParser:
+    """
+    Incrementally parse a single JSON step object from streamed text deltas.
+
+    feed() returns a list of events as soon as they can be decided:
+      ("text", key, chunk)   - decoded characters of a top-level string value
+      ("field", key, value)  - a top-level value has been completely received
+    Nested values (like the "input" object of an action) are reported only
+    once they are complete.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._raw = []
+        self._state = "start"
+        self._key = []
+        self._key_escape = False
+        self._current_key = None
+        self._value = []
+        self._escape = None
+        self._pending_surrogate = None
+        self._depth = 0
+        self._in_string = False
+        self._string_escape = False
+
+    @property
+    def text(self):
+        """The raw text received so far."""
+        return "".join(self._raw)
+
+    def feed(self, chunk: str):
+        """
+        Consume a text delta and return the events it completes.
+        """
+        self._raw.append(chunk)
+        events = []
+        for char in chunk:
+            if self.done:
+                break
+            self._step(char, events)
+        return events
+
+    def _step(self, char, events):
+        state = self._state
+
+        if state == "start":
+            if char == "{":
+                self._state = "key_or_end"
+            return
+
+        if state == "key_or_end":
+            if char == '"':
+                self._key = []
+                self._key_escape = False
+                self._state = "key"
+            elif char == "}":
+                self.done = True
+            return
+
+        if state == "key":
+            if self._key_escape:
+                self._key.append(char)
+                self._key_escape = False
+            elif char == "\\":
+                self._key.append(char)
+                self._key_escape = True
+            elif char == '"':
+                self._current_key = json.loads('"' + "".join(self._key) + '"')
+                self._state = "colon"
+            else:
+                self._key.append(char)
+            return
+
+        if state == "colon":
+            if char == ":":
+                self._state = "value"
+            return
+
+        if state == "value":
+            if char.isspace():
+                return
+            self._value = []
+            if char == '"':
+                self._escape = None
+                self._pending_surrogate = None
+                self._state = "string"
+            else:
+                self._depth = 1 if char in "{[" else 0
+                self._in_string = False
+                self._string_escape = False
+                self._value.append(char)
+                self._state = "raw"
+            return
+
+        if state == "string":
+            self._step_string(char, events)
+            return
+
+        if state == "raw":
+            self._step_raw(char, events)
+            return
+
+        if state == "after_value":
+            if char == ",":
+                self._state = "key_or_end"
+            elif char == "}":
+                self.done = True
+
+    def _step_string(self, char, events):
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] == "u":
+                if len(self._escape) < 5:
+                    return
+                decoded = chr(int(self._escape[1:], 16))
+            else:
+                decoded = _ESCAPES.get(self._escape, self._escape)
+            self._escape = None
+            self._emit_text(decoded, events)
+            return
+
+        if char == "\\":
+            self._escape = ""
+        elif char == '"':
+            if self._pending_surrogate:
+                self._emit_text("", events)
+            self._finish_value("".join(self._value), events)
+        else:
+            self._emit_text(char, events)
+
+    def _emit_text(self, decoded, events):
+        if self._pending_surrogate:
+            high, self._pending_surrogate = self._pending_surrogate, None
+            if decoded and "\udc00" <= decoded <= "\udfff":
+                pair = (ord(high) - 0xD800) * 0x400 + (ord(decoded) - 0xDC00) + 0x10000
+                decoded = chr(pair)
+            else:
+                decoded = high + decoded
+        elif decoded and "\ud800" <= decoded <= "\udbff":
+            self._pending_surrogate = decoded
+            return
+        if decoded:
+            self._value.append(decoded)
+            events.append(("text", self._current_key, decoded))
+
+    def _step_raw(self, char, events):
+        if self._in_string:
+            self._value.append(char)
+            if self._string_escape:
+                self._string_escape = False
+            elif char == "\\":
+                self._string_escape = True
+            elif char == '"':
+                self._in_string = False
+            return
+
+        if self._depth == 0 and (char in ",}" or char.isspace()):
+            # End of a number or literal
+            self._finish_value(json.loads("".join(self._value)), events)
+            if char == "}":
+                self.done = True
+            elif char == ",":
+                self._state = "key_or_end"
+            return
+
+        self._value.append(char)
+        if char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._finish_value(json.loads("".join(self._value)), events)
+
+    def _finish_value(self, value, events):
+        self.fields[self._current_key] = value
+        events.append(("field", self._current_key, value))
+        self._state = "after_value"
+
+
+class ManifestStreamParser:
+    """
+    Incrementally parse a project manifest streamed as JSON Lines, one entry per line
+    ({"type": "project" | "dir" | "file" | "command", ...}).
+
+    feed() returns the entries completed by a text delta, and close() the last one if
+    the stream did not end with a newline. A line that is not a JSON object with a
+    type is returned as {"type": "invalid", "line": ...}; markdown fences are skipped.
+    """
+
+    def __init__(self):
+        self._pending = []
+
+    def feed(self, chunk: str) -> list:
+        entries = []
+        while "\n" in chunk:
+            head, chunk = chunk.split("\n", 1)
+            self._pending.append(head)
+            entry = self._parse("".join(self._pending))
+            self._pending = []
+            if entry is not None:
+                entries.append(entry)
+        if chunk:
+            self._pending.append(chunk)
+        return entries
+
+    def close(self) -> list:
+        entry = self._parse("".join(self._pending))
+        self._pending = []
+        return [entry] if entry is not None else []
+
+    @staticmethod
+    def _parse(line: str):
+        line = line.strip()
+        if not line or line.startswith("```"):
+            return None
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return {"type": "invalid", "line": line}
+        if not isinstance(entry, dict) or not isinstance(entry.get("type"), str):
+            return {"type": "invalid", "line": line}
+        return entry
+
+
+class FenceStripper:
+    """
+    Remove a markdown code fence wrapped around streamed text without waiting for the
+    whole text: an opening fence line is dropped as soon as it is complete, and a
+    closing fence line is held back until the stream shows nothing but blank lines
+    follow it. feed() returns the text that is safe to write now, close() the rest.
+    """
+
+    _CLOSING = re.compile(r"(?:^|\n)[ \t]*```[ \t]*\n(?:[ \t]*\n)*$")
+
+    def __init__(self):
+        self._held = ""
+        self._started = False
+        self._fenced = False
+
+    def feed(self, chunk: str) -> str:
+        self._held += chunk
+        if not self._started:
+            head = self._held.lstrip()
+            if "\n" not in head:
+                return ""
+            first, rest = head.split("\n", 1)
+            self._started = True
+            self._fenced = first.strip().startswith("```")
+            self._held = rest if self._fenced else head
+        return self._release()
+
+    def _release(self) -> str:
+        cut = self._held.rfind("\n") + 1
+        if self._fenced:
+            closing = self._CLOSING.search(self._held[:cut])
+            if closing:
+                cut = closing.start() + (1 if self._held[closing.start()] == "\n" else 0)
+        released, self._held = self._held[:cut], self._held[cut:]
+        return released
+
+    def close(self) -> str:
+        rest, self._held = self._held, ""
+        if not self._started:
+            rest = rest.lstrip()
+            if rest.startswith("```"):
+                return ""
+        elif self._fenced:
+            rest = re.sub(r"(?:^|\n)[ \t]*```[ \t]*\s*$", "", rest)
+        return rest
@@ -0,0 +1,312 @@
+import ast
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# A test function, or a test class with all its methods, and the lines it spans (1-based)
+TestUnit = namedtuple("TestUnit", ["name", "tests", "start", "end", "text"])
+
+TEST_MODULE = "test_generated.py"
+
+# Written next to the tests: stops any single test after CODESH_TEST_TIMEOUT seconds
+# (where SIGALRM exists), so one hanging test fails alone instead of stalling its shard
+TIMEOUT_PLUGIN = '''import os
+import signal
+
+import pytest
+
+TIMEOUT = float(os.environ.get("CODESH_TEST_TIMEOUT", "0"))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    if TIMEOUT <= 0 or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise TimeoutError(f"Test took longer than {TIMEOUT:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, TIMEOUT)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+'''
+
+
+def _is_test_class(node: ast.ClassDef) -> bool:
+    if node.name.startswith("Test"):
+        return True
+    # unittest.TestCase subclasses are collected whatever their name
+    return any((base.attr if isinstance(base, ast.Attribute) else getattr(base, "id", "")).endswith("TestCase")
+               for base in node.bases)
+
+
+def test_units(test_source: str) -> list:
+    """
+    The tests of a pytest module, grouped the way they can be regenerated: each top-level
+    test function, and each test class with its test methods. Raises SyntaxError.
+    """
+    lines = test_source.splitlines(keepends=True)
+    units = []
+    for node in ast.parse(test_source).body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            tests = [node.name]
+        elif isinstance(node, ast.ClassDef) and _is_test_class(node):
+            tests = [f"{node.name}::{item.name}" for item in node.body
+                     if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name.startswith("test")]
+        else:
+            continue
+        if tests:
+            units.append(TestUnit(node.name, tests, start, node.end_lineno, "".join(lines[start - 1:node.end_lineno])))
+    return units
+
+
+def referenced_names(code: str) -> set:
+    """
+    Names and attributes used in some code, to find the definitions failing tests need.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.Attribute):
+            names.add(node.attr)
+    return names
+
+
+def can_run(source: str, test_framework: str) -> bool:
+    """
+    Whether generated tests for source can be run here: Python code with pytest or unittest.
+    """
+    if (test_framework or "pytest").lower() not in ("pytest", "unittest"):
+        return False
+    try:
+        ast.parse(source)
+    except (SyntaxError, ValueError):
+        return False
+    return True
+
+
+def _bound_names(node) -> set:
+    if isinstance(node, ast.Import):
+        return {alias.asname or alias.name.split(".")[0] for alias in node.names}
+    return {f"{node.module}.*" if alias.name == "*" else alias.asname or alias.name for alias in node.names}
+
+
+def replace_tests(test_source: str, replacement: str) -> str:
+    """
+    Put regenerated tests into a test module: top-level functions and classes replace
+    those with the same name, new ones are appended, and imports the module does not
+    have yet are added after its own. Raises SyntaxError for a replacement that does not parse.
+    """
+    lines = test_source.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    tree = ast.parse(test_source)
+    new_lines = replacement.splitlines(keepends=True)
+    if new_lines and not new_lines[-1].endswith("\n"):
+        new_lines[-1] += "\n"
+
+    spans = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            spans[node.name] = (start, node.end_lineno)
+    bound = set()
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            bound.update(_bound_names(node))
+
+    replaced, appended, imports = {}, [], []
+    for node in ast.parse(replacement).body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+        text = "".join(new_lines[start - 1:node.end_lineno])
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            # An import of names the module already has would change it for nothing
+            if not _bound_names(node) <= bound:
+                imports.append(text)
+                bound.update(_bound_names(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name in spans:
+                replaced[node.name] = text
+            else:
+                appended.append(text)
+
+    # Replace from the bottom up so earlier line numbers stay valid
+    for name, (start, end) in sorted(spans.items(), key=lambda item: item[1][0], reverse=True):
+        if name in replaced:
+            lines[start - 1:end] = [replaced[name]]
+    if imports:
+        last_import = max((node.end_lineno for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))), default=0)
+        lines[last_import:last_import] = imports
+    result = "".join(lines).rstrip("\n") + "\n"
+    for text in appended:
+        result += "\n\n" + text.rstrip("\n") + "\n"
+    return result
+
+
+def trim_traceback(text: str, max_lines: int = 20, max_chars: int = 1500) -> str:
+    """
+    The end of a failure report, where the assertion and the error are.
+    """
+    lines = (text or "").strip().splitlines()
+    trimmed = "\n".join(lines[-max_lines:])
+    if len(lines) > max_lines:
+        trimmed = f"... ({len(lines) - max_lines} lines cut)\n" + trimmed
+    return trimmed[-max_chars:]
+
+
+class TestRunner:
+    """
+    Runs generated pytest modules in a scratch directory. The tests still to run are
+    split into shards, one pytest process each, up to workers at a time, and every test
+    is stopped after timeout seconds. Each test's outcome is cached under a hash of the
+    code under test and the test's own code (plus the module's imports and helpers), so
+    a later round only runs the tests that changed.
+    """
+
+    def __init__(self, workers: int = 4, timeout: float = 10.0, cache=None):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.cache = cache
+
+    def _key(self, source: str, module: str, prelude: str, unit: TestUnit) -> str:
+        payload = json.dumps([source, module, prelude, unit.text, self.timeout], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def run(self, source: str, module: str, test_source: str, paths=()) -> dict:
+        """
+        Run test_source against source, importable as module. paths are added to the
+        import path after the scratch directory (for the code's own imports). Returns
+        {"passed": [...], "failed": {test: traceback}, "cached": n, "ran": n, "seconds": s}.
+        """
+        started = time.perf_counter()
+        # Trailing blank lines are not worth a cache miss
+        test_source = test_source.rstrip() + "\n"
+        try:
+            units = test_units(test_source)
+        except SyntaxError as e:
+            return {"passed": [], "failed": {"<module>": f"SyntaxError: {e}"}, "cached": 0, "ran": 0,
+                    "seconds": round(time.perf_counter() - started, 2)}
+
+        lines = test_source.splitlines(keepends=True)
+        covered = {line for unit in units for line in range(unit.start, unit.end + 1)}
+        prelude = "".join(line for number, line in enumerate(lines, 1) if number not in covered)
+
+        outcomes, pending = {}, []
+        for unit in units:
+            cached = self.cache.get("run_tests", self._key(source, module, prelude, unit)) if self.cache is not None else None
+            if cached is not None:
+                outcomes.update(json.loads(cached))
+            else:
+                pending.append(unit)
+        cached_count = sum(len(unit.tests) for unit in units) - sum(len(unit.tests) for unit in pending)
+
+        if pending:
+            fresh = self._run_pending(source, module, test_source, pending, paths)
+            outcomes.update(fresh)
+            for unit in pending:
+                unit_outcomes = {test: fresh[test] for test in unit.tests if test in fresh}
+                # A test that did not run at all (a crashed shard) is not cached
+                if self.cache is not None and len(unit_outcomes) == len(unit.tests) and "<module>" not in fresh:
+                    self.cache.put("run_tests", self._key(source, module, prelude, unit), json.dumps(unit_outcomes))
+
+        failed = {test: outcome for test, outcome in outcomes.items() if outcome is not None}
+        return {
+            "passed": sorted(test for test, outcome in outcomes.items() if outcome is None),
+            "failed": failed,
+            "cached": cached_count,
+            "ran": sum(len(unit.tests) for unit in pending),
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+    def _run_pending(self, source: str, module: str, test_source: str, units: list, paths) -> dict:
+        scratch = tempfile.mkdtemp(prefix="codesh-tests-")
+        try:
+            with open(os.path.join(scratch, f"{module}.py"), "w") as f:
+                f.write(source)
+            with open(os.path.join(scratch, TEST_MODULE), "w") as f:
+                f.write(test_source)
+            with open(os.path.join(scratch, "conftest.py"), "w") as f:
+                f.write(TIMEOUT_PLUGIN)
+
+            env = dict(os.environ, CODESH_TEST_TIMEOUT=str(self.timeout or 0))
+            env["PYTHONPATH"] = os.pathsep.join([scratch, *paths, env.get("PYTHONPATH", "")]).rstrip(os.pathsep)
+
+            # Deal units round-robin over the shards, largest first
+            shards = [[] for _ in range(min(self.workers, len(units)))]
+            for index, unit in enumerate(sorted(units, key=lambda unit: len(unit.tests), reverse=True)):
+                shards[index % len(shards)].append(unit)
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                reports = list(pool.map(lambda args: self._run_shard(scratch, env, *args), enumerate(shards)))
+
+            outcomes = {}
+            for report in reports:
+                outcomes.update(report)
+            return outcomes
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def _run_shard(self, scratch: str, env: dict, index: int, units: list) -> dict:
+        report = os.path.join(scratch, f"shard_{index}.xml")
+        tests = [test for unit in units for test in unit.tests]
+        command = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "--tb=short",
+                   f"--junitxml={report}", *[f"{TEST_MODULE}::{test}" for test in tests]]
+        # The shard as a whole gets every test's allowance and some start-up time
+        limit = (self.timeout * len(tests) + 30) if self.timeout else None
+        try:
+            completed = subprocess.run(command, cwd=scratch, env=env, capture_output=True, text=True, timeout=limit)
+            output = completed.stdout + completed.stderr
+        except subprocess.TimeoutExpired:
+            return {test: f"Timed out: the test run was stopped after {limit:g}s" for test in tests}
+
+        outcomes = self._read_report(report)
+        if not outcomes and completed.returncode != 0:
+            # Nothing collected: an import or syntax error in the module
+            return {"<module>": trim_traceback(output)}
+        for test in tests:
+            outcomes.setdefault(test, "Did not run:\n" + trim_traceback(output, max_lines=10))
+        return outcomes
+
+    @staticmethod
+    def _read_report(path: str) -> dict:
+        """
+        {test: None if it passed, else the failure text} from a JUnit XML report. The
+        results of parametrized cases are folded into their test function.
+        """
+        if not os.path.exists(path):
+            return {}
+        outcomes = {}
+        for case in ElementTree.parse(path).getroot().iter("testcase"):
+            classname = case.get("classname", "")
+            if not classname:
+                continue
+            owner = classname.split(".")[-1]
+            name = case.get("name", "").split("[", 1)[0]
+            test = name if owner == TEST_MODULE[:-3] else f"{owner}::{name}"
+            problem = case.find("failure")
+            if problem is None:
+                problem = case.find("error")
+            if problem is not None:
+                message = f"{problem.get('message', '')}\n{problem.text or ''}"
+                outcomes[test] = ((outcomes.get(test) or "") + "\n" + message).strip()
+            else:
+                outcomes.setdefault(test, None)
+        return outcomes
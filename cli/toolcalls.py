@@ -0,0 +1,123 @@
+import inspect
+import json
+import re
+
+JSON_TYPES = {
+    str: "string",
+    bool: "boolean",
+    int: "integer",
+    float: "number",
+    dict: "object",
+    list: "array",
+}
+
+
+def _split_parameters(text: str) -> list:
+    """
+    Split a "Parameters:" list at the commas that are not inside parentheses.
+    """
+    entries, depth, current = [], 0, ""
+    for char in text:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == "," and depth == 0:
+            entries.append(current.strip())
+            current = ""
+        else:
+            current += char
+    entries.append(current.strip().rstrip("."))
+    return [entry for entry in entries if entry]
+
+
+def parameter_notes(description: str) -> dict:
+    """
+    Read the notes of each parameter from the "Parameters:" part of a tool
+    description, e.g. "language (optional, defaults to python)" gives
+    {"language": "optional, defaults to python"}.
+    """
+    match = re.search(r"Parameters:(.*)$", description)
+    if not match:
+        return {}
+    notes = {}
+    for entry in _split_parameters(match.group(1)):
+        named = re.match(r"(\w+)\s*(?:\((.*)\))?$", entry)
+        if named and named.group(2):
+            notes[named.group(1)] = named.group(2).strip()
+    return notes
+
+
+def note_choices(note: str) -> list:
+    """
+    Return the allowed values listed in a parameter note, such as
+    "optional: function, class or method", or an empty list.
+    """
+    listed = note.removeprefix("optional:").split(";")[0].strip()
+    if not re.fullmatch(r"\w+(?:, \w+)* or \w+", listed):
+        return []
+    return re.split(r", | or ", listed)
+
+
+def tool_schemas(available_tools: dict) -> list:
+    """
+    Build OpenAI tool definitions from the available_tools registry, using each
+    function's signature for the parameters and the registry entry for the description.
+    """
+    schemas = []
+    for name, tool in available_tools.items():
+        properties = {}
+        required = []
+        notes = parameter_notes(tool["description"])
+        for parameter in inspect.signature(tool["fn"]).parameters.values():
+            if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+                continue
+            schema = {"type": JSON_TYPES.get(parameter.annotation, "string")}
+            note = notes.get(parameter.name, "")
+            if note:
+                schema["description"] = note
+            if note_choices(note):
+                schema["enum"] = note_choices(note)
+            if parameter.default is parameter.empty:
+                required.append(parameter.name)
+            elif parameter.default not in (None, ""):
+                schema["default"] = parameter.default
+            properties[parameter.name] = schema
+
+        # The parameter notes now live on each property of the schema
+        description = re.sub(r"\s*Parameters:.*$", "", tool["description"])
+        schemas.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        })
+    return schemas
+
+
+def tool_call_message(message) -> dict:
+    """
+    Convert an assistant message with tool calls from the API into a plain dict
+    that can be sent back in the conversation.
+    """
+    return {
+        "role": "assistant",
+        "content": message.content,
+        "tool_calls": [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.function.name, "arguments": call.function.arguments},
+            }
+            for call in message.tool_calls
+        ],
+    }
+
+
+def parse_arguments(call) -> dict:
+    """
+    Decode the JSON arguments of a tool call.
+    """
+    arguments = json.loads(call.function.arguments or "{}")
+    if not isinstance(arguments, dict):
+        raise ValueError(f"Arguments for {call.function.name} must be a JSON object")
+    return arguments
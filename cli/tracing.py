@@ -0,0 +1,231 @@
+import contextvars
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Span kinds whose names are user text (queries, shell commands) that may hold secrets
+REDACTED_KINDS = ("query", "command")
+
+# Numeric span attributes that are added up per kind in the session stats
+SUMMED_ATTRS = ("prompt_tokens", "completion_tokens", "input_bytes", "output_bytes", "queue_ms", "retries")
+
+_current = contextvars.ContextVar("codesh_span", default=None)
+
+
+def redact(text: str) -> str:
+    """
+    Stand-in for text that should not be stored: its first word and a short hash, so
+    repeats of the same query or command can still be told apart.
+    """
+    first_word = text.split(maxsplit=1)[0][:40] if text.strip() else ""
+    return f"{first_word} #{hashlib.sha256(text.encode()).hexdigest()[:12]}".strip()
+
+
+class Span:
+    """
+    One timed step (an LLM call, a tool dispatch, a command). Attributes can be
+    added with set() until the span is finished.
+    """
+
+    def __init__(self, tracer, kind: str, name: str, attrs: dict):
+        parent = _current.get()
+        self.tracer = tracer
+        self.kind = kind
+        self.name = redact(name) if kind in REDACTED_KINDS else name[:200]
+        self.attrs = attrs
+        self.id = next(tracer._ids)
+        self.parent = parent.id if parent is not None else None
+        self.started = time.time()
+        self.duration_ms = None
+        self._start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def finish(self, error=None):
+        """
+        Stop the clock and record the span. Finishing twice has no effect.
+        """
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = self.elapsed_ms()
+        if error is not None:
+            self.attrs["error"] = f"{type(error).__name__}: {error}"
+        self.tracer._record(self)
+
+
+class NullSpan:
+    """
+    Span handed out while tracing is disabled; every operation is a no-op.
+    """
+    id = None
+
+    def set(self, **attrs):
+        return self
+
+    def elapsed_ms(self) -> float:
+        return 0.0
+
+    def finish(self, error=None):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+def current_span():
+    """
+    Return the innermost span open in this context (thread or task), or a no-op span.
+    """
+    return _current.get() or NULL_SPAN
+
+
+class Tracer:
+    """
+    Records timing spans for the session: every finished span is folded into per-kind
+    totals and a list of the slowest steps for stats(), and appended as one JSON line
+    to the trace file if a path is set. Once the file grows past max_bytes it is moved
+    to path + ".1" (replacing the previous one) and a new file is started.
+    """
+
+    def __init__(self, path: str = None, enabled: bool = True, keep_slowest: int = 10,
+                 max_bytes: int = 10 * 1024 * 1024):
+        self.enabled = enabled
+        self.path = path if enabled else None
+        self.max_bytes = max_bytes
+        self.session = f"{os.getpid()}-{int(time.time())}"
+        self.keep_slowest = keep_slowest
+        self.totals = {}
+        self.slowest = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def start(self, kind: str, name: str, **attrs):
+        """
+        Start a span that the caller finishes, for steps that outlive a with block
+        (such as a streamed response).
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, kind, name, attrs)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs):
+        """
+        Time the enclosed block. Spans started inside it record this one as their parent.
+        """
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+
+        span = Span(self, kind, name, attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(error=e)
+            raise
+        finally:
+            _current.reset(token)
+            span.finish()
+
+    def traced(self, kind: str):
+        """
+        Decorator that runs a function inside a span named after its first argument.
+        """
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                name = args[0] if args else next(iter(kwargs.values()), fn.__name__)
+                with self.span(kind, str(name)):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, kind: str, name: str, duration_ms: float, **attrs):
+        """
+        Record a step that was timed elsewhere (for example by the command executor).
+        """
+        if not self.enabled:
+            return
+        span = Span(self, kind, name, attrs)
+        span.started -= duration_ms / 1000
+        span.duration_ms = duration_ms
+        self._record(span)
+
+    def _record(self, span: Span):
+        entry = {
+            "session": self.session,
+            "id": span.id,
+            "parent": span.parent,
+            "kind": span.kind,
+            "name": span.name,
+            "start": round(span.started, 3),
+            "duration_ms": round(span.duration_ms, 2),
+            **span.attrs,
+        }
+        with self._lock:
+            totals = self.totals.setdefault(span.kind, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+            totals["count"] += 1
+            totals["total_ms"] += span.duration_ms
+            totals["max_ms"] = max(totals["max_ms"], span.duration_ms)
+            totals["errors"] += "error" in span.attrs
+            for attr in SUMMED_ATTRS:
+                value = span.attrs.get(attr)
+                if isinstance(value, (int, float)):
+                    totals[attr] = totals.get(attr, 0) + value
+
+            item = (span.duration_ms, span.id, entry)
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, item)
+            elif item > self.slowest[0]:
+                heapq.heapreplace(self.slowest, item)
+
+            self._write(entry)
+
+    def _write(self, entry: dict):
+        if self.path is None:
+            return
+        try:
+            if self._file is not None and self._file.tell() >= self.max_bytes:
+                self._file.close()
+                self._file = None
+                os.replace(self.path, self.path + ".1")
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", buffering=1, encoding="utf-8")
+            self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            # An unwritable trace file should not break the session; keep the in-memory stats
+            self.path = None
+
+    def stats(self) -> dict:
+        """
+        Return per-kind totals for the session and its slowest steps.
+        """
+        with self._lock:
+            kinds = {}
+            for kind, totals in sorted(self.totals.items()):
+                summary = {key: round(value, 2) if isinstance(value, float) else value for key, value in totals.items()}
+                summary["mean_ms"] = round(totals["total_ms"] / totals["count"], 2)
+                kinds[kind] = summary
+            slowest = [entry for _, _, entry in sorted(self.slowest, reverse=True)]
+
+        return {
+            "enabled": self.enabled,
+            "session": self.session,
+            "trace_file": self.path,
+            "kinds": kinds,
+            "slowest": slowest,
+        }
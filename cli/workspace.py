@@ -0,0 +1,279 @@
+import ast
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+# A function, class or method and the lines it spans (1-based, inclusive)
+Symbol = namedtuple("Symbol", ["name", "kind", "path", "start", "end"])
+
+SOURCE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".go", ".rs", ".java", ".kt", ".c", ".h",
+    ".cc", ".cpp", ".hpp", ".cs", ".rb", ".php", ".swift", ".scala", ".sh", ".vue", ".svelte",
+}
+
+# Dependency, build and tool directories that are never worth indexing
+SKIP_DIRS = {"node_modules", "__pycache__", "venv", "env", "dist", "build", "target", "coverage", "vendor"}
+
+# Files and directories that mark the root of a project
+PROJECT_MARKERS = (".git", ".hg", "pyproject.toml", "setup.py", "setup.cfg", "requirements.txt", "package.json",
+                   "go.mod", "Cargo.toml", "pom.xml", "build.gradle", "Gemfile", "composer.json", "Makefile")
+
+
+def is_project_root(path: str) -> bool:
+    return any(os.path.exists(os.path.join(path, marker)) for marker in PROJECT_MARKERS)
+
+_DECLARATION = re.compile(
+    r"^(\s*)(?:export\s+)?(?:default\s+)?(?:(?:public|private|protected|static|async|abstract|pub)\s+)*"
+    r"(?:(function\*?|class|interface|struct|enum|trait|impl|def|func|fn)\s+([A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>))"
+)
+_KINDS = {"function*": "function", "def": "function", "func": "function", "fn": "function"}
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def terms(text: str) -> list:
+    """
+    Lowercased search terms: every identifier, plus the words of snake_case and
+    camelCase identifiers, so "parseConfig" is found by "parse" and "config".
+    """
+    found = []
+    for identifier in _IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        found.append(lowered)
+        words = [word.lower() for word in _WORD.findall(identifier)]
+        if len(words) > 1:
+            found.extend(word for word in words if len(word) > 1)
+    return found
+
+
+def _python_symbols(path: str, source: str) -> list:
+    symbols = []
+
+    def visit(nodes, prefix):
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+                if isinstance(node, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if prefix else "function"
+                symbols.append(Symbol(prefix + node.name, kind, path, start, node.end_lineno))
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, f"{prefix}{node.name}.")
+
+    visit(ast.parse(source).body, "")
+    return symbols
+
+
+def _block_end(lines: list, start: int, indent: int) -> int:
+    """
+    Last line of a declaration: where its braces close, or for languages without
+    braces, the last line before the next one at the same or a lower indent.
+    """
+    if any("{" in line for line in lines[start - 1:start + 2]):
+        depth, opened = 0, False
+        for number in range(start, len(lines) + 1):
+            line = lines[number - 1]
+            depth += line.count("{") - line.count("}")
+            opened = opened or "{" in line
+            if opened and depth <= 0:
+                return number
+        return len(lines)
+
+    end = start
+    for number in range(start + 1, len(lines) + 1):
+        line = lines[number - 1]
+        if not line.strip():
+            continue
+        if len(line) - len(line.lstrip()) <= indent:
+            # Ruby and shell close their blocks with a keyword at the declaration's indent
+            return number if line.strip() in ("end", "}", "done", "fi") else end
+        end = number
+    return end
+
+
+def _declared_symbols(path: str, lines: list) -> list:
+    """
+    Symbols of other languages, found by their declaration keywords.
+    """
+    symbols = []
+    for number, line in enumerate(lines, 1):
+        match = _DECLARATION.match(line)
+        if not match:
+            continue
+        indent = len(match.group(1).expandtabs())
+        keyword = match.group(2) or "function"
+        symbols.append(Symbol(match.group(3) or match.group(4), _KINDS.get(keyword, keyword), path,
+                              number, _block_end(lines, number, indent)))
+    return symbols
+
+
+def extract_symbols(path: str, source: str) -> list:
+    if path.endswith(".py"):
+        try:
+            return _python_symbols(path, source)
+        except (SyntaxError, ValueError):
+            pass
+    return _declared_symbols(path, source.splitlines())
+
+
+class WorkspaceIndex:
+    """
+    Index of the source files under a directory: a content hash, the symbol table and
+    term counts of each file, and an inverted index from terms to files for search.
+    refresh() only re-reads files whose size or modification time changed, and only
+    re-parses them if their content hash changed too.
+    """
+
+    def __init__(self, root: str, max_files: int = 20000, max_file_bytes: int = 1024 * 1024):
+        self.root = root
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.files = {}
+        self.postings = {}
+        self.refreshed = 0.0
+        self.lock = threading.Lock()
+        self.totals = {"refreshes": 0, "files_parsed": 0}
+
+    def _source_files(self):
+        count = 0
+        for directory, subdirectories, filenames in os.walk(self.root):
+            subdirectories[:] = sorted(name for name in subdirectories
+                                       if not name.startswith(".") and name not in SKIP_DIRS)
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1] in SOURCE_EXTENSIONS:
+                    count += 1
+                    if count > self.max_files:
+                        return
+                    yield os.path.join(directory, filename)
+
+    def _forget(self, path: str):
+        for term in self.files.pop(path)["terms"]:
+            postings = self.postings.get(term, {})
+            postings.pop(path, None)
+            if not postings:
+                self.postings.pop(term, None)
+
+    def refresh(self, min_interval: float = 0.0) -> dict:
+        """
+        Bring the index up to date with the files on disk and return what changed.
+        Skipped if the last refresh was less than min_interval seconds ago.
+        """
+        with self.lock:
+            changes = {"added": 0, "changed": 0, "removed": 0}
+            if time.monotonic() - self.refreshed < min_interval:
+                return changes
+            seen = set()
+            for full_path in self._source_files():
+                path = os.path.relpath(full_path, self.root)
+                seen.add(path)
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                entry = self.files.get(path)
+                if entry and (entry["mtime"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                if stat.st_size > self.max_file_bytes:
+                    if entry:
+                        self._forget(path)
+                        changes["removed"] += 1
+                    continue
+                try:
+                    with open(full_path, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                digest = hashlib.sha1(data).hexdigest()
+                if entry and entry["hash"] == digest:
+                    entry["mtime"], entry["size"] = stat.st_mtime_ns, stat.st_size
+                    continue
+
+                if entry:
+                    self._forget(path)
+                source = data.decode("utf-8", errors="replace")
+                counts = Counter(terms(source))
+                self.files[path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": digest,
+                                    "symbols": extract_symbols(path, source), "terms": counts}
+                for term, count in counts.items():
+                    self.postings.setdefault(term, {})[path] = count
+                changes["changed" if entry else "added"] += 1
+                self.totals["files_parsed"] += 1
+
+            for path in [path for path in self.files if path not in seen]:
+                self._forget(path)
+                changes["removed"] += 1
+            self.refreshed = time.monotonic()
+            self.totals["refreshes"] += 1
+            return changes
+
+    def find(self, name: str, kind: str = "") -> list:
+        """
+        Symbols named name (a method also matches its bare name or Class.method),
+        falling back to a case-insensitive substring match.
+        """
+        with self.lock:
+            symbols = [symbol for entry in self.files.values() for symbol in entry["symbols"]
+                       if not kind or symbol.kind == kind]
+        exact = [symbol for symbol in symbols if symbol.name == name or symbol.name.endswith("." + name)]
+        if exact:
+            return sorted(exact, key=lambda symbol: (symbol.path, symbol.start))
+        lowered = name.lower()
+        return sorted((symbol for symbol in symbols if lowered in symbol.name.lower()),
+                      key=lambda symbol: (len(symbol.name), symbol.path, symbol.start))
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """
+        Files ranked by how often they use the query's terms, weighted by how rare
+        each term is across the workspace: a list of (path, score).
+        """
+        with self.lock:
+            scores = Counter()
+            for term in set(terms(query)):
+                postings = self.postings.get(term, {})
+                if not postings:
+                    continue
+                weight = math.log(1 + len(self.files) / len(postings))
+                for path, count in postings.items():
+                    scores[path] += (1 + math.log(count)) * weight
+            return scores.most_common(limit)
+
+    def read_lines(self, path: str, start: int, end: int) -> str:
+        with open(os.path.join(self.root, path), errors="replace") as f:
+            return "".join(line for number, line in enumerate(f, 1) if start <= number <= end)
+
+    def matching_lines(self, path: str, query: str, limit: int = 3) -> list:
+        """
+        (line number, line, enclosing symbol name) for the lines of a file that use
+        the most query terms.
+        """
+        wanted = set(terms(query))
+        with open(os.path.join(self.root, path), errors="replace") as f:
+            lines = f.read().splitlines()
+        scored = sorted(((len(wanted & set(terms(line))), number) for number, line in enumerate(lines, 1)),
+                        key=lambda item: (-item[0], item[1]))
+        with self.lock:
+            symbols = self.files.get(path, {}).get("symbols", [])
+        matches = []
+        for score, number in scored[:limit]:
+            if not score:
+                break
+            enclosing = [symbol for symbol in symbols if symbol.start <= number <= symbol.end]
+            name = min(enclosing, key=lambda symbol: symbol.end - symbol.start).name if enclosing else None
+            matches.append((number, lines[number - 1].strip(), name))
+        return matches
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "root": self.root,
+                "files": len(self.files),
+                "symbols": sum(len(entry["symbols"]) for entry in self.files.values()),
+                "terms": len(self.postings),
+                **self.totals,
+            }